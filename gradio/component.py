@@ -10,6 +10,10 @@ class Component:
     A class for defining the methods that all gradio input and output components should have.
     """
 
+    # Whether preprocessing or postprocessing is slow (e.g. decoding media or
+    # touching files), so that it is run in a thread when fn is a coroutine.
+    cpu_intensive = False
+
     def __init__(self, label, requires_permissions=False):
         self.label = label
         self.requires_permissions = requires_permissions
@@ -1,3 +1,6 @@
+import os
+from typing import IO, Iterator
+
 from Crypto import Random
 from Crypto.Cipher import AES
 from Crypto.Hash import SHA256
@@ -29,3 +32,42 @@ def decrypt(key: bytes, source: bytes) -> bytes:
     ):  # Python 2.x: chr(padding) * padding
         raise ValueError("Invalid padding...")
     return data[:-padding]  # remove the padding
+
+
+def get_decrypted_size(key: bytes, file: IO[bytes]) -> int:
+    """Returns the size of the data in an encrypted file, reading only its end."""
+    size = file.seek(0, os.SEEK_END)
+    if size < 2 * AES.block_size or size % AES.block_size:
+        raise ValueError("Invalid encrypted file...")
+    file.seek(size - 2 * AES.block_size)
+    IV = file.read(AES.block_size)  # the last block is chained to the one before
+    padding = AES.new(key, AES.MODE_CBC, IV).decrypt(file.read(AES.block_size))[-1]
+    if not 1 <= padding <= AES.block_size:
+        raise ValueError("Invalid padding...")
+    return size - AES.block_size - padding
+
+
+def decrypt_range(
+    key: bytes, file: IO[bytes], start: int, end: int, chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """
+    Yields the bytes from start to end (excluded) of the data in an encrypted
+    file, decrypting chunk_size bytes at a time. `end` must be at most the size
+    returned by get_decrypted_size().
+    """
+    block = start // AES.block_size
+    # In CBC mode, each block is decrypted with the previous one as its IV (the
+    # IV stored at the beginning of the file precedes the first block).
+    file.seek(block * AES.block_size)
+    decryptor = AES.new(key, AES.MODE_CBC, file.read(AES.block_size))
+    chunk_size -= chunk_size % AES.block_size
+    skip = start - block * AES.block_size
+    remaining = end - start
+    while remaining > 0:
+        data = file.read(chunk_size)
+        if not data:
+            break
+        data = decryptor.decrypt(data)[skip : skip + remaining]
+        skip = 0
+        remaining -= len(data)
+        yield data
@@ -0,0 +1,192 @@
+"""
+Serves files with support for HTTP Range requests (so that the browser can seek
+in audio and video, or resume downloads) and conditional requests, keeping the
+memory used constant whatever the size of the file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import IO, Iterator, Mapping, Optional, Tuple
+
+import anyio
+from fastapi.concurrency import iterate_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from gradio import encryptor
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+# The ASGI extension for sending a file with the OS's sendfile(), if the server
+# supports it: https://asgi.readthedocs.io/en/latest/extensions.html
+ZERO_COPY_SEND = "http.response.zerocopysend"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Returns the (start, end excluded) bytes of a file of the given size that a
+    Range header asks for. Returns None if the header is invalid (including a
+    range whose last byte is before its first) or asks for several ranges, in
+    which case the whole file is sent, and raises ValueError if the range is not
+    satisfiable.
+    """
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":  # the last bytes
+        length = int(match.group(2))
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size
+    start = int(match.group(1))
+    if match.group(2) != "" and int(match.group(2)) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    end = size if match.group(2) == "" else min(int(match.group(2)) + 1, size)
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """
+    Sends a file, or the part of it asked for by a Range header, with ETag and
+    Last-Modified headers, answering conditional requests with 304 Not Modified.
+    Plain files are sent with sendfile() if the server supports it. Encrypted
+    files (see encryptor.py) are decrypted chunk by chunk as they are sent.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        request_headers: Mapping[str, str],
+        method: str = "GET",
+        encryption_key: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.path = path
+        self.request_headers = Headers(request_headers)
+        self.send_header_only = method.upper() == "HEAD"
+        self.encryption_key = encryption_key
+        self.media_type = media_type or guess_type(path)[0] or "text/plain"
+        self.background = None
+        self.status_code = 200
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stat_result, size = await anyio.to_thread.run_sync(self.get_size)
+        etag = '"{}"'.format(
+            hashlib.md5(
+                "{}-{}".format(stat_result.st_mtime, stat_result.st_size).encode()
+            ).hexdigest()
+        )
+        last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = last_modified
+        start, end = 0, size
+        if self.is_not_modified(etag, stat_result.st_mtime):
+            self.status_code = 304
+            end = 0
+        elif "range" in self.request_headers and self.if_range_matches(
+            etag, last_modified
+        ):
+            try:
+                byte_range = parse_range(self.request_headers["range"], size)
+            except ValueError:
+                self.status_code = 416
+                self.headers["content-range"] = "bytes */{}".format(size)
+                end = 0
+            else:
+                if byte_range is not None:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.headers["content-range"] = "bytes {}-{}/{}".format(
+                        start, end - 1, size
+                    )
+        if self.status_code != 304:
+            self.headers["content-length"] = str(end - start)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if self.send_header_only or start == end:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            if self.encryption_key is None and ZERO_COPY_SEND in scope.get(
+                "extensions", {}
+            ):
+                await send(
+                    {
+                        "type": ZERO_COPY_SEND,
+                        "file": file,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": False,
+                    }
+                )
+                return
+            async for chunk in iterate_in_threadpool(self.read(file, start, end)):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await anyio.to_thread.run_sync(file.close)
+
+    def get_size(self) -> Tuple[os.stat_result, int]:
+        stat_result = os.stat(self.path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError("File at path {} is not a file.".format(self.path))
+        if self.encryption_key is None:
+            return stat_result, stat_result.st_size
+        with open(self.path, "rb") as file:
+            return stat_result, encryptor.get_decrypted_size(self.encryption_key, file)
+
+    def read(self, file: IO[bytes], start: int, end: int) -> Iterator[bytes]:
+        if self.encryption_key is not None:
+            yield from encryptor.decrypt_range(
+                self.encryption_key, file, start, end, self.chunk_size
+            )
+            return
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def is_not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.request_headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or "W/" + etag in tags
+        if_modified_since = self.request_headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return (
+                    int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+                )
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def if_range_matches(self, etag: str, last_modified: str) -> bool:
+        """Whether the Range header applies: the file has not changed since If-Range."""
+        if_range = self.request_headers.get("if-range")
+        return if_range is None or if_range.strip() in (etag, last_modified)
@@ -11,7 +11,7 @@ import math
 import os
 import tempfile
 import warnings
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -46,6 +46,13 @@ class InputComponent(Component):
         """
         return x
 
+    def preprocess_batch(self, xs: List[Any]) -> Sequence[Any]:
+        """
+        Preprocesses the inputs of several samples for a batch-aware function.
+        Components that can do so return them in a vectorized form.
+        """
+        return [self.preprocess(x) for x in xs]
+
     def serialize(self, x: Any, called_directly: bool) -> Any:
         """
         Convert from a human-readable version of the input (path of an image, URL of a video, etc.) into the interface to a serialized version (e.g. base64) to pass into an API. May do different things if the interface is called() vs. used via GUI.
@@ -757,6 +764,8 @@ class Image(InputComponent):
     Demos: image_classifier, image_mod, webcam, digit_classifier
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         shape: Tuple[int, int] = None,
@@ -855,6 +864,18 @@ class Image(InputComponent):
                 + ". Please choose from: 'numpy', 'pil', 'filepath'."
             )
 
+    def preprocess_batch(self, xs: List[Optional[str]]) -> np.array | List[Any]:
+        """
+        Parameters:
+        xs (List[str]): base64 url data of each sample
+        Returns:
+        (Union[numpy.array, List[Any]]): if the type is "numpy" and the images are resized to a fixed shape, one stacked array of shape (samples, height, width[, channels]); otherwise, a list of images in requested format
+        """
+        images = super().preprocess_batch(xs)
+        if self.type == "numpy" and self.shape is not None and None not in xs:
+            return np.stack(images)
+        return images
+
     def preprocess_example(self, x):
         return processing_utils.encode_file_to_base64(x)
 
@@ -993,6 +1014,8 @@ class Video(InputComponent):
     Demos: video_flip
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         type: Optional[str] = None,
@@ -1079,6 +1102,8 @@ class Audio(InputComponent):
     Demos: main_note, reverse_audio, spectogram
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         source: str = "upload",
@@ -1290,6 +1315,8 @@ class File(InputComponent):
     Demos: zip_to_json, zip_two_files
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         file_count: str = "single",
@@ -1390,6 +1417,8 @@ class Dataframe(InputComponent):
     Demos: filter_records, matrix_transpose, tax_calculator
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         headers: Optional[List[str]] = None,
@@ -1503,6 +1532,8 @@ class Timeseries(InputComponent):
     Demos: fraud_detector
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         x: Optional[str] = None,
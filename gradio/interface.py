@@ -7,6 +7,8 @@ from __future__ import annotations
 
 import copy
 import getpass
+import inspect
+import math
 import os
 import random
 import re
@@ -15,13 +17,32 @@ import time
 import warnings
 import weakref
 import webbrowser
-from typing import TYPE_CHECKING, Any, Callable, List, Optional, Tuple
-
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from fastapi.concurrency import run_in_threadpool
 from markdown_it import MarkdownIt
 from mdit_py_plugins.footnote import footnote_plugin
 
 from gradio import networking  # type: ignore
-from gradio import encryptor, interpretation, queueing, strings, utils
+from gradio import (
+    encryptor,
+    interpretation,
+    prediction_cache,
+    queueing,
+    routes,
+    strings,
+    utils,
+)
+from gradio.component import Component
 from gradio.external import load_from_pipeline, load_interface  # type: ignore
 from gradio.flagging import CSVLogger, FlaggingCallback  # type: ignore
 from gradio.inputs import InputComponent
@@ -31,6 +52,7 @@ from gradio.outputs import OutputComponent
 from gradio.outputs import State as o_State  # type: ignore
 from gradio.outputs import get_output_instance
 from gradio.process_examples import cache_interface_examples
+from gradio.upload_store import UploadStore
 
 if TYPE_CHECKING:  # Only import for type checking (is False at runtime).
     import flask
@@ -46,6 +68,9 @@ class Interface:
 
     # stores references to all currently existing Interface instances
     instances: weakref.WeakSet = weakref.WeakSet()
+    # Minimum seconds between updates of the average durations in the config,
+    # each of which makes the server render the pages embedding it again.
+    durations_refresh_interval: float = 60
 
     @classmethod
     def get_instances(cls) -> List[Interface]:
@@ -135,10 +160,13 @@ class Interface:
         enable_queue=None,
         api_mode=None,
         flagging_callback: FlaggingCallback = CSVLogger(),
+        batch: bool = False,
+        max_batch_size: int = 4,
+        max_batch_delay: float = 0,
     ):
         """
         Parameters:
-        fn (Union[Callable, List[Callable]]): the function to wrap an interface around.
+        fn (Union[Callable, List[Callable]]): the function to wrap an interface around. It may be a coroutine (async def) function, which the server awaits on its event loop instead of running it in a thread, or a generator (or async generator) function, whose outputs are then streamed to the client as they are yielded; the last value it yields is the final output.
         inputs (Union[str, InputComponent, List[Union[str, InputComponent]]]): a single Gradio input component, or list of Gradio input components. Components can either be passed as instantiated objects, or referred to by their string shortcuts. The number of input components should match the number of parameters in fn.
         outputs (Union[str, OutputComponent, List[Union[str, OutputComponent]]]): a single Gradio output component, or list of Gradio output components. Components can either be passed as instantiated objects, or referred to by their string shortcuts. The number of output components should match the number of values returned by fn.
         verbose (bool): DEPRECATED. Whether to print detailed information during launch.
@@ -165,6 +193,9 @@ class Interface:
         api_mode (bool): DEPRECATED. If True, will skip preprocessing steps when the Interface is called() as a function (should remain False unless the Interface is loaded from an external repo)
         server_name (str): DEPRECATED. Name of the server to use for serving the interface - pass in launch() instead.
         server_port (int): DEPRECATED. Port of the server to use for serving the interface - pass in launch() instead.
+        batch (bool): if True, fn is batch-aware: it receives a list of samples for each input component and returns a list of results for each output component. Queued requests (see `enable_queue` in launch()) are then grouped into batches.
+        max_batch_size (int): the maximum number of queued requests to group into one call to fn (only applies if batch is True).
+        max_batch_delay (float): how many milliseconds a queued request may wait for more requests to fill its batch (only applies if batch is True).
         """
         if not isinstance(fn, list):
             fn = [fn]
@@ -207,8 +238,29 @@ class Interface:
         else:
             raise ValueError("Invalid value for parameter: interpretation")
 
+        if batch and max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.batch = batch
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+
+        self.streaming = any(
+            inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func)
+            for func in fn
+        )
+        if self.streaming and (len(fn) > 1 or batch):
+            raise ValueError(
+                "Generator functions cannot be used with multiple functions or batch=True."
+            )
+
+        self.is_async = any(inspect.iscoroutinefunction(func) for func in fn)
+
         self.predict = fn
-        self.predict_durations = [[0, 0]] * len(fn)
+        self.predict_durations = [[0, 0] for _ in fn]
+        # Incremented when the config is updated in place, so that the server
+        # renders the pages embedding it again.
+        self.config_version = 0
+        self.durations_refreshed_at = -math.inf
         self.function_names = [func.__name__ for func in fn]
         self.__name__ = ", ".join(self.function_names)
 
@@ -495,6 +547,12 @@ class Interface:
         durations (list): A list of durations for each prediction
             (only returned if `return_duration` is True).
         """
+        if self.batch:  # Run a batch of one sample
+            predictions, durations = self.run_batch_prediction(
+                [[input] for input in processed_input], return_duration=True
+            )
+            predictions = [prediction[0] for prediction in predictions]
+            return (predictions, durations) if return_duration else predictions
         if self.api_mode:  # Serialize the input
             processed_input = [
                 input_component.serialize(processed_input[i], called_directly)
@@ -512,6 +570,10 @@ class Interface:
                     prediction = predict_fn(*processed_input)
             else:
                 prediction = predict_fn(*processed_input)
+            if inspect.iscoroutine(prediction):  # Called from synchronous code
+                prediction = utils.run_coroutine(prediction)
+            elif self.streaming:  # Only keep the final output
+                prediction = utils.last_value(prediction)
             duration = time.time() - start
 
             if len(self.output_components) == len(self.predict):
@@ -540,6 +602,92 @@ class Interface:
         else:
             return predictions
 
+    def run_batch_prediction(
+        self,
+        processed_inputs: List[List[Any]],
+        return_duration: bool = False,
+    ) -> List[List[Any]] | Tuple[List[List[Any]], List[float]]:
+        """
+        Runs the batch-aware prediction function(s) once on a batch of
+        (already processed) inputs. Only used if the Interface has batch=True.
+        Parameters:
+        processed_inputs (list): for each input component, a list of processed inputs (one per sample).
+        return_duration (bool): Whether to return the duration of the prediction.
+        Returns:
+        predictions (list): for each output component, a list of predictions (not post-processed).
+        durations (list): A list of durations for each prediction fn, covering the whole batch
+            (only returned if `return_duration` is True).
+        """
+        batch_size = len(processed_inputs[0]) if processed_inputs else 1
+        predictions = []
+        durations = []
+        for predict_fn in self.predict:
+            start = time.time()
+            prediction = predict_fn(*processed_inputs)
+            if inspect.iscoroutine(prediction):
+                prediction = utils.run_coroutine(prediction)
+            durations.append(time.time() - start)
+            if len(self.output_components) == len(self.predict):
+                prediction = [prediction]
+            for output in prediction:
+                if len(output) != batch_size:
+                    raise ValueError(
+                        "Batch function {}() returned {} results for {} inputs.".format(
+                            predict_fn.__name__, len(output), batch_size
+                        )
+                    )
+            predictions.extend(prediction)
+        if return_duration:
+            return predictions, durations
+        else:
+            return predictions
+
+    def process_batch(
+        self, raw_inputs: List[List[Any]]
+    ) -> Tuple[List[List[Any]], List[float]]:
+        """
+        Like self.process(), but on several samples. If the Interface has
+        batch=True, the samples are preprocessed and postprocessed together by
+        each component (see InputComponent.preprocess_batch()) and the
+        batch-aware prediction function(s) are called once per `max_batch_size`
+        samples; otherwise the samples are processed one at a time.
+        Parameters:
+        raw_inputs: a list of samples, each a list of raw inputs (one per input component).
+        Returns:
+        processed outputs: a list of samples, each a list of processed outputs.
+        duration: a list of time deltas measuring inference time of all the samples for each prediction fn.
+        """
+        processed_outputs = []
+        total_durations = [0] * len(self.predict)
+        chunk_size = self.max_batch_size if self.batch else 1
+        for start in range(0, len(raw_inputs), chunk_size):
+            chunk = raw_inputs[start : start + chunk_size]
+            if self.batch:
+                outputs, durations = self._process_chunk(chunk)
+            else:
+                output, durations = self.process(chunk[0])
+                outputs = [output]
+            processed_outputs.extend(outputs)
+            total_durations = [a + b for a, b in zip(total_durations, durations)]
+        return processed_outputs, total_durations
+
+    def _process_chunk(
+        self, raw_inputs: List[List[Any]]
+    ) -> Tuple[List[List[Any]], List[float]]:
+        processed_inputs = [
+            input_component.preprocess_batch([raw_input[i] for raw_input in raw_inputs])
+            for i, input_component in enumerate(self.input_components)
+        ]
+        predictions, durations = self.run_batch_prediction(
+            processed_inputs, return_duration=True
+        )
+        processed_outputs = [
+            output_component.postprocess_batch(prediction)
+            for output_component, prediction in zip(self.output_components, predictions)
+        ]
+        self.update_durations(durations)
+        return [list(sample) for sample in zip(*processed_outputs)], durations
+
     def process(self, raw_input: List[Any]) -> Tuple[List[Any], List[float]]:
         """
         First preprocesses the input, then runs prediction using
@@ -550,20 +698,147 @@ class Interface:
         processed output: a list of processed  outputs to return as the prediction(s).
         duration: a list of time deltas measuring inference time for each prediction fn.
         """
-        processed_input = [
-            input_component.preprocess(raw_input[i])
-            for i, input_component in enumerate(self.input_components)
-        ]
+        processed_input = self.preprocess_input(raw_input)
         predictions, durations = self.run_prediction(
             processed_input, return_duration=True
         )
-        processed_output = [
+        processed_output = self.postprocess_output(predictions)
+
+        self.update_durations(durations)
+        return processed_output, durations
+
+    async def process_async(
+        self, raw_input: List[Any]
+    ) -> Tuple[List[Any], List[float]]:
+        """
+        Like self.process(), but awaits coroutine prediction functions on the
+        running event loop, so that they do not occupy a worker thread. Other
+        prediction functions, and pre/postprocessing by components that do heavy
+        work (see Component.cpu_intensive), are run in the threadpool.
+        """
+        processed_input = await self._offload(
+            self.input_components, self.preprocess_input, raw_input
+        )
+        predictions, durations = await self.run_prediction_async(processed_input)
+        processed_output = await self._offload(
+            self.output_components, self.postprocess_output, predictions
+        )
+        self.update_durations(durations)
+        return processed_output, durations
+
+    async def run_prediction_async(
+        self, processed_input: List[Any]
+    ) -> Tuple[List[Any], List[float]]:
+        """
+        Like self.run_prediction() with return_duration=True, awaiting coroutine
+        prediction functions instead of running them in a thread.
+        """
+        if self.batch or self.capture_session:
+            return await run_in_threadpool(
+                self.run_prediction, processed_input, return_duration=True
+            )
+        predictions = []
+        durations = []
+        for predict_fn in self.predict:
+            start = time.time()
+            if inspect.iscoroutinefunction(predict_fn):
+                prediction = await predict_fn(*processed_input)
+            else:
+                prediction = await run_in_threadpool(predict_fn, *processed_input)
+            durations.append(time.time() - start)
+            if len(self.output_components) == len(self.predict):
+                prediction = [prediction]
+            predictions.extend(prediction)
+        return predictions, durations
+
+    def preprocess_input(self, raw_input: List[Any]) -> List[Any]:
+        """Preprocesses a list of raw inputs, one per input component."""
+        return [
+            input_component.preprocess(raw_input[i])
+            for i, input_component in enumerate(self.input_components)
+        ]
+
+    def postprocess_output(self, predictions: List[Any]) -> List[Any]:
+        """Postprocesses a list of predictions, one per output component."""
+        return [
             output_component.postprocess(predictions[i])
             if predictions[i] is not None
             else None
             for i, output_component in enumerate(self.output_components)
         ]
 
+    async def _offload(
+        self, components: List[Component], fn: Callable, *args
+    ) -> List[Any]:
+        if any(component.cpu_intensive for component in components):
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    def process_stream(
+        self, raw_input: List[Any]
+    ) -> Iterator[Tuple[List[Any], List[float]]] | AsyncIterator[
+        Tuple[List[Any], List[float]]
+    ]:
+        """
+        Like self.process(), for a streaming Interface (whose fn is a generator
+        function): preprocesses the input, then postprocesses and yields each
+        value that fn yields, the last one being the final output.
+        Parameters:
+        raw_input: a list of raw inputs to process and apply the prediction on.
+        Returns:
+        outputs: an iterator (an async iterator if fn is an async generator function)
+            of the processed outputs, each with the inference time so far.
+        """
+        if inspect.isasyncgenfunction(self.predict[0]):
+            return self._stream_async(raw_input)
+        return self._stream(raw_input)
+
+    def _stream(self, raw_input: List[Any]) -> Iterator[Tuple[List[Any], List[float]]]:
+        processed_input = self.preprocess_input(raw_input)
+        predictions = self.predict[0](*processed_input)
+        duration = 0
+        while True:
+            start = time.time()
+            try:
+                prediction = next(predictions)
+            except StopIteration:
+                break
+            finally:
+                duration += time.time() - start
+            yield self._postprocess_partial(prediction), [duration]
+        self.update_durations([duration])
+
+    async def _stream_async(
+        self, raw_input: List[Any]
+    ) -> AsyncIterator[Tuple[List[Any], List[float]]]:
+        processed_input = await self._offload(
+            self.input_components, self.preprocess_input, raw_input
+        )
+        predictions = self.predict[0](*processed_input)
+        duration = 0
+        while True:
+            start = time.time()
+            try:
+                prediction = await predictions.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                duration += time.time() - start
+            yield await self._offload(
+                self.output_components, self._postprocess_partial, prediction
+            ), [duration]
+        self.update_durations([duration])
+
+    def _postprocess_partial(self, prediction: Any) -> List[Any]:
+        if len(self.output_components) == 1:
+            prediction = [prediction]
+        return self.postprocess_output(prediction)
+
+    def update_durations(self, durations: List[float]) -> None:
+        """
+        Adds the durations of one prediction to the running averages, which are
+        copied to the config at most every `durations_refresh_interval` seconds.
+        """
         avg_durations = []
         for i, duration in enumerate(durations):
             self.predict_durations[i][0] += duration
@@ -571,10 +846,14 @@ class Interface:
             avg_durations.append(
                 self.predict_durations[i][0] / self.predict_durations[i][1]
             )
-        if hasattr(self, "config"):
+        now = time.monotonic()
+        if (
+            hasattr(self, "config")
+            and now - self.durations_refreshed_at >= self.durations_refresh_interval
+        ):
             self.config["avg_durations"] = avg_durations
-
-        return processed_output, durations
+            self.config_version += 1
+            self.durations_refreshed_at = now
 
     def interpret(self, raw_input: List[Any]) -> List[Any]:
         return interpretation.run_interpret(self, raw_input)
@@ -590,7 +869,7 @@ class Interface:
             print("Keyboard interruption in main thread... closing server.")
             self.server.close()
             if self.enable_queue:
-                queueing.close()
+                queueing.backend.close()
 
     def test_launch(self) -> None:
         for predict_fn in self.predict:
@@ -622,10 +901,29 @@ class Interface:
         server_port: Optional[int] = None,
         show_tips: bool = False,
         enable_queue: bool = False,
+        concurrency_count: int = 1,
+        job_ttl: Optional[float] = 3600,
+        max_finished_jobs: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        client_timeout: Optional[float] = None,
+        latest_only: bool = False,
+        persistent_queue: bool = False,
+        max_job_attempts: int = 3,
+        queue_backend: Optional[queueing.QueueBackend] = None,
+        local_queue_workers: bool = True,
+        queue_priority: Optional[Callable[[Optional[str]], int]] = None,
+        queue_weight: Optional[Callable[[Optional[str]], float]] = None,
         height: int = 500,
         width: int = 900,
         encrypt: bool = False,
         cache_examples: bool = False,
+        cache_predictions: bool | prediction_cache.PredictionCache = False,
+        coalesce_predictions: bool = False,
+        max_concurrent_predictions: Optional[int] = None,
+        max_concurrent_interpretations: Optional[int] = None,
+        upload_store: Optional[UploadStore] = None,
+        output_urls: bool = False,
         favicon_path: Optional[str] = None,
         ssl_keyfile: Optional[str] = None,
         ssl_certfile: Optional[str] = None,
@@ -647,10 +945,29 @@ class Interface:
         server_name (str): to make app accessible on local network, set this to "0.0.0.0". Can be set by environment variable GRADIO_SERVER_NAME.
         show_tips (bool): if True, will occasionally show tips about new Gradio features
         enable_queue (bool): if True, inference requests will be served through a queue instead of with parallel threads. Required for longer inference times (> 1min) to prevent timeout.
+        concurrency_count (int): Number of queued requests that are processed at the same time (only applies if enable_queue is True). Increase this if the function is I/O-bound or releases the GIL.
+        job_ttl (float): Number of seconds the result of a finished queued request is kept for its client to retrieve before it is deleted, along with the job's other records; one hour by default. If None, finished jobs are kept until the server is closed (only applies if enable_queue is True).
+        max_finished_jobs (int): If provided, only the results of this many most recently finished queued requests are kept (only applies if enable_queue is True).
+        max_queue_size (int): If provided, new requests are turned away with HTTP status 429 while this many requests are waiting in the queue (only applies if enable_queue is True).
+        queue_timeout (float): If provided, a queued request that has not started after this many seconds is dropped. Clients may request a shorter timeout (only applies if enable_queue is True).
+        client_timeout (float): If provided, a queued request is dropped if its client has not checked on it for this many seconds, e.g. because the browser tab was closed (only applies if enable_queue is True).
+        latest_only (bool): If True, a new request from a browser session cancels the requests from that session still waiting in the queue, so only the latest one is processed. Useful with live=True (only applies if enable_queue is True).
+        persistent_queue (bool): If True, queued requests are kept across restarts of the server, and requests that were being processed when it stopped are processed again (only applies if enable_queue is True).
+        max_job_attempts (int): Number of times a queued request is processed again after the process handling it stopped before it is failed (only applies if enable_queue is True).
+        queue_backend (QueueBackend): Stores the queue. By default, a SQLite database in the working directory is used (only applies if enable_queue is True).
+        local_queue_workers (bool): If False, queued requests are not processed by the server, but by worker processes sharing its queue, started with `python -m gradio.queue_worker`. Requires persistent_queue=True (only applies if enable_queue is True).
+        queue_priority (Callable): If provided, a function that takes the username of the logged-in user (None if not logged in) and returns the priority of their queued requests. Requests with a higher priority are processed first; the default priority is 0 (only applies if enable_queue is True).
+        queue_weight (Callable): Queued requests are shared fairly between users (or remote addresses if not logged in), rather than processed in order of arrival. If provided, a function that takes the username of the logged-in user (None if not logged in) and returns their share of the workers relative to other users; the default weight is 1 (only applies if enable_queue is True).
         width (int): The width in pixels of the iframe element containing the interface (used if inline=True)
         height (int): The height in pixels of the iframe element containing the interface (used if inline=True)
         encrypt (bool): If True, flagged data will be encrypted by key provided by creator at launch
         cache_examples (bool): If True, examples outputs will be processed and cached in a folder, and will be used if a user uses an example input.
+        cache_predictions (Union[bool, PredictionCache]): If True, the outputs of predictions are cached in memory and reused when a request repeats an earlier input. A PredictionCache can be passed to configure its size, expiry and on-disk tier. Ignored (with a warning) if the interface has State components, streams its outputs, or its function looks non-deterministic.
+        coalesce_predictions (bool): If True, a request with the same input as a prediction that is still running waits for that prediction and receives its output, instead of running the function again; this includes the inputs of batched and queued predictions. Ignored (with a warning) in the same cases as cache_predictions.
+        max_concurrent_predictions (int): If provided, at most this many predictions run at the same time; other requests wait for one to finish. Useful to bound the memory used by the model. Can be changed while running with set_concurrency_limit().
+        max_concurrent_interpretations (int): If provided, at most this many interpretations run at the same time. Can be changed while running with set_concurrency_limit().
+        upload_store (UploadStore): Stores the files uploaded to /api/upload/, which requests can then refer to by hash instead of sending them again. By default, up to 1GB of files are kept in a new directory in the temporary directory, and uploads are limited to 256MB per request.
+        output_urls (bool): If True, the media returned by Image, Audio, Video and File outputs is stored in upload_store and sent as a URL, which the browser fetches (and caches) separately, instead of being inlined in the response as base64.
         favicon_path (str): If a path to a file (.png, .gif, or .ico) is provided, it will be used as the favicon for the web page.
         ssl_keyfile (str): If a path to a file is provided, will use this as the private key file to create a local server running on https.
         ssl_certfile (str): If a path to a file is provided, will use this as the signed certificate for https. Needs to be provided if ssl_keyfile is provided.
@@ -686,6 +1003,60 @@ class Interface:
 
         if self.enable_queue is None:
             self.enable_queue = enable_queue
+        if concurrency_count < 1:
+            raise ValueError("concurrency_count must be at least 1.")
+        self.concurrency_count = concurrency_count
+        if job_ttl is not None and job_ttl <= 0:
+            raise ValueError("job_ttl must be positive.")
+        self.job_ttl = job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        if max_queue_size is not None and max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1.")
+        self.max_queue_size = max_queue_size
+        self.queue_timeout = queue_timeout
+        if client_timeout is not None and client_timeout <= 0:
+            raise ValueError("client_timeout must be positive.")
+        self.client_timeout = client_timeout
+        self.latest_only = latest_only
+        if max_job_attempts < 1:
+            raise ValueError("max_job_attempts must be at least 1.")
+        self.persistent_queue = persistent_queue
+        self.max_job_attempts = max_job_attempts
+        if not local_queue_workers and not persistent_queue:
+            raise ValueError(
+                "local_queue_workers=False requires persistent_queue=True, so "
+                "that the queue is not deleted while worker processes use it."
+            )
+        self.queue_backend = queue_backend or queueing.SQLiteQueueBackend()
+        self.local_queue_workers = local_queue_workers
+        self.queue_priority = queue_priority
+        self.queue_weight = queue_weight
+        for limit in (max_concurrent_predictions, max_concurrent_interpretations):
+            if limit is not None and limit < 1:
+                raise ValueError("Concurrency limits must be at least 1.")
+        self.max_concurrent_predictions = max_concurrent_predictions
+        self.max_concurrent_interpretations = max_concurrent_interpretations
+        self.upload_store = upload_store or UploadStore()
+        self.output_urls = output_urls
+        for component in self.output_components:
+            component.file_store = self.upload_store if output_urls else None
+        self.prediction_cache = None
+        self.coalesce_predictions = False
+        if cache_predictions or coalesce_predictions:
+            bypass_reason = prediction_cache.get_bypass_reason(self)
+            if bypass_reason is not None:
+                warnings.warn(
+                    "Predictions will not be cached or coalesced because {}.".format(
+                        bypass_reason
+                    )
+                )
+            else:
+                if isinstance(cache_predictions, prediction_cache.PredictionCache):
+                    self.prediction_cache = cache_predictions
+                elif cache_predictions:
+                    self.prediction_cache = prediction_cache.PredictionCache()
+                self.coalesce_predictions = coalesce_predictions
+                self.prediction_fingerprint = prediction_cache.get_fingerprint(self)
         if self.allow_flagging != "never":
             self.flagging_callback.setup(self.flagging_dir)
 
@@ -807,6 +1178,25 @@ class Interface:
 
         return app, path_to_local_server, share_url
 
+    def set_concurrency_limit(self, action: str, limit: Optional[int]) -> None:
+        """
+        Changes how many predictions or interpretations may run at the same time,
+        including while the interface is running (e.g. from another thread).
+        Parameters:
+        action (str): "predict" or "interpret".
+        limit (int): the new limit, or None for no limit.
+        """
+        if limit is not None and limit < 1:
+            raise ValueError("Concurrency limits must be at least 1.")
+        if action == "predict":
+            self.max_concurrent_predictions = limit
+        elif action == "interpret":
+            self.max_concurrent_interpretations = limit
+        else:
+            raise ValueError("Unknown action: {}".format(action))
+        if self.status == "RUNNING":
+            routes.set_concurrency_limit(action, limit)
+
     def close(self, verbose: bool = True) -> None:
         """
         Closes the Interface that was launched and frees the port.
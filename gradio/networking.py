@@ -132,13 +132,16 @@ def start_server(
     app.tokens = {}
 
     if app.interface.enable_queue:
-        if auth is not None or app.interface.encrypt:
-            raise ValueError("Cannot queue with encryption or authentication enabled.")
-        queueing.init()
-        app.queue_thread = threading.Thread(
-            target=queueing.queue_thread, args=(path_to_local_server,)
+        if app.interface.encrypt:
+            raise ValueError("Cannot queue with encryption enabled.")
+        queueing.backend = interface.queue_backend
+        queueing.backend.init(
+            concurrency_count=interface.concurrency_count,
+            max_size=interface.max_queue_size,
+            client_timeout=interface.client_timeout,
+            persistent=interface.persistent_queue,
+            max_attempts=interface.max_job_attempts,
         )
-        app.queue_thread.start()
     if interface.save_to is not None:  # Used for selenium tests
         interface.save_to["port"] = port
 
@@ -6,6 +6,7 @@ automatically added to a registry, which allows them to be easily referenced in
 
 from __future__ import annotations
 
+import io
 import json
 import operator
 import os
@@ -13,18 +14,19 @@ import tempfile
 import warnings
 from numbers import Number
 from types import ModuleType
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
 
 import numpy as np
 import pandas as pd
 import PIL
 from ffmpy import FFmpeg
 
-from gradio import processing_utils
+from gradio import processing_utils, upload_store
 from gradio.component import Component
 
 if TYPE_CHECKING:  # Only import for type checking (is False at runtime).
     from gradio import Interface
+    from gradio.upload_store import UploadStore
 
 
 class OutputComponent(Component):
@@ -32,18 +34,60 @@ class OutputComponent(Component):
     Output Component. All output components subclass this.
     """
 
+    # Set by Interface.launch(output_urls=True): media outputs are then stored
+    # there and sent as URLs, rather than inlined in the response as base64.
+    file_store: Optional[UploadStore] = None
+
     def postprocess(self, y):
         """
         Any postprocessing needed to be performed on function output.
         """
         return y
 
+    def postprocess_batch(self, ys: Sequence[Any]) -> List[Any]:
+        """
+        Postprocesses the outputs of several samples of a batch-aware function
+        (e.g. a list, or an array with one entry per sample).
+        """
+        return [self.postprocess(y) if y is not None else None for y in ys]
+
     def deserialize(self, x):
         """
         Convert from serialized output (e.g. base64 representation) from a call() to the interface to a human-readable version of the output (path of an image, etc.)
         """
         return x
 
+    def store_file(self, path: str) -> Optional[str]:
+        """
+        If file_store is set, stores the file at the path and returns its URL (a
+        remote URL is returned as is). Otherwise returns None, and the file is
+        to be sent as base64 data.
+        """
+        if self.file_store is None:
+            return None
+        if path.startswith(("http://", "https://")):
+            return path
+        with open(path, "rb") as file:
+            hash = self.file_store.put(file, filename=path)
+        return upload_store.get_url(hash)
+
+    def store_bytes(self, data: bytes, content_type: str) -> Optional[str]:
+        """Like store_file(), for data in memory."""
+        if self.file_store is None:
+            return None
+        hash = self.file_store.put(io.BytesIO(data), content_type)
+        return upload_store.get_url(hash)
+
+    def save_flagged_file(
+        self, dir: str, label: str, data: Any, encryption_key: bool
+    ) -> Optional[str]:
+        # An output sent as a URL (e.g. when caching examples) is saved from the
+        # stored file.
+        hash = upload_store.get_hash(data)
+        if hash is not None and self.file_store is not None:
+            data = self.file_store.open(hash)
+        return super().save_flagged_file(dir, label, data, encryption_key)
+
 
 class Textbox(OutputComponent):
     """
@@ -200,6 +244,8 @@ class Image(OutputComponent):
     Demos: image_mod, webcam
     """
 
+    cpu_intensive = True
+
     def __init__(
         self, type: str = "auto", plot: bool = False, label: Optional[str] = None
     ):
@@ -228,7 +274,7 @@ class Image(OutputComponent):
         Parameters:
         y (Union[numpy.array, PIL.Image, str, matplotlib.pyplot, Tuple[Union[numpy.array, PIL.Image, str], List[Tuple[str, float, float, float, float]]]]): image in specified format
         Returns:
-        (str): base64 url data
+        (str): base64 url data, or URL of the stored image if file_store is set
         """
         if self.type == "auto":
             if isinstance(y, np.ndarray):
@@ -248,9 +294,16 @@ class Image(OutputComponent):
         if dtype in ["numpy", "pil"]:
             if dtype == "pil":
                 y = np.array(y)
-            out_y = processing_utils.encode_array_to_base64(y)
+            if self.file_store is not None:
+                out_y = self.store_bytes(
+                    processing_utils.encode_array_to_png(y), "image/png"
+                )
+            else:
+                out_y = processing_utils.encode_array_to_base64(y)
         elif dtype == "file":
-            out_y = processing_utils.encode_url_or_file_to_base64(y)
+            out_y = self.store_file(y)
+            if out_y is None:
+                out_y = processing_utils.encode_url_or_file_to_base64(y)
         elif dtype == "plot":
             out_y = processing_utils.encode_plot_to_base64(y)
         else:
@@ -279,6 +332,8 @@ class Video(OutputComponent):
     Demos: video_flip
     """
 
+    cpu_intensive = True
+
     def __init__(self, type: Optional[str] = None, label: Optional[str] = None):
         """
         Parameters:
@@ -297,7 +352,7 @@ class Video(OutputComponent):
         Parameters:
         y (str): path to video
         Returns:
-        (str): base64 url data
+        (Dict[name: str, data: str]): JSON object with key 'name' for filename and 'data' for base64 url (or URL of the stored video if file_store is set)
         """
         returned_format = y.split(".")[-1].lower()
         if self.type is not None and returned_format != self.type:
@@ -307,7 +362,7 @@ class Video(OutputComponent):
             y = output_file_name
         return {
             "name": os.path.basename(y),
-            "data": processing_utils.encode_file_to_base64(y),
+            "data": self.store_file(y) or processing_utils.encode_file_to_base64(y),
         }
 
     def deserialize(self, x):
@@ -425,6 +480,8 @@ class Audio(OutputComponent):
     Demos: generate_tone, reverse_audio
     """
 
+    cpu_intensive = True
+
     def __init__(self, type: str = "auto", label: Optional[str] = None):
         """
         Parameters:
@@ -448,7 +505,7 @@ class Audio(OutputComponent):
         Parameters:
         y (Union[Tuple[int, numpy.array], str]): audio data in requested format
         Returns:
-        (str): base64 url data
+        (str): base64 url data, or URL of the stored audio if file_store is set
         """
         if self.type in ["numpy", "file", "auto"]:
             if self.type == "numpy" or (self.type == "auto" and isinstance(y, tuple)):
@@ -458,6 +515,9 @@ class Audio(OutputComponent):
                 )
                 processing_utils.audio_to_file(sample_rate, data, file.name)
                 y = file.name
+            url = self.store_file(y)
+            if url is not None:
+                return url
             return processing_utils.encode_url_or_file_to_base64(y)
         else:
             raise ValueError(
@@ -550,6 +610,8 @@ class File(OutputComponent):
     Demos: zip_two_files
     """
 
+    cpu_intensive = True
+
     def __init__(self, label: Optional[str] = None):
         """
         Parameters:
@@ -568,12 +630,12 @@ class File(OutputComponent):
         Parameters:
         y (str): file path
         Returns:
-        (Dict[name: str, size: number, data: str]): JSON object with key 'name' for filename, 'data' for base64 url, and 'size' for filesize in bytes
+        (Dict[name: str, size: number, data: str]): JSON object with key 'name' for filename, 'data' for base64 url (or URL of the stored file if file_store is set), and 'size' for filesize in bytes
         """
         return {
             "name": os.path.basename(y),
             "size": os.path.getsize(y),
-            "data": processing_utils.encode_file_to_base64(y),
+            "data": self.store_file(y) or processing_utils.encode_file_to_base64(y),
         }
 
     def save_flagged(self, dir, label, data, encryption_key):
@@ -590,6 +652,8 @@ class Dataframe(OutputComponent):
     Demos: filter_records, matrix_transpose, fraud_detector
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         headers: Optional[List[str]] = None,
@@ -678,6 +742,8 @@ class Carousel(OutputComponent):
     Demos: disease_report
     """
 
+    cpu_intensive = True
+
     def __init__(
         self,
         components: OutputComponent | List[OutputComponent],
@@ -751,6 +817,8 @@ class Timeseries(OutputComponent):
     Demos: fraud_detector
     """
 
+    cpu_intensive = True
+
     def __init__(
         self, x: str = None, y: str | List[str] = None, label: Optional[str] = None
     ):
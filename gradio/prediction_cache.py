@@ -0,0 +1,303 @@
+"""
+Caches the outputs of predictions, so that requests repeating an earlier input
+(e.g. a popular example) are answered without running the function again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from gradio.inputs import State as i_State
+from gradio.outputs import State as o_State
+from gradio.processing_utils import BinaryData
+
+if TYPE_CHECKING:  # Only import for type checking (is False at runtime).
+    from gradio.interface import Interface
+
+# Names that a function calling a random number generator usually refers to.
+NONDETERMINISTIC_NAMES = {
+    "random",
+    "rand",
+    "randn",
+    "randint",
+    "randrange",
+    "shuffle",
+    "choice",
+    "choices",
+    "multinomial",
+    "uuid4",
+    "urandom",
+}
+
+
+def _hash_code(digest, code) -> None:
+    # Nested code objects (e.g. of lambdas and comprehensions) are hashed by
+    # their content, as their repr includes their memory address.
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            _hash_code(digest, const)
+        else:
+            digest.update(repr(const).encode())
+
+
+def _code_names(code) -> set:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def _hash_binary(value: Any) -> str:
+    if isinstance(value, BinaryData):
+        return "binary:" + value.digest()
+    raise TypeError
+
+
+def is_deterministic(fn: Callable) -> bool:
+    """
+    Guesses whether a function always returns the same output for the same
+    input: functions referring to random number generators are assumed not to.
+    A function can declare it with a `deterministic` attribute instead.
+    """
+    if hasattr(fn, "deterministic"):
+        return bool(fn.deterministic)
+    code = getattr(fn, "__code__", None)
+    if code is None:  # e.g. a callable object
+        code = getattr(getattr(fn, "__call__", None), "__code__", None)
+    if code is None:
+        return True
+    return not _code_names(code) & NONDETERMINISTIC_NAMES
+
+
+def get_bypass_reason(interface: Interface) -> Optional[str]:
+    """Returns why the predictions of the Interface cannot be cached, if they cannot."""
+    if any(isinstance(i, i_State) for i in interface.input_components) or any(
+        isinstance(o, o_State) for o in interface.output_components
+    ):
+        return "the interface has State components"
+    if interface.streaming:
+        return "the interface streams its outputs"
+    for fn in interface.predict:
+        if not is_deterministic(fn):
+            return (
+                "{}() looks non-deterministic (set its `deterministic` attribute "
+                "to True to cache it anyway)".format(fn.__name__)
+            )
+    return None
+
+
+def get_fingerprint(interface: Interface) -> str:
+    """
+    Identifies the functions and components of an Interface, so that outputs
+    cached on disk are not reused after either changes.
+    """
+    digest = hashlib.sha256()
+    for fn in interface.predict:
+        digest.update(
+            "{}.{}".format(fn.__module__, getattr(fn, "__qualname__", "")).encode()
+        )
+        code = getattr(fn, "__code__", None)
+        if code is not None:
+            _hash_code(digest, code)
+    for component in interface.input_components + interface.output_components:
+        digest.update(repr(component.get_template_context()).encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    A least-recently-used cache of prediction outputs in memory, bounded by
+    number of entries, total size and age, with an optional tier on disk that
+    is kept across restarts. Safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_size: Optional[int] = None,
+        ttl: Optional[float] = None,
+        directory: Optional[str] = None,
+        max_disk_size: Optional[int] = None,
+    ):
+        """
+        Parameters:
+        max_entries (int): maximum number of outputs kept in memory.
+        max_size (int): if provided, maximum total size in bytes of the outputs kept in memory.
+        ttl (float): if provided, outputs are discarded this many seconds after they were computed.
+        directory (str): if provided, outputs are also stored in this directory, and found there after they are evicted from memory or after a restart.
+        max_disk_size (int): if provided, maximum total size in bytes of the outputs stored in the directory; the least recently used are deleted first.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        # key -> (time the output was computed, serialized output)
+        self._entries: OrderedDict[str, Tuple[float, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint: str, payload: Dict[str, Any]) -> str:
+        """Hashes a raw request payload for an Interface with the given fingerprint."""
+        digest = hashlib.sha256(fingerprint.encode())
+        digest.update(
+            orjson.dumps(payload, default=_hash_binary, option=orjson.OPT_SORT_KEYS)
+        )
+        return digest.hexdigest()
+
+    def get(
+        self, key: str, is_valid: Optional[Callable[[List[Any]], bool]] = None
+    ) -> Optional[List[Any]]:
+        """
+        Returns the cached output for the key, or None. If `is_valid` is provided,
+        an output it returns False for (e.g. because it refers to files that have
+        since been deleted) is discarded, and None is returned.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[0], now):
+                self._remove(key)
+                entry = None
+        data = entry if entry is not None else self._read_disk(key, now)
+        output = None if data is None else orjson.loads(data[1])
+        if output is not None and is_valid is not None and not is_valid(output):
+            self.discard(key)
+            output = None
+        with self._lock:
+            if output is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if entry is None:
+                self.disk_hits += 1
+                self._insert(key, data[0], data[1])
+            elif key in self._entries:
+                self._entries.move_to_end(key)
+        return output
+
+    def put(self, key: str, output: List[Any]) -> None:
+        """Stores the processed output of a prediction."""
+        now = time.time()
+        serialized = orjson.dumps(output, option=orjson.OPT_SERIALIZE_NUMPY)
+        with self._lock:
+            self._insert(key, now, serialized)
+        if self.directory is not None:
+            self._write_disk(key, serialized)
+
+    def discard(self, key: str) -> None:
+        """Removes the cached output for the key, if any, including on disk."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+        if self.directory is not None:
+            self._delete_file(os.path.join(self.directory, key))
+
+    def clear(self) -> None:
+        """Removes every cached output, including those on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the number and size of the outputs in memory and the hit counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+    def _is_expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl is not None and stored_at < now - self.ttl
+
+    def _insert(self, key: str, stored_at: float, serialized: bytes) -> None:
+        if self.max_size is not None and len(serialized) > self.max_size:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (stored_at, serialized)
+        self._size += len(serialized)
+        while len(self._entries) > self.max_entries or (
+            self.max_size is not None and self._size > self.max_size
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, serialized = self._entries.pop(key)
+        self._size -= len(serialized)
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, key)
+        try:
+            stored_at = os.path.getmtime(path)
+            with open(path, "rb") as cache_file:
+                serialized = cache_file.read()
+        except FileNotFoundError:
+            return None
+        if self._is_expired(stored_at, now):
+            self._delete_file(path)
+            return None
+        os.utime(path, (now, stored_at))  # the access time orders evictions
+        return stored_at, serialized
+
+    def _write_disk(self, key: str, serialized: bytes) -> None:
+        path = os.path.join(self.directory, key)
+        temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        with open(temp_path, "wb") as cache_file:
+            cache_file.write(serialized)
+        os.replace(temp_path, path)
+        if self.max_disk_size is not None:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_atime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_disk_size:
+                break
+            self._delete_file(path)
+            total_size -= size
+
+    @staticmethod
+    def _delete_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
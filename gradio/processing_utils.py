@@ -1,10 +1,14 @@
+from __future__ import annotations
+
 import base64
+import hashlib
 import mimetypes
 import os
 import shutil
 import tempfile
 import warnings
 from io import BytesIO
+from typing import IO, Optional
 
 import numpy as np
 import requests
@@ -17,10 +21,53 @@ with warnings.catch_warnings():
     from pydub import AudioSegment
 
 
+class BinaryData:
+    """
+    Input data received as raw bytes (e.g. a file part of a multipart/form-data
+    request) instead of a base64 data URL. The decode_base64_* functions accept
+    it wherever they accept a data URL, so components can read it directly.
+    """
+
+    def __init__(
+        self,
+        file: IO[bytes],
+        content_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ):
+        self.file = file
+        self.content_type = content_type
+        self.filename = filename
+
+    def open(self) -> IO[bytes]:
+        """Returns the file, positioned at the start of the data."""
+        self.file.seek(0)
+        return self.file
+
+    def read(self) -> bytes:
+        return self.open().read()
+
+    def get_extension(self) -> Optional[str]:
+        if self.content_type:
+            return get_extension("data:{};base64,".format(self.content_type))
+        return None
+
+    def digest(self) -> str:
+        """Returns the SHA-256 hash of the data."""
+        file = self.open()
+        sha = hashlib.sha256()
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha.update(chunk)
+        return sha.hexdigest()
+
+
 #########################
 # IMAGE PRE-PROCESSING
 #########################
 def decode_base64_to_image(encoding):
+    if isinstance(encoding, BinaryData):
+        image = Image.open(encoding.open())
+        image.load()
+        return image
     content = encoding.split(";")[1]
     image_encoded = content.split(",")[1]
     return Image.open(BytesIO(base64.b64decode(image_encoded)))
@@ -84,11 +131,15 @@ def encode_plot_to_base64(plt):
     return "data:image/png;base64," + base64_str
 
 
-def encode_array_to_base64(image_array):
+def encode_array_to_png(image_array):
     with BytesIO() as output_bytes:
         PIL_image = Image.fromarray(_convert(image_array, np.uint8, force_copy=False))
         PIL_image.save(output_bytes, "PNG")
-        bytes_data = output_bytes.getvalue()
+        return output_bytes.getvalue()
+
+
+def encode_array_to_base64(image_array):
+    bytes_data = encode_array_to_png(image_array)
     base64_str = str(base64.b64encode(bytes_data), "utf-8")
     return "data:image/png;base64," + base64_str
 
@@ -178,13 +229,18 @@ def convert_to_16_bit_wav(data):
 
 
 def decode_base64_to_binary(encoding):
+    if isinstance(encoding, BinaryData):
+        return encoding.read(), encoding.get_extension()
     extension = get_extension(encoding)
     data = encoding.split(",")[1]
     return base64.b64decode(data), extension
 
 
 def decode_base64_to_file(encoding, encryption_key=None, file_path=None):
-    data, extension = decode_base64_to_binary(encoding)
+    if isinstance(encoding, BinaryData):  # copied without loading it in memory
+        data, extension = None, encoding.get_extension()
+    else:
+        data, extension = decode_base64_to_binary(encoding)
     prefix = None
     if file_path is not None:
         filename = os.path.basename(file_path)
@@ -198,9 +254,14 @@ def decode_base64_to_file(encoding, encryption_key=None, file_path=None):
         file_obj = tempfile.NamedTemporaryFile(
             delete=False, prefix=prefix, suffix="." + extension
         )
-    if encryption_key is not None:
-        data = encryptor.encrypt(encryption_key, data)
-    file_obj.write(data)
+    if data is None and encryption_key is None:
+        shutil.copyfileobj(encoding.open(), file_obj)
+    else:
+        if data is None:
+            data = encoding.read()
+        if encryption_key is not None:
+            data = encryptor.encrypt(encryption_key, data)
+        file_obj.write(data)
     file_obj.flush()
     return file_obj
 
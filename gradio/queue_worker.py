@@ -0,0 +1,176 @@
+"""
+Runs queue workers in a separate process from the web server, so that several
+processes (e.g. one per GPU) can process the requests queued by one server:
+
+    python -m gradio.queue_worker my_app:demo --concurrency 2 --queue-dir /srv/queue
+
+where `my_app:demo` is the module and the name of the Interface in it. The module
+must not launch the Interface when it is imported. The server is launched with
+a backend sharing the same queue, for example:
+
+    demo.launch(
+        enable_queue=True,
+        persistent_queue=True,
+        local_queue_workers=False,
+        queue_backend=queueing.SQLiteQueueBackend("/srv/queue"),
+    )
+
+Other backends are passed as the module and name of a QueueBackend, or of a
+function (or class) returning one, e.g. `--backend my_backends:make_backend`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+from typing import Any, List, Optional
+
+from gradio import queueing, routes
+from gradio.interface import Interface
+from gradio.upload_store import UploadStore
+
+POLL_INTERVAL = 0.1  # seconds between checks for new jobs while the queue is empty
+
+
+def import_object(target: str) -> Any:
+    """Imports the object named by a "module:name" string."""
+    module_name, _, name = target.partition(":")
+    if not module_name or not name:
+        raise ValueError("Expected 'module:name', received: {}".format(target))
+    return getattr(importlib.import_module(module_name), name)
+
+
+def load_interface(target: str) -> Interface:
+    """Imports the Interface named by a "module:name" string."""
+    interface = import_object(target)
+    if not isinstance(interface, Interface):
+        raise TypeError("{} is not an Interface.".format(target))
+    return interface
+
+
+def load_backend(target: str) -> queueing.QueueBackend:
+    """
+    Imports the QueueBackend named by a "module:name" string, calling it first
+    if it is a function or class that returns the backend.
+    """
+    backend = import_object(target)
+    if not isinstance(backend, queueing.QueueBackend) and callable(backend):
+        backend = backend()
+    if not isinstance(backend, queueing.QueueBackend):
+        raise TypeError("{} is not a QueueBackend.".format(target))
+    return backend
+
+
+def prepare(
+    interface: Interface,
+    cache_examples: bool = False,
+    upload_directory: Optional[str] = None,
+    output_urls: bool = False,
+) -> None:
+    """Sets up the Interface to process requests, as launch() does for the server."""
+    interface.config = interface.get_config_file()
+    interface.cache_examples = cache_examples
+    interface.prediction_cache = None
+    interface.coalesce_predictions = False
+    interface.max_concurrent_predictions = None
+    interface.max_concurrent_interpretations = None
+    interface.upload_store = UploadStore(upload_directory)
+    interface.output_urls = output_urls
+    for component in interface.output_components:
+        component.file_store = interface.upload_store if output_urls else None
+    if interface.allow_flagging != "never":
+        interface.flagging_callback.setup(interface.flagging_dir)
+    routes.app.interface = interface
+
+
+async def serve(concurrency_count: int, poll_interval: float = POLL_INTERVAL) -> None:
+    """
+    Runs queue workers for the prepared Interface until cancelled, registering
+    them with the backend so that the server's estimates account for them.
+    """
+    routes.create_limiters()
+    workers = routes.create_queue_workers(concurrency_count, poll_interval)
+    await asyncio.gather(queueing.keep_workers_registered(concurrency_count), *workers)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m gradio.queue_worker",
+        description="Processes the queued requests of a gradio server.",
+    )
+    parser.add_argument("interface", help="the Interface to run, as module:name")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="number of requests processed at the same time",
+    )
+    parser.add_argument(
+        "--queue-dir", default="", help="directory of the server's queue database"
+    )
+    parser.add_argument(
+        "--backend",
+        default=None,
+        help="the server's queue_backend, or a factory of it, as module:name "
+        "(by default, the SQLite database in --queue-dir)",
+    )
+    parser.add_argument(
+        "--client-timeout",
+        type=float,
+        default=None,
+        help="the client_timeout the server was launched with",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="the max_job_attempts the server was launched with",
+    )
+    parser.add_argument(
+        "--lease-duration",
+        type=float,
+        default=30,
+        help="seconds after which a job whose worker stopped renewing its "
+        "lease is re-queued",
+    )
+    parser.add_argument(
+        "--upload-dir",
+        default=None,
+        help="directory of the server's upload_store, needed for requests "
+        "that refer to uploaded files",
+    )
+    parser.add_argument(
+        "--output-urls",
+        action="store_true",
+        help="the server was launched with output_urls=True",
+    )
+    parser.add_argument(
+        "--cache-examples",
+        action="store_true",
+        help="the server was launched with cache_examples=True",
+    )
+    args = parser.parse_args(args)
+
+    interface = load_interface(args.interface)
+    prepare(interface, args.cache_examples, args.upload_dir, args.output_urls)
+    if args.backend is None:
+        queueing.backend = queueing.SQLiteQueueBackend(args.queue_dir)
+    else:
+        queueing.backend = load_backend(args.backend)
+    queueing.backend.init(
+        concurrency_count=args.concurrency,
+        client_timeout=args.client_timeout,
+        persistent=True,
+        max_attempts=args.max_attempts,
+        lease_duration=args.lease_duration,
+    )
+    try:
+        asyncio.run(serve(args.concurrency))
+    except KeyboardInterrupt:
+        print("Keyboard interruption... stopping queue worker.")
+    finally:
+        queueing.backend.close()
+
+
+if __name__ == "__main__":
+    main()
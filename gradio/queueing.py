@@ -1,40 +1,528 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import contextvars
+import hashlib
 import json
 import os
+import shutil
 import sqlite3
+import threading
 import time
+import traceback
 import uuid
-from typing import Dict, Tuple
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
 
-import requests
+from fastapi.concurrency import run_in_threadpool
 
 DB_FILE = "gradio_queue.db"
+# Stored as the database's user_version; a persistent queue database written
+# with another schema is recreated rather than reused.
+SCHEMA_VERSION = 5
+# Strings in job payloads longer than BLOB_THRESHOLD characters (e.g. base64
+# encoded media) are stored as content-addressed files in BLOB_DIR, and only a
+# reference is kept in the database. Base64 data URLs are stored as raw bytes.
+BLOB_DIR = "gradio_queue_blobs"
+# Latency statistics are kept in a database of their own, which is never
+# deleted, so that estimates survive restarts of queues that are not persistent.
+STATS_FILE = "gradio_queue_stats.db"
+BLOB_THRESHOLD = 64 * 1024
+BLOB_KEY = "__gradio_blob__"
+
+# Each thread keeps one long-lived connection to the queue database. All open
+# connections are tracked so init() and close() can release them before the
+# database file is removed; `_generation` tells threads to reconnect afterwards.
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+# One event per running run_queue() worker, set by notify() when a job is
+# pushed so that idle workers wake up at once.
+_wakeup_events: List[asyncio.Event] = []
+
+# Status update queues of clients streaming a job's status, keyed by job hash.
+_subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+# Directory holding the queue database and blobs, set by init(). Processes that
+# share a directory share the queue.
+_directory = ""
+
+# Queue settings, set by init(). The number of jobs that may be processed at the
+# same time (used to report queue positions), the maximum number of queued
+# jobs, and how many seconds a queued job's client may go without checking its
+# status before the job is dropped.
+_concurrency_count = 1
+_max_size: Optional[int] = None
+_client_timeout: Optional[float] = None
+# Whether the database is kept across restarts, how many times a job may be
+# claimed by a worker that then stops renewing its lease (e.g. because its
+# process died) before it is failed, and how many seconds a lease lasts.
+_persistent = False
+_max_attempts = 3
+_lease_duration: float = 30
+# How often (in seconds) a client checking on a queued job is recorded, at most;
+# see get_touch_interval().
+TOUCH_INTERVAL = 5
+# Weight of the latest sample in the moving averages of queue wait and service
+# times, which are kept per action across restarts; see get_latency_stats().
+LATENCY_ALPHA = 0.2
+
+
+# Hashes of the jobs being processed in the current context; see is_cancelled().
+_current_jobs: contextvars.ContextVar[Tuple[str, ...]] = contextvars.ContextVar(
+    "current_jobs", default=()
+)
+
+
+class QueueFullError(Exception):
+    """Raised by push() when the queue already holds its maximum number of jobs."""
+
+
+async def run_queue(
+    dispatch: Callable[[Dict, str], Awaitable[Dict]],
+    dispatch_batch: Optional[
+        Callable[[List[Dict], str], Awaitable[List[Dict | Exception]]]
+    ] = None,
+    max_batch_size: int = 1,
+    max_batch_delay: float = 0,
+    poll_interval: Optional[float] = None,
+) -> None:
+    """
+    Processes jobs from the queue backend until cancelled. Must run as a task on
+    an event loop; several can run at once, each handling one job (or batch) at
+    a time. When the queue is empty, it sleeps until notify() is called, which
+    only happens for jobs pushed by the same process. Blocking backend calls are
+    run in the threadpool.
+    Parameters:
+    dispatch: coroutine function called with the job's input data and action,
+        returning the output to store for the job.
+    dispatch_batch: if provided, jobs with the same action are gathered into
+        batches and this is called with the list of their input data instead.
+        It returns one output (or the Exception that failed it) per job.
+    max_batch_size: the maximum number of jobs in a batch.
+    max_batch_delay: how many milliseconds to wait for a batch to fill up.
+    poll_interval: if provided, also checks for jobs this often (in seconds)
+        while the queue is empty, for workers that do not run in the process
+        that receives the requests. Workers check at least once per lease
+        duration anyway, so that jobs whose lease expired (e.g. because the
+        server restarted while running them) are re-queued and run.
+    """
+    job_available = asyncio.Event()
+    _wakeup_events.append(job_available)
+    try:
+        while True:
+            job_available.clear()
+            jobs = await run_in_threadpool(backend.pop_many, 1)
+            if not jobs:
+                timeout = _lease_duration
+                if poll_interval is not None:
+                    timeout = min(poll_interval, timeout)
+                try:
+                    await asyncio.wait_for(job_available.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            next_job = jobs[0]
+            await _publish_started([next_job])
+            if dispatch_batch is None or max_batch_size <= 1:
+                await _run_job(dispatch, next_job)
+                continue
+            jobs = [next_job]
+            deadline = time.monotonic() + max_batch_delay / 1000
+            while True:
+                job_available.clear()
+                more_jobs = await run_in_threadpool(
+                    backend.pop_many, max_batch_size - len(jobs), next_job[3]
+                )
+                await _publish_started(more_jobs)
+                jobs.extend(more_jobs)
+                remaining = deadline - time.monotonic()
+                if len(jobs) >= max_batch_size or remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(job_available.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            await _run_batch(dispatch_batch, jobs)
+    finally:
+        _wakeup_events.remove(job_available)
+
+
+async def _run_job(
+    dispatch: Callable[[Dict, str], Awaitable[Dict]],
+    job: Tuple[int, str, Dict, str],
+) -> None:
+    _, hash, input_data, action = job
+    _current_jobs.set((hash,))
+    heartbeat = asyncio.create_task(_renew_leases([hash]))
+    try:
+        output = await dispatch(input_data, action)
+    except Exception as error:
+        traceback.print_exc()
+        output = error
+    finally:
+        heartbeat.cancel()
+    await _finish_job(hash, output)
+    await publish_positions()
+
+
+async def _run_batch(
+    dispatch_batch: Callable[[List[Dict], str], Awaitable[List[Dict | Exception]]],
+    jobs: List[Tuple[int, str, Dict, str]],
+) -> None:
+    action = jobs[0][3]
+    _current_jobs.set(tuple(job[1] for job in jobs))
+    heartbeat = asyncio.create_task(_renew_leases([job[1] for job in jobs]))
+    try:
+        outputs = await dispatch_batch([job[2] for job in jobs], action)
+    except Exception as error:
+        traceback.print_exc()
+        outputs = [error] * len(jobs)
+    finally:
+        heartbeat.cancel()
+    for (_, hash, _, _), output in zip(jobs, outputs):
+        await _finish_job(hash, output)
+    await publish_positions()
+
+
+async def _renew_leases(hashes: List[str]) -> None:
+    while True:
+        await asyncio.sleep(_lease_duration / 3)
+        await run_in_threadpool(backend.renew_leases, hashes)
+
+
+async def keep_workers_registered(concurrency_count: int) -> None:
+    """
+    Records in the backend, until cancelled, that this process runs
+    `concurrency_count` queue workers. A server whose workers run in other
+    processes estimates queue positions and wait times from their total count.
+    Must run as a task on the event loop of a worker process.
+    """
+    worker_id = uuid.uuid4().hex
+    try:
+        while True:
+            await run_in_threadpool(
+                backend.register_workers, worker_id, concurrency_count
+            )
+            await asyncio.sleep(_lease_duration / 3)
+    finally:
+        backend.unregister_workers(worker_id)
+
+
+async def _finish_job(hash: str, output: Dict | Exception) -> None:
+    # The output of a job cancelled while it was running is dropped.
+    if isinstance(output, Exception):
+        if await run_in_threadpool(backend.fail_job, hash, str(output)):
+            publish(hash, "FAILED", str(output))
+    else:
+        if await run_in_threadpool(backend.pass_job, hash, output):
+            publish(hash, "COMPLETE", output)
+
+
+async def _publish_started(jobs: List[Tuple[int, str, Dict, str]]) -> None:
+    if jobs:
+        for _, hash, _, _ in jobs:
+            publish(hash, "PENDING", None)
+        await publish_positions()
 
 
-def queue_thread(path_to_local_server: str) -> None:
+def notify() -> None:
+    """Wakes idle queue workers after a push. Must be called on the event loop."""
+    for job_available in _wakeup_events:
+        job_available.set()
+
+
+def subscribe(hash: str) -> asyncio.Queue:
+    """
+    Returns a queue that receives a (status, data) tuple each time the status or
+    queue position of the job changes. Must be called on the event loop, and
+    paired with unsubscribe() once the client stops listening.
+    """
+    updates = asyncio.Queue()
+    _subscribers.setdefault(hash, []).append(updates)
+    return updates
+
+
+def unsubscribe(hash: str, updates: asyncio.Queue) -> None:
+    _subscribers[hash].remove(updates)
+    if not _subscribers[hash]:
+        del _subscribers[hash]
+
+
+def publish(hash: str, status: str, data: Any) -> None:
+    """Sends a status update to every client subscribed to the job."""
+    for updates in _subscribers.get(hash, []):
+        updates.put_nowait((status, data))
+
+
+async def publish_partial(output: Dict) -> None:
+    """
+    Stores and publishes a partial output of the job being processed in the
+    current context (e.g. each value yielded by a generator function), which
+    clients receive with the PENDING status.
+    """
+    hashes = _current_jobs.get()
+    if len(hashes) != 1:
+        raise ValueError("Partial outputs are only supported for single jobs.")
+    if await run_in_threadpool(backend.store_partial, hashes[0], output):
+        publish(hashes[0], "PENDING", output)
+
+
+async def publish_positions() -> None:
+    """
+    Sends the current queue position to every subscribed job that is still
+    queued. Called once per queue transition, so the positions are computed
+    with one query no matter how many clients are listening.
+    """
+    if not _subscribers:
+        return
+    positions = await run_in_threadpool(backend.get_queue_positions, list(_subscribers))
+    for hash, position in positions.items():
+        publish(hash, "QUEUED", position)
+
+
+async def run_sweeper(
+    max_age: Optional[float], max_count: Optional[int], interval: float = 60
+) -> None:
+    """
+    Periodically evicts finished jobs with evict_jobs() until cancelled. Must
+    run as a task on the server's event loop.
+    """
+    if max_age is not None:
+        interval = min(interval, max_age)
     while True:
+        await asyncio.sleep(interval)
         try:
-            next_job = pop()
-            if next_job is not None:
-                _, hash, input_data, task_type = next_job
-                start_job(hash)
-                response = requests.post(
-                    path_to_local_server + "api/" + task_type + "/", json=input_data
-                )
-                if response.status_code == 200:
-                    pass_job(hash, response.json())
-                else:
-                    fail_job(hash, response.text)
-            else:
-                time.sleep(1)
-        except:
-            time.sleep(1)
-            pass
+            await run_in_threadpool(backend.evict_jobs, max_age, max_count)
+        except sqlite3.Error:
+            traceback.print_exc()
 
 
-def generate_hash() -> str:
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the calling thread's connection to the queue database, opening it
+    on first use (or after the database was re-initialized). Connections run in
+    autocommit mode with WAL journaling, so status reads are never blocked by
+    a writer and each operation controls its own transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+    conn = sqlite3.connect(
+        _db_path(),
+        timeout=30,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=64,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("ATTACH DATABASE ? AS stats", (_stats_path(),))
+    conn.execute("PRAGMA stats.journal_mode=WAL")
+    with _connections_lock:
+        _connections.append(conn)
+    _local.conn = conn
+    _local.generation = _generation
+    return conn
+
+
+def close_connections() -> None:
+    """Closes every pooled connection; threads reconnect on their next call."""
+    global _generation
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _generation += 1
+
+
+@contextmanager
+def transaction(immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+    """
+    Runs a block of queries in a single transaction on the calling thread's
+    pooled connection. Pass immediate=True for read-modify-write operations,
+    which takes the write lock up front instead of upgrading a read snapshot.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _db_path() -> str:
+    return os.path.join(_directory, DB_FILE)
+
+
+def _stats_path() -> str:
+    return os.path.join(_directory, STATS_FILE)
+
+
+def _blob_dir() -> str:
+    return os.path.join(_directory, BLOB_DIR)
+
+
+def _remove_db_files() -> None:
+    for path in (_db_path(), _db_path() + "-wal", _db_path() + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(_blob_dir(), ignore_errors=True)
+
+
+def _dump_payload(payload: Dict) -> Tuple[str, Dict[str, bytes]]:
+    """
+    Serializes a job payload, replacing long strings with blob references.
+    Returns the JSON string and the contents of the referenced blobs by hash.
+    """
+    blobs = {}
+
+    def spill(value):
+        if isinstance(value, str) and len(value) > BLOB_THRESHOLD:
+            prefix, data = None, None
+            if value.startswith("data:"):
+                header, _, encoded = value.partition(",")
+                if header.endswith(";base64"):
+                    try:
+                        data = base64.b64decode(encoded, validate=True)
+                        prefix = header + ","
+                    except binascii.Error:
+                        pass
+            if data is None:
+                data = value.encode("utf-8")
+            sha = hashlib.sha256(data).hexdigest()
+            blobs[sha] = data
+            return {BLOB_KEY: sha, "prefix": prefix}
+        elif isinstance(value, dict):
+            return {key: spill(item) for key, item in value.items()}
+        elif isinstance(value, list):
+            return [spill(item) for item in value]
+        return value
+
+    return json.dumps(spill(payload)), blobs
+
+
+def _load_payload(payload: str) -> Dict:
+    """Deserializes a job payload, reading back any blobs it references."""
+
+    def restore(value):
+        if isinstance(value, dict):
+            if BLOB_KEY in value:
+                with open(_blob_path(value[BLOB_KEY]), "rb") as blob_file:
+                    data = blob_file.read()
+                if value["prefix"] is None:
+                    return data.decode("utf-8")
+                return value["prefix"] + base64.b64encode(data).decode("ascii")
+            return {key: restore(item) for key, item in value.items()}
+        elif isinstance(value, list):
+            return [restore(item) for item in value]
+        return value
+
+    return restore(json.loads(payload))
+
+
+def _blob_path(sha: str) -> str:
+    return os.path.join(_blob_dir(), sha)
+
+
+def _write_blobs(blobs: Dict[str, bytes]) -> None:
+    for sha, data in blobs.items():
+        path = _blob_path(sha)
+        if not os.path.exists(path):
+            temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+            with open(temp_path, "wb") as blob_file:
+                blob_file.write(data)
+            os.replace(temp_path, path)
+
+
+def _retain_blobs(c: sqlite3.Cursor, blobs: Dict[str, bytes]) -> None:
+    """
+    Adds a reference to each blob. Blobs are written before the transaction to
+    keep the write lock short; one released in the meantime is rewritten here.
+    """
+    for sha in blobs:
+        c.execute(
+            """
+            INSERT INTO blobs (sha, refs) VALUES (?, 1)
+            ON CONFLICT (sha) DO UPDATE SET refs = refs + 1;
+        """,
+            (sha,),
+        )
+    _write_blobs(blobs)
+
+
+def _discard_blobs(c: sqlite3.Cursor, blobs: Dict[str, bytes]) -> None:
+    """Deletes blobs written for a payload that was not stored after all."""
+    for sha in blobs:
+        c.execute(
+            """
+            SELECT refs FROM blobs WHERE sha = ?;
+        """,
+            (sha,),
+        )
+        if c.fetchone() is None and os.path.exists(_blob_path(sha)):
+            os.remove(_blob_path(sha))
+
+
+def _release_blobs(c: sqlite3.Cursor, shas: List[str]) -> None:
+    """Drops a reference to each blob, deleting those no longer referenced."""
+    c.executemany(
+        """
+        UPDATE blobs SET refs = refs - 1 WHERE sha = ?;
+    """,
+        [(sha,) for sha in shas],
+    )
+    c.execute(
+        """
+        SELECT sha FROM blobs WHERE refs <= 0;
+    """
+    )
+    unreferenced = [sha for sha, in c.fetchall()]
+    c.executemany(
+        """
+        DELETE FROM blobs WHERE sha = ?;
+    """,
+        [(sha,) for sha in unreferenced],
+    )
+    for sha in unreferenced:
+        if os.path.exists(_blob_path(sha)):
+            os.remove(_blob_path(sha))
+
+
+def _release_input(c: sqlite3.Cursor, hash: str) -> None:
+    """Drops the input of a finished job, which is kept until then for retries."""
+    c.execute(
+        """
+        UPDATE queue SET input_data = '' WHERE hash = ?;
+    """,
+        (hash,),
+    )
+    c.execute(
+        """
+        SELECT input_blobs FROM queue WHERE hash = ?;
+    """,
+        (hash,),
+    )
+    result = c.fetchone()
+    if result is not None and result[0]:
+        _release_blobs(c, json.loads(result[0]))
+        c.execute(
+            """
+            UPDATE queue SET input_blobs = NULL WHERE hash = ?;
+        """,
+            (hash,),
+        )
+
+
+def _generate_hash(c: sqlite3.Cursor) -> str:
     generate = True
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
     while generate:
         hash = uuid.uuid4().hex
         c.execute(
@@ -45,211 +533,1163 @@ def generate_hash() -> str:
             (hash,),
         )
         generate = c.fetchone() is not None
-    conn.commit()
     return hash
 
 
-def init() -> None:
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        """CREATE TABLE queue (
-            queue_index integer PRIMARY KEY,
-            hash text,
-            input_data text,
-            action text,
-            popped integer DEFAULT 0
-        );"""
-    )
-    c.execute(
+def generate_hash() -> str:
+    with transaction() as c:
+        return _generate_hash(c)
+
+
+def init(
+    concurrency_count: int = 1,
+    max_size: Optional[int] = None,
+    client_timeout: Optional[float] = None,
+    persistent: bool = False,
+    max_attempts: int = 3,
+    lease_duration: float = 30,
+    directory: str = "",
+) -> None:
+    """
+    Sets up the queue database in `directory`. Unless `persistent` is True, any
+    existing queue is deleted; a persistent queue keeps its jobs across
+    restarts, and jobs that were running when the previous process stopped are
+    re-queued once their leases expire. Worker processes sharing the queue of a
+    server open it with persistent=True.
+    """
+    global _concurrency_count, _max_size, _client_timeout
+    global _persistent, _max_attempts, _lease_duration, _directory
+    _concurrency_count = concurrency_count
+    _max_size = max_size
+    _client_timeout = client_timeout
+    _persistent = persistent
+    _max_attempts = max_attempts
+    _lease_duration = lease_duration
+    close_connections()
+    _directory = directory
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Latency statistics are kept even when the queue is not.
+    get_connection().execute(
         """
-        CREATE TABLE jobs (
-            hash text PRIMARY KEY,
-            status text,
-            output_data text,
-            error_message text
+        CREATE TABLE IF NOT EXISTS stats.latency (
+            action text,
+            kind text,
+            mean real,
+            count integer,
+            PRIMARY KEY (action, kind)
         );
     """
     )
-    conn.commit()
+    if os.path.exists(_db_path()) and persistent:
+        conn = get_connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            os.makedirs(_blob_dir(), exist_ok=True)
+            # Clients had no server to check in with while it was down.
+            conn.execute(
+                "UPDATE queue SET last_seen = ? WHERE popped = 0", (time.time(),)
+            )
+            return
+    close_connections()
+    _remove_db_files()
+    os.makedirs(_blob_dir())
+    # Lets evict_jobs() return the space of deleted jobs to the filesystem.
+    get_connection().execute("PRAGMA auto_vacuum = INCREMENTAL")
+    get_connection().execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+    with transaction() as c:
+        c.execute(
+            """CREATE TABLE queue (
+                queue_index integer PRIMARY KEY,
+                hash text,
+                input_data text,
+                input_blobs text,
+                action text,
+                popped integer DEFAULT 0,
+                deadline real,
+                last_seen real,
+                session text,
+                attempts integer DEFAULT 0,
+                priority integer DEFAULT 0,
+                fair_tag real DEFAULT 0,
+                pushed_at real
+            );"""
+        )
+        c.execute(
+            """
+            CREATE TABLE jobs (
+                hash text PRIMARY KEY,
+                status text,
+                output_data text,
+                output_blobs text,
+                error_message text,
+                finished_at real,
+                lease_expires real,
+                started_at real
+            );
+        """
+        )
+        c.execute(
+            """
+            CREATE TABLE blobs (
+                sha text PRIMARY KEY,
+                refs integer
+            );
+        """
+        )
+        c.execute(
+            """
+            CREATE TABLE clients (
+                client text PRIMARY KEY,
+                last_tag real
+            );
+        """
+        )
+        c.execute(
+            """
+            CREATE TABLE workers (
+                id text PRIMARY KEY,
+                concurrency integer,
+                expires_at real
+            );
+        """
+        )
+        c.execute("CREATE TABLE scheduler (virtual_time real);")
+        c.execute("INSERT INTO scheduler (virtual_time) VALUES (0);")
+        # Partial indexes only cover queued and running jobs, so positions are
+        # counted over the live queue rather than every job ever pushed.
+        c.execute("CREATE UNIQUE INDEX queue_hash ON queue (hash);")
+        c.execute(
+            """
+            CREATE INDEX queue_waiting ON queue (priority DESC, fair_tag, queue_index)
+            WHERE popped = 0;
+        """
+        )
+        c.execute(
+            "CREATE INDEX jobs_pending ON jobs (status) WHERE status = 'PENDING';"
+        )
+        c.execute(
+            "CREATE INDEX jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;"
+        )
 
 
 def close() -> None:
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
+    close_connections()
+    if not _persistent:
+        _remove_db_files()
 
 
-def pop() -> Tuple[int, str, Dict, str]:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("BEGIN EXCLUSIVE")
+def _get_queue_position(
+    c: sqlite3.Cursor, priority: int, fair_tag: float, queue_index: int
+) -> int:
+    """Counts the queued jobs that will be claimed before the given one."""
     c.execute(
         """
-        SELECT queue_index, hash, input_data, action FROM queue
-        WHERE popped = 0 ORDER BY queue_index ASC LIMIT 1;
-    """
+        SELECT COUNT(*) FROM queue WHERE popped = 0
+        AND (-priority, fair_tag, queue_index) < (?, ?, ?);
+    """,
+        (-priority, fair_tag, queue_index),
     )
-    result = c.fetchone()
-    if result is None:
-        conn.commit()
-        return None
-    queue_index = result[0]
+    queue_position = c.fetchone()[0]
     c.execute(
         """
-        UPDATE queue SET popped = 1, input_data = '' WHERE queue_index = ?;
-    """,
-        (queue_index,),
+        SELECT COUNT(*) FROM jobs WHERE status = 'PENDING';
+    """
     )
-    conn.commit()
-    return result[0], result[1], json.loads(result[2]), result[3]
+    if c.fetchone()[0] >= _get_concurrency(c):  # every worker is busy
+        queue_position += 1
+    return queue_position
 
 
-def push(input_data: Dict, action: str) -> Tuple[str, int]:
-    input_data = json.dumps(input_data)
-    hash = generate_hash()
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+def _get_concurrency(c: sqlite3.Cursor) -> int:
+    """
+    Returns the number of jobs that can run at once: that of the worker
+    processes registered with keep_workers_registered(), if any, or else the
+    concurrency_count the queue was opened with.
+    """
     c.execute(
         """
-        INSERT INTO queue (hash, input_data, action)
-        VALUES (?, ?, ?);
+        SELECT SUM(concurrency) FROM workers WHERE expires_at > ?;
     """,
-        (hash, input_data, action),
+        (time.time(),),
     )
-    queue_index = c.lastrowid
+    return c.fetchone()[0] or _concurrency_count
+
+
+def pop() -> Tuple[int, str, Dict, str]:
+    """
+    Claims the next queued job and marks it as started, in one transaction so
+    that concurrent workers never receive the same job.
+    """
+    jobs = pop_many(1)
+    return jobs[0] if jobs else None
+
+
+def pop_many(
+    max_count: int, action: Optional[str] = None
+) -> List[Tuple[int, str, Dict, str]]:
+    """
+    Claims up to `max_count` queued jobs (only those for `action`, if provided)
+    in scheduling order and marks them as started, like pop(). Jobs whose deadline has
+    passed, or whose client stopped checking on them, are failed instead. Each
+    claimed job is leased to the caller, which must renew the lease with
+    renew_leases() until the job finishes, or it is re-queued.
+    """
+    now = time.time()
+    claimed, expired = [], []
+    with transaction(immediate=True) as c:
+        _requeue_expired(c, now)
+        virtual_time = _get_virtual_time(c)
+        while len(claimed) < max_count:
+            if action is None:
+                c.execute(
+                    """
+                    SELECT queue_index, hash, input_data, action, deadline,
+                    last_seen, fair_tag, pushed_at FROM queue WHERE popped = 0
+                    ORDER BY priority DESC, fair_tag ASC, queue_index ASC LIMIT ?;
+                """,
+                    (max_count - len(claimed),),
+                )
+            else:
+                c.execute(
+                    """
+                    SELECT queue_index, hash, input_data, action, deadline,
+                    last_seen, fair_tag, pushed_at FROM queue
+                    WHERE popped = 0 AND action = ?
+                    ORDER BY priority DESC, fair_tag ASC, queue_index ASC LIMIT ?;
+                """,
+                    (action, max_count - len(claimed)),
+                )
+            results = c.fetchall()
+            if not results:
+                break
+            for result in results:
+                deadline, last_seen, fair_tag, pushed_at = result[4:]
+                if deadline is not None and deadline < now:
+                    expired.append((result[1], "Request expired before it started."))
+                elif _client_timeout is not None and last_seen < now - _client_timeout:
+                    expired.append((result[1], "Client stopped waiting for request."))
+                else:
+                    claimed.append(result[:4])
+                    virtual_time = max(virtual_time, fair_tag)
+                    _record_latency(c, result[3], "wait", now - pushed_at)
+            c.executemany(
+                """
+                UPDATE queue SET popped = 1, attempts = attempts + 1
+                WHERE queue_index = ?;
+            """,
+                [(result[0],) for result in results],
+            )
+        c.executemany(
+            """
+            INSERT INTO jobs (hash, status, lease_expires, started_at)
+            VALUES (?, 'PENDING', ?, ?);
+        """,
+            [(result[1], now + _lease_duration, now) for result in claimed],
+        )
+        c.execute("UPDATE scheduler SET virtual_time = ?;", (virtual_time,))
+        c.executemany(
+            """
+            INSERT INTO jobs (hash, status, error_message, finished_at)
+            VALUES (?, 'FAILED', ?, ?);
+        """,
+            [(hash, error_message, now) for hash, error_message in expired],
+        )
+        for hash, _ in expired:
+            _release_input(c, hash)
+    # The job holds references to its input blobs until it finishes, so they
+    # can be read after the transaction.
+    return [
+        (result[0], result[1], _load_payload(result[2]), result[3])
+        for result in claimed
+    ]
+
+
+def _requeue_expired(c: sqlite3.Cursor, now: float) -> None:
+    """
+    Puts running jobs whose lease expired back in the queue at their original
+    position, or fails them if they have been claimed too many times.
+    """
     c.execute(
         """
-        SELECT COUNT(*) FROM queue WHERE queue_index < ? and popped = 0;
+        SELECT jobs.hash, queue.attempts FROM jobs JOIN queue ON queue.hash = jobs.hash
+        WHERE jobs.status = 'PENDING' AND jobs.lease_expires < ?;
     """,
-        (queue_index,),
+        (now,),
     )
-    queue_position = c.fetchone()[0]
-    if queue_position is None:
-        conn.commit()
-        raise ValueError("Hash not found.")
+    for hash, attempts in c.fetchall():
+        if attempts >= _max_attempts:
+            c.execute(
+                """
+                UPDATE jobs SET status = 'FAILED', error_message = ?, finished_at = ?
+                WHERE hash = ?;
+            """,
+                ("Request was interrupted {} times.".format(attempts), now, hash),
+            )
+            _release_input(c, hash)
+        else:
+            _release_partial_output(c, hash)
+            c.execute("DELETE FROM jobs WHERE hash = ?;", (hash,))
+            c.execute("UPDATE queue SET popped = 0 WHERE hash = ?;", (hash,))
+
+
+def register_workers(worker_id: str, concurrency_count: int) -> None:
+    """
+    Records that a worker process runs `concurrency_count` workers, for one
+    lease duration; see keep_workers_registered().
+    """
+    with transaction(immediate=True) as c:
+        c.execute(
+            """
+            INSERT OR REPLACE INTO workers (id, concurrency, expires_at)
+            VALUES (?, ?, ?);
+        """,
+            (worker_id, concurrency_count, time.time() + _lease_duration),
+        )
+
+
+def unregister_workers(worker_id: str) -> None:
+    with transaction(immediate=True) as c:
+        c.execute("DELETE FROM workers WHERE id = ?;", (worker_id,))
+
+
+def renew_leases(hashes: List[str]) -> None:
+    """Extends the leases of running jobs; see pop_many()."""
+    with transaction(immediate=True) as c:
+        c.executemany(
+            """
+            UPDATE jobs SET lease_expires = ? WHERE hash = ? AND status = 'PENDING';
+        """,
+            [(time.time() + _lease_duration, hash) for hash in hashes],
+        )
+
+
+def _get_virtual_time(c: sqlite3.Cursor) -> float:
     c.execute(
         """
-        SELECT COUNT(*) FROM jobs WHERE status = "PENDING";
+        SELECT virtual_time FROM scheduler;
     """
     )
-    result = c.fetchone()
-    if not (result[0] == 0):
-        queue_position += 1
-    conn.commit()
-    return hash, queue_position
+    return c.fetchone()[0]
 
 
-def get_status(hash: str) -> Tuple[str, int]:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+def _next_fair_tag(c: sqlite3.Cursor, client: Optional[str], weight: float) -> float:
+    """
+    Returns the tag that orders a new job of `client` among queued jobs, using
+    start-time fair queueing: a client's jobs are spaced 1 / weight apart from
+    the later of its previous job and the tag of the last claimed job (the
+    virtual time), so a client that queued many jobs does not hold back clients
+    that queue their first.
+    """
+    start = _get_virtual_time(c)
+    if client is not None:
+        c.execute(
+            """
+            SELECT last_tag FROM clients WHERE client = ?;
+        """,
+            (client,),
+        )
+        result = c.fetchone()
+        if result is not None:
+            start = max(start, result[0])
+    fair_tag = start + 1 / weight
+    if client is not None:
+        c.execute(
+            """
+            INSERT INTO clients (client, last_tag) VALUES (?, ?)
+            ON CONFLICT (client) DO UPDATE SET last_tag = excluded.last_tag;
+        """,
+            (client, fair_tag),
+        )
+    return fair_tag
+
+
+def _record_latency(c: sqlite3.Cursor, action: str, kind: str, value: float) -> None:
+    """Adds a sample to the exponential moving average of a kind of latency."""
     c.execute(
         """
-        SELECT queue_index, popped FROM queue WHERE hash = ?;
+        INSERT INTO latency (action, kind, mean, count) VALUES (?, ?, ?, 1)
+        ON CONFLICT (action, kind) DO UPDATE
+        SET mean = mean + ? * (excluded.mean - mean), count = count + 1;
     """,
-        (hash,),
+        (action, kind, value, LATENCY_ALPHA),
     )
-    result = c.fetchone()
-    if result is None:
-        conn.commit()
-        raise ValueError("Hash not found.")
-    if result[1] == 1:  # in jobs
+
+
+def get_latency_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Returns the moving averages of how long jobs waited in the queue ("wait")
+    and took to process once claimed ("service"), in seconds, with the number
+    of samples, by action. For example:
+    {"predict": {"wait": {"mean": 4.2, "count": 120}, "service": {...}}}
+    """
+    stats = {}
+    with transaction() as c:
         c.execute(
             """
-            SELECT status, output_data, error_message FROM jobs WHERE hash = ?;
+            SELECT action, kind, mean, count FROM latency;
+        """
+        )
+        for action, kind, mean, count in c.fetchall():
+            stats.setdefault(action, {})[kind] = {"mean": mean, "count": count}
+    return stats
+
+
+def get_estimates(hash: str) -> Dict[str, float]:
+    """
+    Estimates when a queued or running job starts and completes, as Unix
+    timestamps, from its queue position, the number of workers and the average
+    service time of its action. Returns an empty dict for other jobs, or before
+    any job of the action completed.
+    """
+    with transaction() as c:
+        c.execute(
+            """
+            SELECT popped, priority, fair_tag, queue_index, action
+            FROM queue WHERE hash = ?;
         """,
             (hash,),
         )
         result = c.fetchone()
         if result is None:
-            conn.commit()
-            return "NOT FOUND", None
+            return {}
+        popped, priority, fair_tag, queue_index, action = result
+        c.execute(
+            """
+            SELECT mean FROM latency WHERE action = ? AND kind = 'service';
+        """,
+            (action,),
+        )
+        service_time = c.fetchone()
+        if service_time is None:
+            return {}
+        service_time = service_time[0]
+        now = time.time()
+        if popped == 0:
+            queue_position = _get_queue_position(c, priority, fair_tag, queue_index)
+            start = now + service_time * queue_position / _get_concurrency(c)
         else:
-            status, output_data, error_message = result
-            if status == "PENDING":
-                conn.commit()
-                return "PENDING", None
-            elif status == "FAILED":
-                conn.commit()
-                return "FAILED", error_message
-            elif status == "COMPLETE":
-                c.execute(
-                    """
-                    UPDATE jobs SET output_data = '' WHERE hash = ?;
-                """,
-                    (hash,),
-                )
-                conn.commit()
-                output_data = json.loads(output_data)
-                return "COMPLETE", output_data
-    else:  # in queue
-        queue_index = result[0]
+            c.execute(
+                """
+                SELECT started_at FROM jobs WHERE hash = ? AND status = 'PENDING';
+            """,
+                (hash,),
+            )
+            started_at = c.fetchone()
+            if started_at is None:
+                return {}
+            start = started_at[0]
+    return {
+        "estimated_start": start,
+        "estimated_completion": max(now, start + service_time),
+    }
+
+
+def _is_full(c: sqlite3.Cursor) -> bool:
+    if _max_size is None:
+        return False
+    c.execute(
+        """
+        SELECT COUNT(*) FROM queue WHERE popped = 0;
+    """
+    )
+    return c.fetchone()[0] >= _max_size
+
+
+def push(
+    input_data: Dict,
+    action: str,
+    timeout: Optional[float] = None,
+    session: Optional[str] = None,
+    priority: int = 0,
+    client: Optional[str] = None,
+    weight: float = 1,
+) -> Tuple[str, int]:
+    """
+    Adds a job to the queue. Jobs are claimed in order of priority, and within
+    a priority, in weighted fair order across clients: each client's jobs are
+    interleaved with those of other clients, in proportion to their weights,
+    rather than served first come, first served.
+    Parameters:
+    input_data: the request body of the job.
+    action: the name of the endpoint that processes the job (e.g. "predict").
+    timeout: if provided, the job is dropped if it has not started after this many seconds.
+    session: identifies the browser session that pushed the job, see supersede().
+    priority: jobs with a higher priority are claimed first.
+    client: identifies the user or client that pushed the job, for fair scheduling. If None, the job is scheduled as a client of its own.
+    weight: the client's share of the workers relative to other clients.
+    Returns:
+    hash: the job's hash, used to check on its status.
+    queue_position: the number of jobs ahead of it.
+    Raises:
+    QueueFullError: if the queue already holds its maximum number of jobs.
+    """
+    with transaction() as c:
+        if _is_full(c):
+            raise QueueFullError()
+    now = time.time()
+    deadline = None if timeout is None else now + timeout
+    input_data, blobs = _dump_payload(input_data)
+    _write_blobs(blobs)
+    with transaction(immediate=True) as c:
+        if _is_full(c):  # filled up while the blobs were written
+            _discard_blobs(c, blobs)
+            raise QueueFullError()
+        hash = _generate_hash(c)
+        _retain_blobs(c, blobs)
+        fair_tag = _next_fair_tag(c, client, weight)
         c.execute(
             """
-            SELECT COUNT(*) FROM queue WHERE queue_index < ? and popped = 0;
+            INSERT INTO queue (hash, input_data, input_blobs, action, deadline,
+            last_seen, session, priority, fair_tag, pushed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
         """,
-            (queue_index,),
+            (
+                hash,
+                input_data,
+                json.dumps(list(blobs)),
+                action,
+                deadline,
+                now,
+                session,
+                priority,
+                fair_tag,
+                now,
+            ),
         )
-        result = c.fetchone()
-        queue_position = result[0]
+        queue_position = _get_queue_position(c, priority, fair_tag, c.lastrowid)
+    return hash, queue_position
+
+
+def get_touch_interval(client_timeout: Optional[float]) -> float:
+    """
+    Returns how often a client checking on a queued job is recorded: often
+    enough that a client that keeps checking never reaches the client_timeout.
+    """
+    if client_timeout is None:
+        return TOUCH_INTERVAL
+    return min(TOUCH_INTERVAL, client_timeout / 4)
+
+
+def touch(hash: str) -> None:
+    """Records that the client of a queued job is still waiting for it."""
+    with transaction(immediate=True) as c:
         c.execute(
             """
-            SELECT COUNT(*) FROM jobs WHERE status = "PENDING";
-        """
+            UPDATE queue SET last_seen = ? WHERE hash = ?;
+        """,
+            (time.time(), hash),
+        )
+
+
+def get_status(hash: str) -> Tuple[str, int]:
+    with transaction() as c:
+        c.execute(
+            """
+            SELECT popped, last_seen, priority, fair_tag, queue_index
+            FROM queue WHERE hash = ?;
+        """,
+            (hash,),
         )
         result = c.fetchone()
-        if not (result[0] == 0):
-            queue_position += 1
-        conn.commit()
+        if result is None:
+            raise ValueError("Hash not found.")
+        if result[0] == 0:  # in queue
+            queue_position = _get_queue_position(c, *result[2:])
+            last_seen = result[1]
+        else:
+            queue_position = None
+    if queue_position is not None:
+        if _client_timeout is not None and last_seen < time.time() - get_touch_interval(
+            _client_timeout
+        ):
+            touch(hash)
         return "QUEUED", queue_position
+    with transaction() as c:
+        c.execute(
+            """
+            SELECT status, output_data, error_message FROM jobs WHERE hash = ?;
+        """,
+            (hash,),
+        )
+        result = c.fetchone()
+    if result is None:
+        return "NOT FOUND", None
+    status, output_data, error_message = result
+    if status == "PENDING":
+        return "PENDING", _load_payload(output_data) if output_data else None
+    elif status == "FAILED":
+        return "FAILED", error_message
+    elif status == "CANCELLED":
+        return "CANCELLED", None
+    elif status == "COMPLETE":
+        output_data = _load_payload(output_data)
+        clear_output(hash)
+        return "COMPLETE", output_data
+
+
+def clear_output(hash: str) -> None:
+    """
+    Deletes the output of a completed job, and releases its blobs, once it has
+    been delivered to the client.
+    """
+    with transaction(immediate=True) as c:
+        c.execute(
+            """
+            UPDATE jobs SET output_data = '' WHERE hash = ? AND output_data != '';
+        """,
+            (hash,),
+        )
+        if c.rowcount:
+            c.execute(
+                """
+                SELECT output_blobs FROM jobs WHERE hash = ?;
+            """,
+                (hash,),
+            )
+            _release_blobs(c, json.loads(c.fetchone()[0] or "[]"))
+
+
+def get_queue_positions(hashes: List[str]) -> Dict[str, int]:
+    """Returns the queue positions of those of the given jobs that are still queued."""
+    hashes = set(hashes)
+    positions = {}
+    with transaction() as c:
+        c.execute(
+            """
+            SELECT hash FROM queue WHERE popped = 0
+            ORDER BY priority DESC, fair_tag ASC, queue_index ASC;
+        """
+        )
+        for queue_position, (hash,) in enumerate(c):
+            if hash in hashes:
+                positions[hash] = queue_position
+        c.execute(
+            """
+            SELECT COUNT(*) FROM jobs WHERE status = 'PENDING';
+        """
+        )
+        if c.fetchone()[0] >= _get_concurrency(c):  # every worker is busy
+            positions = {hash: position + 1 for hash, position in positions.items()}
+    return positions
+
+
+def evict_jobs(max_age: Optional[float] = None, max_count: Optional[int] = None) -> int:
+    """
+    Deletes finished (completed or failed) jobs, including any output that was
+    never retrieved. Queued and running jobs are never evicted.
+    Parameters:
+    max_age: jobs that finished more than this many seconds ago are deleted.
+    max_count: only the most recently finished `max_count` jobs are kept.
+    Returns:
+    the number of jobs deleted.
+    """
+    hashes = set()
+    with transaction(immediate=True) as c:
+        if max_age is not None:
+            c.execute(
+                """
+                SELECT hash FROM jobs WHERE finished_at < ?;
+            """,
+                (time.time() - max_age,),
+            )
+            hashes.update(hash for hash, in c.fetchall())
+        if max_count is not None:
+            c.execute(
+                """
+                SELECT hash FROM jobs WHERE finished_at IS NOT NULL
+                ORDER BY finished_at DESC LIMIT -1 OFFSET ?;
+            """,
+                (max_count,),
+            )
+            hashes.update(hash for hash, in c.fetchall())
+        for hash in hashes:
+            _release_input(c, hash)
+            c.execute(
+                """
+                SELECT output_blobs FROM jobs WHERE hash = ? AND output_data != '';
+            """,
+                (hash,),
+            )
+            result = c.fetchone()
+            if result is not None and result[0]:
+                _release_blobs(c, json.loads(result[0]))
+        c.executemany(
+            """
+            DELETE FROM queue WHERE hash = ?;
+        """,
+            [(hash,) for hash in hashes],
+        )
+        c.executemany(
+            """
+            DELETE FROM jobs WHERE hash = ?;
+        """,
+            [(hash,) for hash in hashes],
+        )
+        # Clients whose last job was claimed are scheduled as new clients anyway.
+        c.execute(
+            """
+            DELETE FROM clients WHERE last_tag <= (SELECT virtual_time FROM scheduler);
+        """
+        )
+    if hashes:
+        get_connection().execute("PRAGMA incremental_vacuum;")
+    return len(hashes)
 
 
 def start_job(hash: str) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("BEGIN EXCLUSIVE")
+    with transaction(immediate=True) as c:
+        c.execute(
+            """
+            UPDATE queue SET popped = 1 WHERE hash = ?;
+        """,
+            (hash,),
+        )
+        c.execute(
+            """
+            INSERT OR IGNORE INTO jobs (hash, status) VALUES (?, 'PENDING');
+        """,
+            (hash,),
+        )
+
+
+def _finish_input(c: sqlite3.Cursor, hash: str) -> None:
+    """
+    Drops the input of a job whose worker is done with it, unless the job was
+    re-queued because that worker lost its lease.
+    """
     c.execute(
         """
-        UPDATE queue SET popped = 1 WHERE hash = ?;
+        SELECT popped FROM queue WHERE hash = ?;
     """,
         (hash,),
     )
+    result = c.fetchone()
+    if result is not None and result[0] == 1:
+        _release_input(c, hash)
+
+
+def fail_job(hash: str, error_message: str) -> bool:
+    """
+    Stores the error of a running job. Returns False if the job was cancelled
+    or re-queued in the meantime.
+    """
+    with transaction(immediate=True) as c:
+        _release_partial_output(c, hash)
+        c.execute(
+            """
+            UPDATE jobs SET status = 'FAILED', error_message = ?, finished_at = ?
+            WHERE hash = ? AND status = 'PENDING';
+        """,
+            (
+                error_message,
+                time.time(),
+                hash,
+            ),
+        )
+        failed = c.rowcount > 0
+        _finish_input(c, hash)
+    return failed
+
+
+def pass_job(hash: str, output_data: Dict) -> bool:
+    """
+    Stores the output of a running job. Returns False if the job was cancelled
+    or re-queued in the meantime.
+    """
+    output_data, blobs = _dump_payload(output_data)
+    _write_blobs(blobs)
+    with transaction(immediate=True) as c:
+        _release_partial_output(c, hash)
+        c.execute(
+            """
+            UPDATE jobs SET status = 'COMPLETE', output_data = ?, output_blobs = ?,
+            finished_at = ? WHERE hash = ? AND status = 'PENDING';
+        """,
+            (
+                output_data,
+                json.dumps(list(blobs)),
+                time.time(),
+                hash,
+            ),
+        )
+        passed = c.rowcount > 0
+        if passed:
+            _retain_blobs(c, blobs)
+            c.execute(
+                """
+                SELECT queue.action, jobs.finished_at - jobs.started_at
+                FROM jobs JOIN queue ON queue.hash = jobs.hash WHERE jobs.hash = ?;
+            """,
+                (hash,),
+            )
+            result = c.fetchone()
+            if result is not None and result[1] is not None:
+                _record_latency(c, result[0], "service", result[1])
+        else:
+            _discard_blobs(c, blobs)
+        _finish_input(c, hash)
+    return passed
+
+
+def store_partial(hash: str, output_data: Dict) -> bool:
+    """
+    Stores the latest partial output of a running job, which get_status() returns
+    with the PENDING status until the job finishes. Returns False if the job was
+    cancelled or re-queued in the meantime.
+    """
+    output_data, blobs = _dump_payload(output_data)
+    _write_blobs(blobs)
+    with transaction(immediate=True) as c:
+        _release_partial_output(c, hash)
+        c.execute(
+            """
+            UPDATE jobs SET output_data = ?, output_blobs = ?
+            WHERE hash = ? AND status = 'PENDING';
+        """,
+            (output_data, json.dumps(list(blobs)), hash),
+        )
+        stored = c.rowcount > 0
+        if stored:
+            _retain_blobs(c, blobs)
+        else:
+            _discard_blobs(c, blobs)
+    return stored
+
+
+def _release_partial_output(c: sqlite3.Cursor, hash: str) -> None:
     c.execute(
         """
-        INSERT INTO jobs (hash, status) VALUES (?, 'PENDING');
+        SELECT output_blobs FROM jobs
+        WHERE hash = ? AND status = 'PENDING' AND output_data != '';
     """,
         (hash,),
     )
-    conn.commit()
+    result = c.fetchone()
+    if result is not None:
+        _release_blobs(c, json.loads(result[0] or "[]"))
+        c.execute(
+            """
+            UPDATE jobs SET output_data = '', output_blobs = NULL WHERE hash = ?;
+        """,
+            (hash,),
+        )
 
 
-def fail_job(hash: str, error_message: str) -> None:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
+def _cancel_queued(c: sqlite3.Cursor, hashes: List[str]) -> None:
+    now = time.time()
+    c.executemany(
         """
-        UPDATE jobs SET status = 'FAILED', error_message = ? WHERE hash = ?;
+        UPDATE queue SET popped = 1, input_data = '' WHERE hash = ?;
     """,
-        (
-            error_message,
-            hash,
-        ),
+        [(hash,) for hash in hashes],
     )
-    conn.commit()
-
-
-def pass_job(hash: str, output_data: Dict) -> None:
-    output_data = json.dumps(output_data)
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
+    c.executemany(
         """
-        UPDATE jobs SET status = 'COMPLETE', output_data = ? WHERE hash = ?;
+        INSERT INTO jobs (hash, status, finished_at) VALUES (?, 'CANCELLED', ?);
     """,
-        (
-            output_data,
-            hash,
-        ),
+        [(hash, now) for hash in hashes],
     )
-    conn.commit()
+    for hash in hashes:
+        _release_input(c, hash)
+
+
+def cancel(hash: str) -> bool:
+    """
+    Cancels a job. A queued job is removed from the queue; a running job is
+    marked as cancelled, so that its output is dropped when it finishes (the
+    function may stop early by checking is_cancelled()).
+    Returns:
+    cancelled: False if the job already finished or does not exist.
+    """
+    with transaction(immediate=True) as c:
+        c.execute(
+            """
+            SELECT popped FROM queue WHERE hash = ?;
+        """,
+            (hash,),
+        )
+        result = c.fetchone()
+        if result is None:
+            return False
+        if result[0] == 0:
+            _cancel_queued(c, [hash])
+            return True
+        c.execute(
+            """
+            UPDATE jobs SET status = 'CANCELLED', finished_at = ?
+            WHERE hash = ? AND status = 'PENDING';
+        """,
+            (time.time(), hash),
+        )
+        return c.rowcount > 0
+
+
+def supersede(session: str, action: str) -> List[str]:
+    """
+    Cancels the queued jobs pushed from the given session for the given action,
+    so only the latest request from a client is processed.
+    Returns:
+    hashes: the cancelled jobs.
+    """
+    with transaction(immediate=True) as c:
+        c.execute(
+            """
+            SELECT hash FROM queue WHERE popped = 0 AND session = ? AND action = ?;
+        """,
+            (session, action),
+        )
+        hashes = [hash for hash, in c.fetchall()]
+        _cancel_queued(c, hashes)
+    return hashes
+
+
+def _is_cancelled(hashes: List[str]) -> bool:
+    with transaction() as c:
+        c.execute(
+            """
+            SELECT COUNT(*) FROM jobs WHERE status = 'CANCELLED' AND hash IN ({});
+        """.format(
+                ", ".join("?" * len(hashes))
+            ),
+            hashes,
+        )
+        return c.fetchone()[0] == len(hashes)
+
+
+def is_cancelled(hash: Optional[str] = None) -> bool:
+    """
+    Checks whether a job was cancelled. Called without a hash from within a
+    function processing queued jobs, it checks the job being processed (a batch
+    counts as cancelled once all of its jobs are), so long-running functions
+    can stop early.
+    """
+    hashes = [hash] if hash is not None else list(_current_jobs.get())
+    if not hashes:
+        return False
+    return backend.is_cancelled(hashes)
+
+
+class QueueBackend(ABC):
+    """
+    Stores the queue of jobs. The web server pushes jobs and reports their
+    status; workers, in the same process or others, claim jobs and store their
+    results. A backend shared by several processes must claim each job for a
+    single worker atomically, and re-queue a claimed job if its worker stops
+    renewing its lease.
+    """
+
+    @abstractmethod
+    def init(
+        self,
+        concurrency_count: int = 1,
+        max_size: Optional[int] = None,
+        client_timeout: Optional[float] = None,
+        persistent: bool = False,
+        max_attempts: int = 3,
+        lease_duration: float = 30,
+    ) -> None:
+        """Opens the queue with the given settings; see init()."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+    @abstractmethod
+    def push(
+        self,
+        input_data: Dict,
+        action: str,
+        timeout: Optional[float] = None,
+        session: Optional[str] = None,
+        priority: int = 0,
+        client: Optional[str] = None,
+        weight: float = 1,
+    ) -> Tuple[str, int]:
+        """Adds a job to the queue; see push()."""
+        pass
+
+    @abstractmethod
+    def pop_many(
+        self, max_count: int, action: Optional[str] = None
+    ) -> List[Tuple[int, str, Dict, str]]:
+        """Claims and leases the oldest queued jobs; see pop_many()."""
+        pass
+
+    @abstractmethod
+    def register_workers(self, worker_id: str, concurrency_count: int) -> None:
+        """Records the workers of a worker process; see keep_workers_registered()."""
+        pass
+
+    @abstractmethod
+    def unregister_workers(self, worker_id: str) -> None:
+        pass
+
+    @abstractmethod
+    def renew_leases(self, hashes: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    def pass_job(self, hash: str, output_data: Dict) -> bool:
+        """Stores the output of a claimed job; see pass_job()."""
+        pass
+
+    @abstractmethod
+    def fail_job(self, hash: str, error_message: str) -> bool:
+        pass
+
+    @abstractmethod
+    def store_partial(self, hash: str, output_data: Dict) -> bool:
+        """Stores the latest partial output of a claimed job; see store_partial()."""
+        pass
+
+    @abstractmethod
+    def get_status(self, hash: str) -> Tuple[str, Any]:
+        """Returns the status of a job and its data; see get_status()."""
+        pass
+
+    @abstractmethod
+    def clear_output(self, hash: str) -> None:
+        """Deletes the output of a delivered job; see clear_output()."""
+        pass
+
+    @abstractmethod
+    def touch(self, hash: str) -> None:
+        """Records that the client of a queued job is still waiting for it."""
+        pass
+
+    @abstractmethod
+    def get_queue_positions(self, hashes: List[str]) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def get_estimates(self, hash: str) -> Dict[str, float]:
+        """Estimates when a job starts and completes; see get_estimates()."""
+        pass
+
+    @abstractmethod
+    def get_latency_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        pass
+
+    @abstractmethod
+    def cancel(self, hash: str) -> bool:
+        pass
+
+    @abstractmethod
+    def supersede(self, session: str, action: str) -> List[str]:
+        pass
+
+    @abstractmethod
+    def is_cancelled(self, hashes: List[str]) -> bool:
+        """Returns whether all of the given jobs were cancelled."""
+        pass
+
+    @abstractmethod
+    def evict_jobs(
+        self, max_age: Optional[float] = None, max_count: Optional[int] = None
+    ) -> int:
+        pass
+
+
+class SQLiteQueueBackend(QueueBackend):
+    """
+    Stores the queue in a SQLite database in `directory`, using the functions
+    of this module. Processes on the same host share the queue by using the
+    same directory (WAL mode does not work over network file systems).
+    """
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+
+    def init(
+        self,
+        concurrency_count: int = 1,
+        max_size: Optional[int] = None,
+        client_timeout: Optional[float] = None,
+        persistent: bool = False,
+        max_attempts: int = 3,
+        lease_duration: float = 30,
+    ) -> None:
+        init(
+            concurrency_count=concurrency_count,
+            max_size=max_size,
+            client_timeout=client_timeout,
+            persistent=persistent,
+            max_attempts=max_attempts,
+            lease_duration=lease_duration,
+            directory=self.directory,
+        )
+
+    def close(self) -> None:
+        close()
+
+    def push(
+        self,
+        input_data: Dict,
+        action: str,
+        timeout: Optional[float] = None,
+        session: Optional[str] = None,
+        priority: int = 0,
+        client: Optional[str] = None,
+        weight: float = 1,
+    ) -> Tuple[str, int]:
+        return push(input_data, action, timeout, session, priority, client, weight)
+
+    def pop_many(
+        self, max_count: int, action: Optional[str] = None
+    ) -> List[Tuple[int, str, Dict, str]]:
+        return pop_many(max_count, action)
+
+    def register_workers(self, worker_id: str, concurrency_count: int) -> None:
+        register_workers(worker_id, concurrency_count)
+
+    def unregister_workers(self, worker_id: str) -> None:
+        unregister_workers(worker_id)
+
+    def renew_leases(self, hashes: List[str]) -> None:
+        renew_leases(hashes)
+
+    def pass_job(self, hash: str, output_data: Dict) -> bool:
+        return pass_job(hash, output_data)
+
+    def fail_job(self, hash: str, error_message: str) -> bool:
+        return fail_job(hash, error_message)
+
+    def store_partial(self, hash: str, output_data: Dict) -> bool:
+        return store_partial(hash, output_data)
+
+    def get_status(self, hash: str) -> Tuple[str, Any]:
+        return get_status(hash)
+
+    def clear_output(self, hash: str) -> None:
+        clear_output(hash)
+
+    def touch(self, hash: str) -> None:
+        touch(hash)
+
+    def get_queue_positions(self, hashes: List[str]) -> Dict[str, int]:
+        return get_queue_positions(hashes)
+
+    def get_estimates(self, hash: str) -> Dict[str, float]:
+        return get_estimates(hash)
+
+    def get_latency_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return get_latency_stats()
+
+    def cancel(self, hash: str) -> bool:
+        return cancel(hash)
+
+    def supersede(self, session: str, action: str) -> List[str]:
+        return supersede(session, action)
+
+    def is_cancelled(self, hashes: List[str]) -> bool:
+        return _is_cancelled(hashes)
+
+    def evict_jobs(
+        self, max_age: Optional[float] = None, max_count: Optional[int] = None
+    ) -> int:
+        return evict_jobs(max_age, max_count)
+
+
+# The backend used by queue workers and the server's queue routes.
+backend: QueueBackend = SQLiteQueueBackend()
@@ -2,28 +2,52 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import inspect
-import io
+import math
+import mimetypes
 import os
 import posixpath
 import secrets
+import time
 import traceback
 import urllib
-from typing import Any, List, Optional, Type
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 
+import anyio
 import orjson
 import pkg_resources
 import uvicorn
 from fastapi import Depends, FastAPI, HTTPException, Request, status
-from fastapi.concurrency import run_in_threadpool
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from jinja2.exceptions import TemplateNotFound
 from starlette.responses import RedirectResponse
 
-from gradio import encryptor, queueing, utils
+from gradio import inputs, outputs, processing_utils, queueing, upload_store, utils
+from gradio.component import Component
+from gradio.file_response import RangeFileResponse
+from gradio.prediction_cache import PredictionCache
 from gradio.process_examples import load_from_cache, process_example
 
 STATIC_TEMPLATE_LIB = pkg_resources.resource_filename("gradio", "templates/")
@@ -38,6 +62,47 @@ GRADIO_STATIC_ROOT = "https://gradio.s3-us-west-2.amazonaws.com/{}/static/".form
 GRADIO_BUILD_ROOT = "https://gradio.s3-us-west-2.amazonaws.com/{}/assets/".format(
     VERSION
 )
+QUEUE_STREAM_KEEPALIVE = 15  # seconds between keepalive comments on idle streams
+# Seconds between status checks on streams when jobs are processed by separate
+# worker processes, whose updates are not published to this process.
+QUEUE_STREAM_POLL = 1
+# The types of stored files that /api/upload/<hash> lets the browser display;
+# other files are downloaded, so that an uploaded page never runs in the app.
+INLINE_MEDIA_TYPES = {
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "image/bmp",
+    "audio/mpeg",
+    "audio/ogg",
+    "audio/flac",
+    "audio/x-flac",
+    "audio/wav",
+    "audio/x-wav",
+    "audio/mp4",
+    "audio/aac",
+    "video/mp4",
+    "video/webm",
+    "video/ogg",
+}
+
+# The components whose values can refer to stored files; see resolve_uploads().
+FILE_COMPONENTS = (
+    inputs.Image,
+    inputs.Video,
+    inputs.Audio,
+    inputs.File,
+    outputs.Image,
+    outputs.Video,
+    outputs.Audio,
+    outputs.File,
+)
+# Predictions running for requests with coalesce_predictions, by request key.
+in_flight_predictions: Dict[str, asyncio.Task] = {}
+# Rendered responses, by name: the config and key they were rendered for, the
+# body and its ETag.
+rendered_responses: Dict[str, Tuple[Dict, Any, bytes, str]] = {}
 
 
 class ORJSONResponse(JSONResponse):
@@ -113,26 +178,41 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 @app.head("/", response_class=HTMLResponse)
 @app.get("/", response_class=HTMLResponse)
 def main(request: Request, user: str = Depends(get_current_user)):
-    if app.auth is None or not (user is None):
-        config = app.interface.config
-    else:
-        config = {"auth_required": True, "auth_message": app.interface.auth_message}
+    auth_required = app.auth is not None and user is None
 
-    try:
-        return templates.TemplateResponse(
-            "frontend/index.html", {"request": request, "config": config}
-        )
-    except TemplateNotFound:
-        raise ValueError(
-            "Did you install Gradio from source files? You need to build "
-            "the frontend by running /scripts/build_frontend.sh"
-        )
+    def render():
+        if auth_required:
+            config = {"auth_required": True, "auth_message": app.interface.auth_message}
+        else:
+            config = app.interface.config
+        try:
+            template = templates.get_template("frontend/index.html")
+        except TemplateNotFound:
+            raise ValueError(
+                "Did you install Gradio from source files? You need to build "
+                "the frontend by running /scripts/build_frontend.sh"
+            )
+        return template.render(request=request, config=config).encode()
+
+    return get_rendered_response(
+        request,
+        "main",
+        (app.interface.config_version, auth_required),
+        render,
+        "text/html",
+    )
 
 
 @app.get("/config/", dependencies=[Depends(login_check)])
 @app.get("/config", dependencies=[Depends(login_check)])
-def get_config():
-    return app.interface.config
+def get_config(request: Request):
+    return get_rendered_response(
+        request,
+        "config",
+        app.interface.config_version,
+        lambda: orjson.dumps(app.interface.config),
+        "application/json",
+    )
 
 
 @app.get("/static/{path:path}")
@@ -157,26 +237,34 @@ def build_resource(path: str):
     raise HTTPException(status_code=404, detail="Build file not found")
 
 
-@app.get("/file/{path:path}", dependencies=[Depends(login_check)])
-def file(path):
+@app.api_route(
+    "/file/{path:path}", methods=["GET", "HEAD"], dependencies=[Depends(login_check)]
+)
+def file(path: str, request: Request):
+    file_path = safe_join(app.cwd, path)
+    if file_path is None or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    encryption_key = None
     if (
         app.interface.encrypt
         and isinstance(app.interface.examples, str)
         and path.startswith(app.interface.examples)
     ):
-        with open(safe_join(app.cwd, path), "rb") as encrypted_file:
-            encrypted_data = encrypted_file.read()
-        file_data = encryptor.decrypt(app.interface.encryption_key, encrypted_data)
-        return FileResponse(
-            io.BytesIO(file_data), attachment_filename=os.path.basename(path)
-        )
-    else:
-        return FileResponse(safe_join(app.cwd, path))
+        encryption_key = app.interface.encryption_key
+    return RangeFileResponse(
+        file_path, request.headers, request.method, encryption_key=encryption_key
+    )
 
 
 @app.get("/api", response_class=HTMLResponse)  # Needed for Spaces
 @app.get("/api/", response_class=HTMLResponse)
 def api_docs(request: Request):
+    return get_rendered_response(
+        request, "api_docs", None, lambda: render_api_docs(request), "text/html"
+    )
+
+
+def render_api_docs(request: Request) -> bytes:
     inputs = [type(inp) for inp in app.interface.input_components]
     outputs = [type(out) for out in app.interface.output_components]
     input_types_doc, input_types = get_types(inputs, "input")
@@ -205,104 +293,712 @@ def api_docs(request: Request):
         "local_login_url": urllib.parse.urljoin(app.interface.local_url, "login"),
         "local_api_url": urllib.parse.urljoin(app.interface.local_url, "api/predict"),
     }
-    return templates.TemplateResponse("api_docs.html", {"request": request, **docs})
+    template = templates.get_template("api_docs.html")
+    return template.render(request=request, **docs).encode()
 
 
 @app.post("/api/predict/", dependencies=[Depends(login_check)])
 async def predict(request: Request, username: str = Depends(get_current_user)):
+    body = await read_body(request)
+    if app.interface.streaming and "text/event-stream" in request.headers.get(
+        "accept", ""
+    ):
+        return StreamingResponse(
+            stream_predict(body, username), media_type="text/event-stream"
+        )
+    if app.interface.show_error:
+        try:
+            return await process_predict(body, username)
+        except BaseException as error:
+            traceback.print_exc()
+            return JSONResponse(content={"error": str(error)}, status_code=500)
+    else:
+        return await process_predict(body, username)
+
+
+@app.post("/api/predict_batch/", dependencies=[Depends(login_check)])
+async def predict_batch(request: Request, username: str = Depends(get_current_user)):
+    body = await read_body(request)
+    if app.interface.show_error:
+        try:
+            return await process_predict_samples(body, username)
+        except BaseException as error:
+            traceback.print_exc()
+            return JSONResponse(content={"error": str(error)}, status_code=500)
+    else:
+        return await process_predict_samples(body, username)
+
+
+@app.post("/api/flag/", dependencies=[Depends(login_check)])
+async def flag(request: Request, username: str = Depends(get_current_user)):
+    if app.interface.analytics_enabled:
+        await utils.log_feature_analytics(app.interface.ip_address, "flag")
     body = await request.json()
+    data = body["data"]
+    await run_in_threadpool(
+        app.interface.flagging_callback.flag,
+        app.interface,
+        resolve_uploads(data["input_data"], app.interface.input_components),
+        resolve_uploads(data["output_data"], app.interface.output_components),
+        flag_option=data.get("flag_option"),
+        flag_index=data.get("flag_index"),
+        username=username,
+    )
+    return {"success": True}
+
+
+@app.post("/api/upload/", dependencies=[Depends(login_check)])
+async def upload(request: Request):
+    """
+    Stores the files of a multipart/form-data request and returns references
+    to them, "upload:<hash>", usable in later requests instead of data URLs.
+    """
+    check_upload_size(request)
+    form = await request.form()
+    hashes = []
+    for _, value in form.multi_items():
+        if not isinstance(value, str):
+            hashes.append(
+                await run_in_threadpool(
+                    app.interface.upload_store.put,
+                    value.file,
+                    value.content_type,
+                    value.filename,
+                )
+            )
+    return {"references": [upload_store.PREFIX + hash for hash in hashes]}
+
+
+@app.get("/api/upload/{hash}", dependencies=[Depends(login_check)])
+def uploaded_file(hash: str, request: Request):
+    """Serves a stored file, e.g. a media output when output_urls=True."""
+    try:
+        path = app.interface.upload_store.get_path(hash)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    headers = {
+        # The content of a URL never changes, as it is named by its hash.
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if media_type not in INLINE_MEDIA_TYPES:
+        headers["Content-Disposition"] = "attachment"
+    return RangeFileResponse(
+        path, request.headers, request.method, headers=headers, media_type=media_type
+    )
+
+
+@app.post("/api/upload/check/", dependencies=[Depends(login_check)])
+async def upload_check(request: Request):
+    """Returns which of the given SHA-256 hashes are of files already uploaded."""
+    body = await request.json()
+    return {"known": app.interface.upload_store.known(body["hashes"])}
+
+
+@app.post("/api/interpret/", dependencies=[Depends(login_check)])
+async def interpret(request: Request):
+    body = await request.json()
+    return await process_interpret(body)
+
+
+@app.post("/api/queue/push/", dependencies=[Depends(login_check)])
+async def queue_push(request: Request, username: str = Depends(get_current_user)):
+    body = await request.json()
+    action = body["action"]
+    # Clients may ask for a shorter timeout than the server's, but not a longer one.
+    timeout = app.interface.queue_timeout
+    if body.get("timeout") is not None:
+        requested = body["timeout"]
+        if (
+            isinstance(requested, bool)
+            or not isinstance(requested, (int, float))
+            or not requested > 0
+        ):
+            raise HTTPException(
+                status_code=400, detail="timeout must be a positive number of seconds"
+            )
+        timeout = requested if timeout is None else min(requested, timeout)
+    session = body.get("session_hash")
+    if app.interface.latest_only and session is not None:
+        superseded = await run_in_threadpool(
+            queueing.backend.supersede, session, action
+        )
+        for job_hash in superseded:
+            queueing.publish(job_hash, "CANCELLED", None)
+        if superseded:
+            await queueing.publish_positions()
+    # Requests are scheduled fairly across users, or remote addresses if not
+    # logged in; the session_hash is chosen by the client, so it could be varied
+    # to get more than a fair share, and is only used when the server does not
+    # know the remote address (e.g. over a Unix socket). Clients may lower the
+    # priority of their requests, not raise it.
+    if username:
+        client = username
+    elif request.client is not None:
+        client = request.client.host
+    else:
+        client = session or ""
+    priority = 0
+    if app.interface.queue_priority is not None:
+        priority = app.interface.queue_priority(username)
+    if body.get("priority") is not None:
+        priority = min(int(body["priority"]), priority)
+    weight = 1
+    if app.interface.queue_weight is not None:
+        weight = app.interface.queue_weight(username)
+    try:
+        job_hash, queue_position = await run_in_threadpool(
+            queueing.backend.push,
+            body,
+            action,
+            timeout,
+            session,
+            priority,
+            client,
+            weight,
+        )
+    except queueing.QueueFullError:
+        return JSONResponse(
+            content={"error": "Queue is full, please try again later."},
+            status_code=429,
+            headers={"Retry-After": str(estimate_retry_after())},
+        )
+    queueing.notify()
+    estimates = await run_in_threadpool(queueing.backend.get_estimates, job_hash)
+    return {"hash": job_hash, "queue_position": queue_position, **estimates}
+
+
+@app.post("/api/queue/status/", dependencies=[Depends(login_check)])
+async def queue_status(request: Request):
+    body = await request.json()
+    hash = body["hash"]
+    status, data = await run_in_threadpool(queueing.backend.get_status, hash)
+    estimates = {}
+    if status in ("QUEUED", "PENDING"):
+        estimates = await run_in_threadpool(queueing.backend.get_estimates, hash)
+    return {"status": status, "data": data, **estimates}
+
+
+@app.get("/api/queue/stats/", dependencies=[Depends(login_check)])
+async def queue_stats():
+    """Returns the average queue wait and service times of each action."""
+    return await run_in_threadpool(queueing.backend.get_latency_stats)
+
+
+@app.get("/api/cache/stats/", dependencies=[Depends(login_check)])
+async def cache_stats():
+    """Returns the hit counters of the prediction cache (see cache_predictions in launch())."""
+    if app.interface.prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **app.interface.prediction_cache.stats()}
+
+
+@app.get("/api/concurrency/", dependencies=[Depends(login_check)])
+async def concurrency_stats():
+    """
+    Returns, for predictions and interpretations, how many may run at the same
+    time (None if unlimited), how many are running and how many are waiting.
+    """
+    stats = {}
+    for action, limiter in app.limiters.items():
+        statistics = limiter.statistics()
+        stats[action] = {
+            "limit": None
+            if math.isinf(statistics.total_tokens)
+            else int(statistics.total_tokens),
+            "running": statistics.borrowed_tokens,
+            "waiting": statistics.tasks_waiting,
+        }
+    return stats
+
+
+@app.post("/api/queue/cancel/", dependencies=[Depends(login_check)])
+async def queue_cancel(request: Request):
+    body = await request.json()
+    hash = body["hash"]
+    cancelled = await run_in_threadpool(queueing.backend.cancel, hash)
+    if cancelled:
+        queueing.publish(hash, "CANCELLED", None)
+        await queueing.publish_positions()
+    return {"cancelled": cancelled}
+
+
+@app.get("/api/queue/stream/{hash}", dependencies=[Depends(login_check)])
+async def queue_stream(hash: str):
+    """
+    Streams the status of a queued job as server-sent events, sending an event
+    whenever its position or status changes, until it completes or fails.
+    """
+    updates = queueing.subscribe(hash)
+
+    async def get_status():
+        try:
+            return await run_in_threadpool(queueing.backend.get_status, hash)
+        except ValueError:
+            return "NOT FOUND", None
+
+    if app.interface.local_queue_workers:
+        check_interval = QUEUE_STREAM_KEEPALIVE
+    else:
+        check_interval = QUEUE_STREAM_POLL
+    client_timeout = app.interface.client_timeout
+    touch_interval = queueing.get_touch_interval(client_timeout)
+    if client_timeout is not None:
+        check_interval = min(check_interval, touch_interval)
+
+    async def encode(status, data):
+        estimates = {}
+        # Partial outputs may be sent many times a second, without new estimates.
+        if status == "QUEUED" or (status == "PENDING" and data is None):
+            estimates = await run_in_threadpool(queueing.backend.get_estimates, hash)
+        return encode_event(status, data, estimates)
+
+    async def stream():
+        try:
+            status, data = await get_status()
+            yield await encode(status, data)
+            last_sent = last_touched = time.monotonic()
+            while status in ("QUEUED", "PENDING"):
+                # The client is still waiting while it receives position updates,
+                # which may keep the timeout below from ever being reached.
+                if (
+                    client_timeout is not None
+                    and status == "QUEUED"
+                    and time.monotonic() - last_touched >= touch_interval
+                ):
+                    await run_in_threadpool(queueing.backend.touch, hash)
+                    last_touched = time.monotonic()
+                try:
+                    update = await asyncio.wait_for(updates.get(), check_interval)
+                except asyncio.TimeoutError:
+                    # Checking the status also records that the client is still
+                    # waiting, and catches changes that were not published, such
+                    # as a job being re-queued or expiring.
+                    update = await get_status()
+                    if update == (status, data):
+                        if time.monotonic() - last_sent >= QUEUE_STREAM_KEEPALIVE:
+                            yield ": keepalive\n\n"
+                            last_sent = time.monotonic()
+                        continue
+                if update != (status, data):
+                    status, data = update
+                    yield await encode(status, data)
+                    last_sent = time.monotonic()
+            if status == "COMPLETE":  # the output was published, not read
+                await run_in_threadpool(queueing.backend.clear_output, hash)
+        finally:
+            queueing.unsubscribe(hash, updates)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.on_event("startup")
+async def start_limiters():
+    create_limiters()
+
+
+@app.on_event("startup")
+async def start_queue():
+    app.queue_tasks = []
+    if app.interface.enable_queue:
+        if app.interface.local_queue_workers:
+            for worker in create_queue_workers(app.interface.concurrency_count):
+                app.queue_tasks.append(asyncio.create_task(worker))
+        if (
+            app.interface.job_ttl is not None
+            or app.interface.max_finished_jobs is not None
+        ):
+            sweeper = queueing.run_sweeper(
+                app.interface.job_ttl, app.interface.max_finished_jobs
+            )
+            app.queue_tasks.append(asyncio.create_task(sweeper))
+
+
+@app.on_event("shutdown")
+async def stop_queue():
+    for task in app.queue_tasks:
+        task.cancel()
+    app.queue_tasks = []
+
+
+def create_limiters() -> None:
+    """
+    Creates the limiters that bound how many predictions and interpretations run
+    at the same time, as configured in launch(). Must be called on the event
+    loop that processes the requests.
+    """
+    app.loop = asyncio.get_running_loop()
+    app.limiters = {
+        "predict": anyio.CapacityLimiter(
+            get_limiter_tokens(app.interface.max_concurrent_predictions)
+        ),
+        "interpret": anyio.CapacityLimiter(
+            get_limiter_tokens(app.interface.max_concurrent_interpretations)
+        ),
+    }
+
+
+def set_concurrency_limit(action: str, limit: Optional[int]) -> None:
+    """Resizes the limiter of an action. Can be called from any thread."""
+    app.loop.call_soon_threadsafe(
+        setattr, app.limiters[action], "total_tokens", get_limiter_tokens(limit)
+    )
+
+
+def create_queue_workers(
+    count: int, poll_interval: Optional[float] = None
+) -> List[Coroutine]:
+    """Returns `count` queue worker coroutines that process jobs for app.interface."""
+    workers = []
+    for _ in range(count):
+        if app.interface.batch:
+            worker = queueing.run_queue(
+                run_queued_job,
+                run_queued_batch,
+                app.interface.max_batch_size,
+                app.interface.max_batch_delay,
+                poll_interval=poll_interval,
+            )
+        else:
+            worker = queueing.run_queue(run_queued_job, poll_interval=poll_interval)
+        workers.append(worker)
+    return workers
+
+
+########
+# Request processing
+########
+
+
+async def process_predict(
+    body: Dict,
+    username: Optional[str] = None,
+    on_partial: Optional[Callable[[Dict], Awaitable]] = None,
+) -> Dict:
+    """
+    Runs a prediction for a request body sent to /api/predict/. If the Interface
+    is streaming, `on_partial` is awaited with the output of each value its
+    function yields.
+    """
     flag_index = None
+    cache = app.interface.prediction_cache
+    if body.get("example_id") is None:
+        body = {
+            **body,
+            "data": resolve_uploads(body["data"], app.interface.input_components),
+        }
+    key = get_prediction_key(body)
+    prediction = None
+    if key is not None and cache is not None:
+        prediction = await get_cached_prediction(key)
+
+    if prediction is not None:
+        durations = None
+    elif key is not None and app.interface.coalesce_predictions:
+        prediction, durations = await run_coalesced_prediction(key, body)
+    else:
+        prediction, durations = await run_prediction(body, on_partial)
+    if durations is not None and key is not None and cache is not None:
+        await call_cache(cache.put, key, prediction)
+    if body.get("example_id") is None and app.interface.allow_flagging == "auto":
+        flag_index = await run_in_threadpool(
+            app.interface.flagging_callback.flag,
+            app.interface,
+            body["data"],
+            resolve_uploads(prediction, app.interface.output_components),
+            flag_option="" if app.interface.flagging_options else None,
+            username=username,
+        )
+    output = {
+        "data": prediction,
+        "durations": durations,
+        "avg_durations": app.interface.config.get("avg_durations"),
+        "flag_index": flag_index,
+    }
+    return output
+
 
+def get_prediction_key(body: Dict) -> Optional[str]:
+    """
+    Returns the key of the prediction for a request body whose uploads are
+    resolved, under which it is cached and coalesced, or None if it is neither.
+    Uploaded files are identified by the hash of their content, so a file sent
+    as a reference or as a multipart blob gives the same key.
+    """
+    if app.interface.prediction_cache is None and not (
+        app.interface.coalesce_predictions
+    ):
+        return None
+    if body.get("example_id") is not None:
+        if app.interface.cache_examples:
+            return None
+        payload = {"example_id": body["example_id"]}
+    else:
+        payload = {"data": body["data"]}
+    return PredictionCache.make_key(app.interface.prediction_fingerprint, payload)
+
+
+async def get_cached_prediction(key: str) -> Optional[List[Any]]:
+    # Outputs sent as URLs may refer to files that have since been evicted from
+    # the upload store.
+    is_valid = has_stored_files if app.interface.output_urls else None
+    return await call_cache(app.interface.prediction_cache.get, key, is_valid)
+
+
+async def run_coalesced_prediction(
+    key: str, body: Dict
+) -> Tuple[List[Any], Optional[List[float]]]:
+    """
+    Runs the prediction for a request body, unless one with the same key is
+    already running, in which case its result is awaited instead. The prediction
+    keeps running if the request that started it is cancelled.
+    """
+    task = in_flight_predictions.get(key)
+    if task is None:
+        task = asyncio.create_task(run_prediction(body))
+        in_flight_predictions[key] = task
+        task.add_done_callback(lambda _: in_flight_predictions.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def run_prediction(
+    body: Dict, on_partial: Optional[Callable[[Dict], Awaitable]] = None
+) -> Tuple[List[Any], Optional[List[float]]]:
+    """
+    Runs the Interface on the example or the input data of a request body, once
+    fewer than max_concurrent_predictions are running.
+    """
+    async with app.limiters["predict"]:
+        return await _run_prediction(body, on_partial)
+
+
+async def _run_prediction(
+    body: Dict, on_partial: Optional[Callable[[Dict], Awaitable]] = None
+) -> Tuple[List[Any], Optional[List[float]]]:
     if body.get("example_id") is not None:
         example_id = body["example_id"]
         if app.interface.cache_examples:
             prediction = await run_in_threadpool(
                 load_from_cache, app.interface, example_id
             )
-            durations = None
-        else:
-            prediction, durations = await run_in_threadpool(
-                process_example, app.interface, example_id
-            )
-    else:
-        raw_input = body["data"]
-        if app.interface.show_error:
-            try:
-                prediction, durations = await run_in_threadpool(
-                    app.interface.process, raw_input
+            return prediction, None
+        return await run_in_threadpool(process_example, app.interface, example_id)
+    raw_input = body["data"]
+    if app.interface.streaming:
+        prediction, durations = None, None
+        outputs = app.interface.process_stream(raw_input)
+        if not inspect.isasyncgen(outputs):
+            outputs = iterate_in_threadpool(outputs)
+        async for prediction, durations in outputs:
+            if on_partial is not None:
+                await on_partial(
+                    {
+                        "data": prediction,
+                        "durations": durations,
+                        "avg_durations": app.interface.config.get("avg_durations"),
+                        "flag_index": None,
+                    }
                 )
-            except BaseException as error:
-                traceback.print_exc()
-                return JSONResponse(content={"error": str(error)}, status_code=500)
-        else:
-            prediction, durations = await run_in_threadpool(
-                app.interface.process, raw_input
+        return prediction, durations
+    if app.interface.is_async:
+        return await app.interface.process_async(raw_input)
+    return await run_in_threadpool(app.interface.process, raw_input)
+
+
+async def process_predict_batch(
+    bodies: List[Dict], username: Optional[str] = None
+) -> List[Dict]:
+    """
+    Runs predictions on several /api/predict/ request bodies at once, in batches
+    if the Interface is batch-aware. As in process_predict(), cached outputs are
+    reused, and inputs that repeat one in the batch, or one whose prediction is
+    already running, wait for its output instead of being run again.
+    """
+    cache = app.interface.prediction_cache
+    raw_inputs = [
+        resolve_uploads(body["data"], app.interface.input_components) for body in bodies
+    ]
+    keys = [get_prediction_key({"data": raw_input}) for raw_input in raw_inputs]
+    predictions: List[Optional[List[Any]]] = [None] * len(bodies)
+    durations: List[Optional[List[float]]] = [None] * len(bodies)
+    if cache is not None:
+        for i, key in enumerate(keys):
+            if key is not None:
+                predictions[i] = await get_cached_prediction(key)
+    batch = []
+    # Running predictions the other inputs wait for, by index.
+    tasks: Dict[int, asyncio.Task] = {}
+    batch_indices: Dict[str, int] = {}
+    for i, key in enumerate(keys):
+        if predictions[i] is not None:
+            continue
+        if key is not None and app.interface.coalesce_predictions:
+            if key in in_flight_predictions:
+                tasks[i] = in_flight_predictions[key]
+                continue
+            if key in batch_indices:
+                continue
+            batch_indices[key] = len(batch)
+        batch.append(i)
+
+    if batch:
+        batch_task = asyncio.create_task(
+            run_prediction_batch([raw_inputs[i] for i in batch])
+        )
+        for key, index in batch_indices.items():
+            task = asyncio.create_task(get_batch_prediction(batch_task, index))
+            in_flight_predictions[key] = task
+            task.add_done_callback(
+                lambda _, key=key: in_flight_predictions.pop(key, None)
             )
+        batch_predictions, batch_durations = await asyncio.shield(batch_task)
+        for i, prediction in zip(batch, batch_predictions):
+            predictions[i], durations[i] = prediction, batch_durations
+            if keys[i] is not None and cache is not None:
+                await call_cache(cache.put, keys[i], prediction)
+    for i, task in tasks.items():
+        predictions[i], durations[i] = await asyncio.shield(task)
+    for i, key in enumerate(keys):
+        if predictions[i] is None:  # repeats an input run in this batch
+            index = batch[batch_indices[key]]
+            predictions[i], durations[i] = predictions[index], durations[index]
+
+    outputs = []
+    for raw_input, prediction, prediction_durations in zip(
+        raw_inputs, predictions, durations
+    ):
+        flag_index = None
         if app.interface.allow_flagging == "auto":
             flag_index = await run_in_threadpool(
                 app.interface.flagging_callback.flag,
                 app.interface,
                 raw_input,
-                prediction,
+                resolve_uploads(prediction, app.interface.output_components),
                 flag_option="" if app.interface.flagging_options else None,
                 username=username,
             )
-    output = {
-        "data": prediction,
-        "durations": durations,
-        "avg_durations": app.interface.config.get("avg_durations"),
-        "flag_index": flag_index,
-    }
-    return output
+        outputs.append(
+            {
+                "data": prediction,
+                "durations": prediction_durations,
+                "avg_durations": app.interface.config.get("avg_durations"),
+                "flag_index": flag_index,
+            }
+        )
+    return outputs
 
 
-@app.post("/api/flag/", dependencies=[Depends(login_check)])
-async def flag(request: Request, username: str = Depends(get_current_user)):
-    if app.interface.analytics_enabled:
-        await utils.log_feature_analytics(app.interface.ip_address, "flag")
-    body = await request.json()
-    data = body["data"]
-    await run_in_threadpool(
-        app.interface.flagging_callback.flag,
-        app.interface,
-        data["input_data"],
-        data["output_data"],
-        flag_option=data.get("flag_option"),
-        flag_index=data.get("flag_index"),
-        username=username,
+async def run_prediction_batch(
+    raw_inputs: List[List[Any]],
+) -> Tuple[List[List[Any]], List[float]]:
+    async with app.limiters["predict"]:
+        return await run_in_threadpool(app.interface.process_batch, raw_inputs)
+
+
+async def get_batch_prediction(
+    batch: asyncio.Task, index: int
+) -> Tuple[List[Any], List[float]]:
+    """Waits for a batch of predictions, returning the output of one of its inputs."""
+    predictions, durations = await batch
+    return predictions[index], durations
+
+
+async def process_predict_samples(body: Dict, username: Optional[str] = None) -> Dict:
+    """
+    Runs predictions for a request body sent to /api/predict_batch/, whose data
+    is a list of samples, each a list of inputs as sent to /api/predict/.
+    """
+    outputs = await process_predict_batch(
+        [{"data": sample} for sample in body["data"]], username
     )
-    return {"success": True}
+    return {
+        "data": [output["data"] for output in outputs],
+        "durations": next(
+            (output["durations"] for output in outputs if output["durations"]), None
+        ),
+        "avg_durations": app.interface.config.get("avg_durations"),
+        "flag_indices": [output["flag_index"] for output in outputs],
+    }
 
 
-@app.post("/api/interpret/", dependencies=[Depends(login_check)])
-async def interpret(request: Request):
+async def process_interpret(body: Dict) -> Dict:
+    """Runs interpretation for a request body sent to /api/interpret/."""
     if app.interface.analytics_enabled:
         await utils.log_feature_analytics(app.interface.ip_address, "interpret")
-    body = await request.json()
-    raw_input = body["data"]
-    interpretation_scores, alternative_outputs = await run_in_threadpool(
-        app.interface.interpret, raw_input
-    )
+    raw_input = resolve_uploads(body["data"], app.interface.input_components)
+    async with app.limiters["interpret"]:
+        interpretation_scores, alternative_outputs = await run_in_threadpool(
+            app.interface.interpret, raw_input
+        )
     return {
         "interpretation_scores": interpretation_scores,
         "alternative_outputs": alternative_outputs,
     }
 
 
-@app.post("/api/queue/push/", dependencies=[Depends(login_check)])
-async def queue_push(request: Request):
-    body = await request.json()
-    action = body["action"]
-    job_hash, queue_position = queueing.push(body, action)
-    return {"hash": job_hash, "queue_position": queue_position}
+async def stream_predict(body: Dict, username: Optional[str] = None):
+    """
+    Runs a prediction for a streaming Interface, yielding server-sent events in
+    the format of /api/queue/stream/: a PENDING event with each partial output,
+    then a COMPLETE (or FAILED) event with the final output.
+    """
+    updates = asyncio.Queue()
 
+    async def run():
+        try:
+            output = await process_predict(body, username, updates.put)
+            await updates.put(("COMPLETE", output))
+        except Exception as error:
+            traceback.print_exc()
+            await updates.put(("FAILED", str(error)))
 
-@app.post("/api/queue/status/", dependencies=[Depends(login_check)])
-async def queue_status(request: Request):
-    body = await request.json()
-    hash = body["hash"]
-    status, data = queueing.get_status(hash)
-    return {"status": status, "data": data}
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            update = await updates.get()
+            if isinstance(update, dict):
+                yield encode_event("PENDING", update)
+                continue
+            yield encode_event(*update)
+            break
+    finally:  # the client may disconnect before the prediction finishes
+        task.cancel()
+
+
+async def run_queued_job(input_data: Dict, action: str) -> Dict:
+    """Dispatches a job popped from the queue to the matching request handler."""
+    if action == "predict":
+        return await process_predict(input_data, on_partial=queueing.publish_partial)
+    elif action == "interpret":
+        return await process_interpret(input_data)
+    raise ValueError("Unknown queue action: {}".format(action))
+
+
+async def run_queued_batch(
+    input_data: List[Dict], action: str
+) -> List[Dict | Exception]:
+    """
+    Dispatches a batch of jobs popped from the queue. Predictions on user input
+    are run as one batch; other jobs (e.g. examples) are run one at a time.
+    """
+    outputs: List[Dict | Exception] = [None] * len(input_data)
+    batch = [
+        i
+        for i, body in enumerate(input_data)
+        if action == "predict" and body.get("example_id") is None
+    ]
+    if batch:
+        predictions = await process_predict_batch([input_data[i] for i in batch])
+        for i, prediction in zip(batch, predictions):
+            outputs[i] = prediction
+    for i, body in enumerate(input_data):
+        if outputs[i] is None:
+            try:
+                outputs[i] = await run_queued_job(body, action)
+            except Exception as error:
+                outputs[i] = error
+    return outputs
 
 
 ########
@@ -310,6 +1006,121 @@ async def queue_status(request: Request):
 ########
 
 
+async def read_body(request: Request) -> Dict:
+    """
+    Reads the body of a prediction request. It is either JSON, or, to send media
+    without base64 encoding, multipart/form-data whose "body" field holds the
+    JSON, in which each {"blob": name} object stands for the file field `name`.
+    Those are passed to the components as processing_utils.BinaryData. Like
+    uploads, multipart bodies are limited to the upload store's max_upload_size.
+    """
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return await request.json()
+    check_upload_size(request)
+    form = await request.form()
+
+    def restore(value):
+        if isinstance(value, list):
+            return [restore(item) for item in value]
+        if isinstance(value, dict):
+            if list(value) == ["blob"]:
+                upload = (
+                    form.get(value["blob"]) if isinstance(value["blob"], str) else None
+                )
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="No file field named {}".format(value["blob"]),
+                    )
+                return processing_utils.BinaryData(
+                    upload.file, upload.content_type, upload.filename
+                )
+            return {key: restore(item) for key, item in value.items()}
+        return value
+
+    if not isinstance(form.get("body"), str):
+        raise HTTPException(status_code=400, detail="No body field")
+    try:
+        body = orjson.loads(form["body"])
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="The body field is not JSON")
+    return restore(body)
+
+
+def check_upload_size(request: Request) -> None:
+    """
+    Rejects a request whose body is larger than the upload store accepts, before
+    it is read.
+    """
+    max_upload_size = app.interface.upload_store.max_upload_size
+    if max_upload_size is not None:
+        # The server does not let a body run past its Content-Length.
+        if "content-length" not in request.headers:
+            raise HTTPException(status_code=411, detail="Content-Length required")
+        if int(request.headers["content-length"]) > max_upload_size:
+            raise HTTPException(
+                status_code=413,
+                detail="Uploads are limited to {} bytes".format(max_upload_size),
+            )
+
+
+def resolve_uploads(data: Any, components: List[Component]) -> Any:
+    """
+    Replaces the "upload:<hash>" references, or URLs of stored files, in the
+    values of the file components (e.g. Image or File) among `components` by the
+    stored files; see UploadStore.resolve(). The values of other components,
+    such as text, are left as they are.
+    """
+    if not isinstance(data, list):
+        return data
+    try:
+        return [
+            app.interface.upload_store.resolve(value)
+            if i < len(components) and isinstance(components[i], FILE_COMPONENTS)
+            else value
+            for i, value in enumerate(data)
+        ]
+    except KeyError as error:
+        raise HTTPException(status_code=404, detail=error.args[0])
+
+
+def has_stored_files(prediction: List[Any]) -> bool:
+    """Whether the files that the outputs of a prediction refer to are all stored."""
+    return all(
+        app.interface.upload_store.has_references(value)
+        for value, component in zip(prediction, app.interface.output_components)
+        if isinstance(component, FILE_COMPONENTS)
+    )
+
+
+def get_rendered_response(
+    request: Request,
+    name: str,
+    key: Any,
+    render: Callable[[], bytes],
+    media_type: str,
+) -> Response:
+    """
+    Returns the page (or other response) `name`, with an ETag, or 304 Not
+    Modified if the client has it already. The body returned by render() is
+    reused until the config of the Interface, or `key`, changes.
+    """
+    cached = rendered_responses.get(name)
+    config = app.interface.config
+    if cached is not None and cached[0] is config and cached[1] == key:
+        body, etag = cached[2], cached[3]
+    else:
+        body = render()
+        etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+        rendered_responses[name] = (config, key, body, etag)
+    # Browsers check that the page has not changed before reusing their copy.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
 def safe_join(directory: str, path: str) -> Optional[str]:
     """Safely path to a base directory to avoid escaping the base directory.
     Borrowed from: werkzeug.security.safe_join"""
@@ -331,6 +1142,35 @@ def safe_join(directory: str, path: str) -> Optional[str]:
     return posixpath.join(directory, filename)
 
 
+async def call_cache(method: Callable, *args) -> Any:
+    """Calls a method of the prediction cache, in the threadpool if it uses the disk."""
+    if app.interface.prediction_cache.directory is None:
+        return method(*args)
+    return await run_in_threadpool(method, *args)
+
+
+def get_limiter_tokens(limit: Optional[int]) -> float:
+    return math.inf if limit is None else limit
+
+
+def estimate_retry_after() -> int:
+    """
+    Estimates how many seconds a client turned away by a full queue should wait
+    before retrying: the time for the workers to finish one job each.
+    """
+    avg_durations = app.interface.config.get("avg_durations") or [1]
+    return max(1, math.ceil(sum(avg_durations) / app.interface.concurrency_count))
+
+
+def encode_event(
+    status: str, data: Any, estimates: Optional[Dict[str, float]] = None
+) -> str:
+    """Formats a queue status update, with any time estimates, as a server-sent event."""
+    message = {"status": status, "data": data, **(estimates or {})}
+    message = orjson.dumps(message).decode("utf-8")
+    return "data: {}\n\n".format(message)
+
+
 def get_types(cls_set: List[Type], component: str):
     docset = []
     types = []
@@ -0,0 +1,256 @@
+"""
+Stores uploaded files by the hash of their content, so that a file used in many
+predictions (e.g. an image with live=True) is only sent to the server once. In
+a request, the reference "upload:<hash>" can be used wherever a data URL is.
+Media outputs can be stored here too, and sent as URLs to /api/upload/<hash>.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from typing import IO, Any, Iterable, List, Optional
+
+from gradio.processing_utils import BinaryData
+
+PREFIX = "upload:"
+HASH_PATTERN = re.compile("[0-9a-f]{64}")
+# The URL of a stored file, relative to the root of the app, or absolute.
+URL_PATTERN = re.compile("(?:.*/)?api/upload/([0-9a-f]{64})")
+
+
+def get_url(hash: str) -> str:
+    """Returns the URL of a stored file, relative to the root of the app."""
+    return "api/upload/" + hash
+
+
+def get_hash(value: Any) -> Optional[str]:
+    """Returns the hash in a "upload:<hash>" reference or a URL of a stored file."""
+    if not isinstance(value, str):
+        return None
+    if value.startswith(PREFIX):
+        hash = value[len(PREFIX) :]
+        return hash if HASH_PATTERN.fullmatch(hash) else None
+    match = URL_PATTERN.fullmatch(value)
+    return match.group(1) if match else None
+
+
+def is_reference(value: Any) -> bool:
+    return get_hash(value) is not None
+
+
+def get_file_hash(value: Any) -> Optional[str]:
+    """
+    Returns the hash of the stored file a file component's value refers to, as
+    a reference or URL either in place of the file or in its "data" field.
+    """
+    if isinstance(value, dict):
+        value = value.get("data")
+    return get_hash(value)
+
+
+# The extensions of files whose content starts with these bytes.
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"ID3", ".mp3"),
+    (b"\xff\xfb", ".mp3"),
+    (b"\xff\xf3", ".mp3"),
+    (b"\xff\xf2", ".mp3"),
+    (b"OggS", ".ogg"),
+    (b"fLaC", ".flac"),
+    (b"\x1a\x45\xdf\xa3", ".webm"),
+    (b"%PDF-", ".pdf"),
+    (b"PK\x03\x04", ".zip"),
+    (b"\x93NUMPY", ".npy"),
+]
+RIFF_EXTENSIONS = {b"WEBP": ".webp", b"WAVE": ".wav", b"AVI ": ".avi"}
+# The extensions a client may claim for a file that has none of the signatures
+# above: types that browsers display or download, but never run as a page.
+SAFE_EXTENSIONS = {
+    ".bmp",
+    ".tif",
+    ".tiff",
+    ".m4a",
+    ".aac",
+    ".mov",
+    ".mkv",
+    ".txt",
+    ".csv",
+    ".tsv",
+    ".json",
+    ".npz",
+}
+
+
+def get_extension(
+    head: bytes, content_type: Optional[str] = None, filename: Optional[str] = None
+) -> Optional[str]:
+    """
+    Returns the extension to store a file with, given the first bytes of its
+    content: the extension of the file's type if it is recognized, or else the
+    one the client claims (from the filename or content type) if it is a safe
+    type. The extension decides the type the file is later served with.
+    """
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] in RIFF_EXTENSIONS:
+        return RIFF_EXTENSIONS[head[8:12]]
+    if head[4:8] == b"ftyp":
+        return ".m4a" if head[8:11] == b"M4A" else ".mp4"
+    extension = None
+    if filename:
+        extension = os.path.splitext(filename)[1].lower()
+    if not extension and content_type:
+        extension = mimetypes.guess_extension(content_type)
+    return extension if extension in SAFE_EXTENSIONS else None
+
+
+class UploadStore:
+    """
+    A directory of uploaded files, each in a subdirectory named by the SHA-256
+    hash of its content, bounded in total size by deleting the least recently
+    used files. Several servers and queue workers on one machine can share it.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_size: Optional[int] = 2**30,
+        max_upload_size: Optional[int] = 2**28,
+    ):
+        """
+        Parameters:
+        directory (str): where the files are stored. By default, a new directory in the temporary directory, which is deleted when the store is (e.g. when the program exits).
+        max_size (int): if provided, maximum total size in bytes of the stored files; the least recently used are deleted first.
+        max_upload_size (int): if provided, maximum size in bytes of a request to /api/upload/, and so of the files uploaded in it.
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix="gradio_uploads_")
+            weakref.finalize(self, shutil.rmtree, directory, ignore_errors=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.max_upload_size = max_upload_size
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(
+        self,
+        file: IO[bytes],
+        content_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> str:
+        """
+        Stores the content of a file and returns its hash. The content type and
+        filename the client sent are only trusted for safe types; see
+        get_extension().
+        """
+        sha = hashlib.sha256()
+        temp_path = os.path.join(self.directory, "{}.tmp".format(uuid.uuid4().hex))
+        with open(temp_path, "wb") as temp_file:
+            head = chunk = file.read(1 << 20)
+            while chunk:
+                sha.update(chunk)
+                temp_file.write(chunk)
+                chunk = file.read(1 << 20)
+        extension = get_extension(head, content_type, filename)
+        hash = sha.hexdigest()
+        path = self._find(hash)
+        if path is None:
+            os.makedirs(os.path.join(self.directory, hash), exist_ok=True)
+            os.replace(
+                temp_path,
+                os.path.join(self.directory, hash, "file" + (extension or "")),
+            )
+            if self.max_size is not None:
+                self._evict()
+        else:
+            os.remove(temp_path)
+            os.utime(path)
+        return hash
+
+    def has(self, hash: str) -> bool:
+        return self._find(hash) is not None
+
+    def known(self, hashes: Iterable[str]) -> List[str]:
+        """Returns the hashes, among those given, of the files that are stored."""
+        return [hash for hash in hashes if self.has(hash)]
+
+    def get_path(self, hash: str) -> str:
+        """Returns the path of a stored file. Raises KeyError if there is none."""
+        path = self._find(hash)
+        if path is None:
+            raise KeyError(
+                "No uploaded file with hash {}; upload it again.".format(hash)
+            )
+        os.utime(path)  # the access time orders evictions
+        return path
+
+    def open(self, hash: str) -> BinaryData:
+        """Returns a stored file. Raises KeyError if there is none with this hash."""
+        path = self.get_path(hash)
+        content_type = mimetypes.guess_type(path)[0]
+        return BinaryData(open(path, "rb"), content_type, os.path.basename(path))
+
+    def resolve(self, value: Any) -> Any:
+        """
+        Returns a copy of the value of a file component (e.g. an Image or File)
+        in which a "upload:<hash>" reference, or URL of a stored file, is
+        replaced by the stored file. The reference is either the value itself
+        or its "data" field, or that of each item of a list of files; other
+        strings are left as they are.
+        """
+        if isinstance(value, list):
+            return [self._resolve_file(item) for item in value]
+        return self._resolve_file(value)
+
+    def has_references(self, value: Any) -> bool:
+        """
+        Whether the references in the value of a file component, as found by
+        resolve(), are all to files that are stored.
+        """
+        items = value if isinstance(value, list) else [value]
+        hashes = [get_file_hash(item) for item in items]
+        return all(self.has(hash) for hash in hashes if hash is not None)
+
+    def _resolve_file(self, value: Any) -> Any:
+        hash = get_file_hash(value)
+        if hash is None:
+            return value
+        if isinstance(value, dict):
+            return {**value, "data": self.open(hash)}
+        return self.open(hash)
+
+    def _find(self, hash: str) -> Optional[str]:
+        if not HASH_PATTERN.fullmatch(hash):
+            return None
+        try:
+            names = os.listdir(os.path.join(self.directory, hash))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return os.path.join(self.directory, hash, names[0]) if names else None
+
+    def _evict(self) -> None:
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                path = self._find(entry.name)
+                if path is not None:
+                    stat = os.stat(path)
+                    files.append((stat.st_atime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total_size <= self.max_size:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= size
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import csv
 import inspect
 import json
@@ -9,8 +10,17 @@ import json.decoder
 import os
 import random
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import StrictVersion
-from typing import TYPE_CHECKING, Any, Callable, Dict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterator,
+)
 
 import aiohttp
 import analytics
@@ -286,3 +296,60 @@ def get_default_args(func: Callable) -> Dict[str, Any]:
         v.default if v.default is not inspect.Parameter.empty else None
         for v in signature.parameters.values()
     ]
+
+
+def iterate_async(iterator: AsyncIterator) -> Iterator:
+    """
+    Iterates over an async iterator from synchronous code, on a new event loop.
+    As in run_coroutine(), the loop runs in another thread if one is already
+    running in this thread.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        executor = None
+    else:
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    def step():
+        return loop.run_until_complete(iterator.__anext__())
+
+    try:
+        while True:
+            try:
+                if executor is None:
+                    yield step()
+                else:
+                    yield executor.submit(step).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        loop.close()
+
+
+def run_coroutine(coroutine: Coroutine) -> Any:
+    """
+    Runs a coroutine to completion from synchronous code and returns its result.
+    If an event loop is already running in this thread (e.g. in a notebook, or
+    when called from a coroutine), it cannot run the coroutine without being
+    blocked, so the coroutine is run on a new event loop in another thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def last_value(generator: Iterator | AsyncIterator) -> Any:
+    """Exhausts a generator or async generator, returning the last value it yields."""
+    if inspect.isasyncgen(generator):
+        generator = iterate_async(generator)
+    value = None
+    for value in generator:
+        pass
+    return value
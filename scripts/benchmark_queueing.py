@@ -0,0 +1,136 @@
+"""
+Micro-benchmark for the SQLite-backed job queue in gradio.queueing.
+
+Reports push / status / pop throughput in operations per second, first from a
+single thread and then with several threads polling job status while a single
+worker pops jobs (the access pattern of many browser tabs waiting on a queue).
+Finally reports get_status latency as the number of finished jobs kept in the
+database grows.
+
+Run from the repo directory:
+    python scripts/benchmark_queueing.py --jobs 2000 --pollers 8
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from gradio import queueing
+
+
+def timed(label: str, n: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print("{:<32}{:>10.0f} ops/s".format(label, n / elapsed))
+
+
+def single_threaded(num_jobs: int) -> None:
+    queueing.init()
+    hashes = []
+
+    def push_all():
+        for i in range(num_jobs):
+            hashes.append(queueing.push({"data": ["input {}".format(i)]}, "predict")[0])
+
+    def status_all():
+        for hash in hashes:
+            queueing.get_status(hash)
+
+    def pop_all():
+        for _ in range(num_jobs):
+            queueing.pop()
+
+    timed("push", num_jobs, push_all)
+    timed("get_status", num_jobs, status_all)
+    timed("pop", num_jobs, pop_all)
+    queueing.close()
+
+
+def concurrent(num_jobs: int, num_pollers: int) -> None:
+    queueing.init()
+    for i in range(num_jobs):
+        queueing.push({"data": ["input {}".format(i)]}, "predict")
+    # Jobs queued behind the ones the worker processes; these are only polled.
+    waiting = [
+        queueing.push({"data": ["waiting {}".format(i)]}, "predict")[0]
+        for i in range(num_pollers)
+    ]
+    polls = [0] * num_pollers
+    done = threading.Event()
+
+    def poller(index: int) -> None:
+        while not done.is_set():
+            queueing.get_status(waiting[index])
+            polls[index] += 1
+
+    def worker() -> None:
+        for _ in range(num_jobs):
+            _, hash, _, _ = queueing.pop()
+            queueing.start_job(hash)
+            queueing.pass_job(hash, {"data": ["output"]})
+
+    threads = [
+        threading.Thread(target=poller, args=(i,), daemon=True)
+        for i in range(num_pollers)
+    ]
+    for thread in threads:
+        thread.start()
+    start = time.perf_counter()
+    worker()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in threads:
+        thread.join()
+    print(
+        "{:<32}{:>10.0f} jobs/s".format(
+            "worker with {} pollers".format(num_pollers), num_jobs / elapsed
+        )
+    )
+    print("{:<32}{:>10.0f} ops/s".format("concurrent get_status", sum(polls) / elapsed))
+    queueing.close()
+
+
+def with_history(history_sizes, num_calls: int = 1000) -> None:
+    for num_finished in history_sizes:
+        queueing.init()
+        # Insert the finished jobs directly, as pushing them one by one is slow.
+        conn = sqlite3.connect(queueing.DB_FILE)
+        conn.executemany(
+            "INSERT INTO queue (hash, input_data, action, popped) VALUES (?, '', 'predict', 1);",
+            (("finished{}".format(i),) for i in range(num_finished)),
+        )
+        conn.executemany(
+            "INSERT INTO jobs (hash, status, output_data) VALUES (?, 'COMPLETE', '');",
+            (("finished{}".format(i),) for i in range(num_finished)),
+        )
+        conn.commit()
+        conn.close()
+        hashes = [queueing.push({"data": ["input"]}, "predict")[0] for _ in range(10)]
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            queueing.get_status(hashes[-1])
+        elapsed = time.perf_counter() - start
+        print(
+            "{:<32}{:>10.1f} us".format(
+                "get_status, {} finished jobs".format(num_finished),
+                elapsed / num_calls * 1e6,
+            )
+        )
+        queueing.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--history", type=int, nargs="*", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        single_threaded(args.jobs)
+        concurrent(args.jobs, args.pollers)
+        with_history(args.history)
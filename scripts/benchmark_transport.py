@@ -0,0 +1,85 @@
+"""
+Benchmark of the two ways of sending an image to /api/predict/.
+
+Compares the base64 data URL in a JSON body with the raw bytes in a
+multipart/form-data body, for a noisy (hardly compressible) PNG of about 5MB.
+Reports the size of each request body and the mean time of a request.
+
+Run from the repo directory:
+    python scripts/benchmark_transport.py --requests 20 --size 1300
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import gradio as gr
+
+os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
+
+
+def make_image(size: int) -> bytes:
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def timed(label: str, num_requests: int, body_size: int, send) -> None:
+    send()  # warm up
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        response = send()
+        response.raise_for_status()
+    elapsed = time.perf_counter() - start
+    print(
+        "{:<12}{:>10.2f} MB{:>10.1f} ms/request".format(
+            label, body_size / 1e6, elapsed / num_requests * 1e3
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--size", type=int, default=1300, help="image side in pixels")
+    args = parser.parse_args()
+
+    image = make_image(args.size)
+    data_url = "data:image/png;base64," + base64.b64encode(image).decode("utf-8")
+    json_body = json.dumps({"data": [data_url]})
+    multipart_body = json.dumps({"data": [{"blob": "blob0"}]})
+
+    interface = gr.Interface(lambda im: str(im.shape), "image", "text")
+    app, _, _ = interface.launch(prevent_thread_lock=True)
+    client = TestClient(app)
+
+    print("PNG of {:.2f} MB".format(len(image) / 1e6))
+    timed(
+        "json",
+        args.requests,
+        len(json_body),
+        lambda: client.post(
+            "/api/predict/",
+            content=json_body,
+            headers={"Content-Type": "application/json"},
+        ),
+    )
+    timed(
+        "multipart",
+        args.requests,
+        len(image) + len(multipart_body),
+        lambda: client.post(
+            "/api/predict/",
+            files={"blob0": ("blob0", image, "image/png")},
+            data={"body": multipart_body},
+        ),
+    )
+    interface.close()
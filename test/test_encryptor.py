@@ -1,3 +1,4 @@
+import io
 import os
 import unittest
 
@@ -27,6 +28,17 @@ class TestEncryptorDecryptor(unittest.TestCase):
         decrypted_data = encryptor.decrypt(key, encrypted_data)
         self.assertEquals(data, decrypted_data)
 
+    def test_decrypt_range(self):
+        key = encryptor.get_key("test")
+        data, _ = processing_utils.decode_base64_to_binary(BASE64_IMAGE)
+        encrypted_file = io.BytesIO(encryptor.encrypt(key, data))
+        self.assertEqual(encryptor.get_decrypted_size(key, encrypted_file), len(data))
+        for start, end in [(0, len(data)), (5, 100), (100, len(data))]:
+            decrypted_data = b"".join(
+                encryptor.decrypt_range(key, encrypted_file, start, end, 64)
+            )
+            self.assertEqual(decrypted_data, data[start:end])
+
 
 if __name__ == "__main__":
     unittest.main()
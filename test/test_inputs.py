@@ -447,6 +447,9 @@ class TestImage(unittest.TestCase):
             self.assertEqual(restored, "image_input/1.png")
 
         self.assertIsInstance(image_input.generate_sample(), str)
+        self.assertEqual(len(image_input.preprocess_batch([img, img])), 2)
+        image_input = gr.inputs.Image(image_mode="L", shape=(25, 25))
+        self.assertEqual(image_input.preprocess_batch([img, img]).shape, (2, 25, 25))
         image_input = gr.inputs.Image(
             source="upload", tool="editor", type="pil", label="Upload Your Image"
         )
@@ -1,5 +1,7 @@
+import asyncio
 import io
 import sys
+import time
 import unittest
 import unittest.mock as mock
 from contextlib import contextmanager
@@ -61,6 +63,11 @@ class TestInterface(unittest.TestCase):
             interface.launch(prevent_thread_lock=True)
             interface.close()
 
+    def test_invalid_job_ttl(self):
+        interface = Interface(lambda x: x, "textbox", "textbox")
+        with self.assertRaises(ValueError):
+            interface.launch(job_ttl=0, prevent_thread_lock=True)
+
     def test_test_launch(self):
         with captured_output() as (out, err):
             prediction_fn = lambda x: x
@@ -120,6 +127,135 @@ class TestInterface(unittest.TestCase):
         scores, alternative_outputs = interface.interpret(["quickest brown fox"])
         self.assertIsNone(scores[0])
 
+    def test_batch_process(self):
+        def batch_fn(words, counts):
+            return [word * int(count) for word, count in zip(words, counts)]
+
+        interface = Interface(batch_fn, ["textbox", "number"], "textbox", batch=True)
+        outputs, durations = interface.process_batch([["a", 2], ["b", 3]])
+        self.assertEqual(outputs, [["aa"], ["bbb"]])
+        self.assertEqual(len(durations), 1)
+        self.assertEqual(interface("c", 1), "c")
+
+    def test_batch_process_is_split_into_batches(self):
+        batch_sizes = []
+
+        def batch_fn(words):
+            batch_sizes.append(len(words))
+            return [word.upper() for word in words]
+
+        interface = Interface(
+            batch_fn, "textbox", "textbox", batch=True, max_batch_size=2
+        )
+        outputs, _ = interface.process_batch([["a"], ["b"], ["c"]])
+        self.assertEqual(outputs, [["A"], ["B"], ["C"]])
+        self.assertEqual(batch_sizes, [2, 1])
+
+    def test_process_batch_without_batch_function(self):
+        interface = Interface(lambda x: x.upper(), "textbox", "textbox")
+        outputs, durations = interface.process_batch([["a"], ["b"]])
+        self.assertEqual(outputs, [["A"], ["B"]])
+        self.assertEqual(len(durations), 1)
+
+    def test_batch_output_length_mismatch(self):
+        interface = Interface(lambda x: x[:1], "textbox", "textbox", batch=True)
+        with self.assertRaises(ValueError):
+            interface.process_batch([["a"], ["b"]])
+
+    def test_durations_are_tracked_per_function(self):
+        interface = Interface([lambda x: x, lambda x: x], "textbox", "textbox")
+        interface.update_durations([1.0, 3.0])
+        self.assertEqual(interface.predict_durations, [[1.0, 1], [3.0, 1]])
+
+    def test_generator_function_streams_outputs(self):
+        def count(n):
+            for i in range(int(n)):
+                yield str(i)
+
+        interface = Interface(count, "textbox", "textbox")
+        self.assertTrue(interface.streaming)
+        outputs = [output for output, _ in interface.process_stream(["3"])]
+        self.assertEqual(outputs, [["0"], ["1"], ["2"]])
+        self.assertEqual(interface.predict_durations[0][1], 1)
+        self.assertEqual(interface.process(["3"])[0], ["2"])
+        self.assertEqual(interface("3"), "2")
+
+    def test_async_generator_function_streams_outputs(self):
+        async def count(n):
+            for i in range(int(n)):
+                yield str(i)
+
+        interface = Interface(count, "textbox", "textbox")
+        self.assertTrue(interface.streaming)
+
+        async def collect():
+            return [output async for output, _ in interface.process_stream(["2"])]
+
+        self.assertEqual(asyncio.run(collect()), [["0"], ["1"]])
+        self.assertEqual(interface.process(["2"])[0], ["1"])
+
+    def test_async_generator_function_called_from_event_loop(self):
+        async def count(n):
+            for i in range(int(n)):
+                await asyncio.sleep(0)
+                yield str(i)
+
+        interface = Interface(count, "textbox", "textbox")
+
+        async def call():  # e.g. in a notebook, whose event loop is running
+            return interface("3")
+
+        self.assertEqual(asyncio.run(call()), "2")
+
+    def test_coroutine_function_is_awaited(self):
+        async def greet(name):
+            await asyncio.sleep(0)
+            return "Hello " + name
+
+        interface = Interface(greet, "textbox", "textbox")
+        self.assertTrue(interface.is_async)
+        output, _ = asyncio.run(interface.process_async(["x"]))
+        self.assertEqual(output, ["Hello x"])
+        self.assertEqual(interface("x"), "Hello x")
+
+    def test_coroutine_function_called_from_event_loop(self):
+        async def greet(name):
+            await asyncio.sleep(0)
+            return "Hello " + name
+
+        interface = Interface(greet, "textbox", "textbox")
+
+        async def call():  # e.g. in a notebook, whose event loop is running
+            return interface("x")
+
+        self.assertEqual(asyncio.run(call()), "Hello x")
+
+    def test_coroutine_functions_run_concurrently(self):
+        async def wait(x):
+            await asyncio.sleep(0.2)
+            return x
+
+        interface = Interface(wait, "textbox", "textbox")
+
+        async def run_all():
+            return await asyncio.gather(
+                *(interface.process_async([str(i)]) for i in range(200))
+            )
+
+        start = time.time()
+        outputs = asyncio.run(run_all())
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([output for output, _ in outputs][-1], ["199"])
+
+    def test_generator_function_requires_single_function(self):
+        def count(n):
+            yield n
+
+        with self.assertRaises(ValueError):
+            Interface([count, lambda x: x], "textbox", "textbox")
+        with self.assertRaises(ValueError):
+            Interface(count, "textbox", "textbox", batch=True)
+
     @mock.patch("webbrowser.open")
     def test_interface_browser(self, mock_browser):
         interface = Interface(lambda x: x, "textbox", "label")
@@ -7,6 +7,7 @@ import numpy as np
 import pandas as pd
 
 import gradio as gr
+from gradio.upload_store import UploadStore
 
 os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
 
@@ -158,6 +159,16 @@ class TestImage(unittest.TestCase):
             )
             self.assertEqual("image_output/1.png", to_save)
 
+    def test_file_store(self):
+        image_output = gr.outputs.Image(type="file")
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            image_output.file_store = UploadStore(tmpdirname)
+            url = image_output.postprocess("test/test_data/lion.jpg")
+            self.assertRegex(url, "^api/upload/[0-9a-f]{64}$")
+            stored = image_output.file_store.open(url.split("/")[-1])
+            self.assertEqual(stored.get_extension(), "jpg")
+            self.assertEqual(image_output.postprocess("test/test_data/lion.jpg"), url)
+
     def test_in_interface(self):
         def generate_noise(width, height):
             return np.random.randint(0, 256, (width, height, 3))
@@ -0,0 +1,149 @@
+import io
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from gradio import Interface
+from gradio.prediction_cache import (
+    PredictionCache,
+    get_bypass_reason,
+    get_fingerprint,
+    is_deterministic,
+)
+from gradio.processing_utils import BinaryData
+
+os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
+
+
+class TestPredictionCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = PredictionCache()
+        key = PredictionCache.make_key("fingerprint", {"data": ["test"]})
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ["output"])
+        self.assertEqual(cache.get(key), ["output"])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_keys(self):
+        key = PredictionCache.make_key("fingerprint", {"data": [{"a": 1, "b": 2}]})
+        self.assertEqual(
+            key, PredictionCache.make_key("fingerprint", {"data": [{"b": 2, "a": 1}]})
+        )
+        self.assertNotEqual(
+            key, PredictionCache.make_key("other", {"data": [{"a": 1, "b": 2}]})
+        )
+
+    def test_binary_keys(self):
+        def make_key(data):
+            return PredictionCache.make_key(
+                "fingerprint", {"data": [BinaryData(io.BytesIO(data))]}
+            )
+
+        self.assertEqual(make_key(b"image"), make_key(b"image"))
+        self.assertNotEqual(make_key(b"image"), make_key(b"other"))
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_entries=2)
+        cache.put("a", [1])
+        cache.put("b", [2])
+        cache.get("a")
+        cache.put("c", [3])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_size_eviction(self):
+        cache = PredictionCache(max_size=20)
+        cache.put("a", ["x" * 10])
+        cache.put("b", ["y" * 10])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), ["y" * 10])
+        cache.put("c", ["z" * 100])
+        self.assertIsNone(cache.get("c"))
+
+    def test_ttl(self):
+        cache = PredictionCache(ttl=0.05)
+        cache.put("a", [1])
+        self.assertEqual(cache.get("a"), [1])
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PredictionCache(max_entries=1, directory=tmpdir)
+            cache.put("a", [1])
+            cache.put("b", [2])
+            self.assertEqual(cache.get("a"), [1])
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            restarted = PredictionCache(directory=tmpdir)
+            self.assertEqual(restarted.get("b"), [2])
+            restarted.clear()
+            self.assertEqual(os.listdir(tmpdir), [])
+
+    def test_disk_size_eviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PredictionCache(directory=tmpdir, max_disk_size=20)
+            cache.put("a", ["x" * 10])
+            cache.put("b", ["y" * 10])
+            self.assertEqual(os.listdir(tmpdir), ["b"])
+
+    def test_invalid_outputs_are_discarded(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PredictionCache(directory=tmpdir)
+            cache.put("a", ["api/upload/evicted"])
+            self.assertEqual(
+                cache.get("a", lambda output: True), ["api/upload/evicted"]
+            )
+            self.assertIsNone(cache.get("a", lambda output: False))
+            self.assertEqual(os.listdir(tmpdir), [])
+            self.assertEqual(cache.stats()["entries"], 0)
+
+
+class TestBypass(unittest.TestCase):
+    def test_is_deterministic(self):
+        self.assertTrue(is_deterministic(lambda x: x.upper()))
+        self.assertFalse(is_deterministic(lambda x: x + random.random()))
+
+        def noisy(x):
+            return x + random.randint(0, 1)
+
+        self.assertFalse(is_deterministic(noisy))
+        noisy.deterministic = True
+        self.assertTrue(is_deterministic(noisy))
+
+    def test_bypass_reason(self):
+        interface = Interface(lambda x: x, "textbox", "textbox")
+        self.assertIsNone(get_bypass_reason(interface))
+        interface = Interface(
+            lambda x, s: (x, s), ["textbox", "state"], ["textbox", "state"]
+        )
+        self.assertIsNotNone(get_bypass_reason(interface))
+        interface = Interface(lambda x: x * random.random(), "number", "number")
+        self.assertIsNotNone(get_bypass_reason(interface))
+
+    def test_fingerprint(self):
+        interface1 = Interface(lambda x: x.upper(), "textbox", "textbox")
+        interface2 = Interface(lambda x: x.lower(), "textbox", "textbox")
+        interface3 = Interface(lambda x: x.upper(), "textbox", "label")
+        self.assertEqual(get_fingerprint(interface1), get_fingerprint(interface1))
+        self.assertNotEqual(get_fingerprint(interface1), get_fingerprint(interface2))
+        self.assertNotEqual(get_fingerprint(interface1), get_fingerprint(interface3))
+
+    def test_fingerprint_of_nested_code(self):
+        # The same source compiled twice has nested code objects at other addresses.
+        source = "def fn(x):\n    return ''.join(sorted(x, key=lambda c: -ord(c)))"
+        interfaces = []
+        for _ in range(2):
+            namespace = {}
+            exec(source, namespace)
+            interfaces.append(Interface(namespace["fn"], "textbox", "textbox"))
+        self.assertEqual(get_fingerprint(interfaces[0]), get_fingerprint(interfaces[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
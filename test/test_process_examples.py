@@ -1,4 +1,5 @@
 import os
+import shutil
 import unittest
 
 from gradio import Interface, process_examples
@@ -25,6 +26,23 @@ class TestProcessExamples(unittest.TestCase):
         io.close()
         self.assertEquals(prediction[0], "Hello Dunya")
 
+    def test_caching_with_output_urls(self):
+        shutil.rmtree(process_examples.CACHED_FOLDER, ignore_errors=True)
+        self.addCleanup(
+            shutil.rmtree, process_examples.CACHED_FOLDER, ignore_errors=True
+        )
+        io = Interface(
+            lambda x: ("test/test_files/bus.png", "test/test_files/bus.png"),
+            "text",
+            ["image", "file"],
+            examples=[["bus"]],
+        )
+        io.launch(cache_examples=True, output_urls=True, prevent_thread_lock=True)
+        prediction = process_examples.load_from_cache(io, 0)
+        io.close()
+        self.assertTrue(prediction[0].startswith("data:image/"))
+        self.assertTrue(prediction[1]["data"].startswith("data:image/"))
+
 
 if __name__ == "__main__":
     unittest.main()
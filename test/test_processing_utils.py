@@ -1,3 +1,4 @@
+import io
 import os
 import tempfile
 import unittest
@@ -17,6 +18,12 @@ class ImagePreprocessing(unittest.TestCase):
         )
         self.assertIsInstance(output_image, Image.Image)
 
+    def test_decode_binary_data_to_image(self):
+        data, _ = gr.processing_utils.decode_base64_to_binary(gr.test_data.BASE64_IMAGE)
+        binary = gr.processing_utils.BinaryData(io.BytesIO(data), "image/png")
+        output_image = gr.processing_utils.decode_base64_to_image(binary)
+        self.assertIsInstance(output_image, Image.Image)
+
     def test_encode_url_or_file_to_base64(self):
         output_base64 = gr.processing_utils.encode_url_or_file_to_base64(
             "test/test_data/test_image.png"
@@ -82,6 +89,17 @@ class OutputPreprocessing(unittest.TestCase):
         temp_file = gr.processing_utils.decode_base64_to_file(gr.test_data.BASE64_IMAGE)
         self.assertIsInstance(temp_file, tempfile._TemporaryFileWrapper)
 
+    def test_decode_binary_data(self):
+        data, _ = gr.processing_utils.decode_base64_to_binary(gr.test_data.BASE64_IMAGE)
+        binary = gr.processing_utils.BinaryData(io.BytesIO(data), "image/png")
+        self.assertEqual(
+            gr.processing_utils.decode_base64_to_binary(binary), (data, "png")
+        )
+        temp_file = gr.processing_utils.decode_base64_to_file(binary)
+        self.assertTrue(temp_file.name.endswith(".png"))
+        with open(temp_file.name, "rb") as f:
+            self.assertEqual(f.read(), data)
+
     def test_create_tmp_copy_of_file(self):
         temp_file = gr.processing_utils.create_tmp_copy_of_file("test.txt")
         self.assertIsInstance(temp_file, tempfile._TemporaryFileWrapper)
@@ -1,9 +1,16 @@
 """Contains tests for networking.py and app.py"""
 
+import asyncio
+import base64
 import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
 import unittest
 
-from gradio import queueing
+from gradio import queue_worker, queueing
 
 os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
 
@@ -59,9 +66,508 @@ class TestQueuingActions(unittest.TestCase):
         status, _ = queueing.get_status(hash2)
         self.assertEquals(status, "FAILED")
 
+    def test_pop_claims_job(self):
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.pop()
+        status, _ = queueing.get_status(hash1)
+        self.assertEqual(status, "PENDING")
+        self.assertIsNone(queueing.pop())
+
+    def test_position_with_concurrency(self):
+        queueing.init(concurrency_count=2)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        hash3, _ = queueing.push({"data": "test3"}, "predict")
+        queueing.pop()
+        _, position = queueing.get_status(hash3)
+        self.assertEqual(position, 1)
+        queueing.pop()
+        _, position = queueing.get_status(hash3)
+        self.assertEqual(position, 1)
+        queueing.pass_job(hash1, {"data": "result"})
+        _, position = queueing.get_status(hash3)
+        self.assertEqual(position, 0)
+
+    def test_evict_jobs(self):
+        hashes = [queueing.push({"data": i}, "predict")[0] for i in range(4)]
+        for hash in hashes[:3]:
+            queueing.pop()
+            queueing.pass_job(hash, {"data": "result"})
+        self.assertEqual(queueing.evict_jobs(max_count=1), 2)
+        with self.assertRaises(ValueError):
+            queueing.get_status(hashes[0])
+        self.assertEqual(queueing.get_status(hashes[2])[0], "COMPLETE")
+        self.assertEqual(queueing.evict_jobs(max_age=0), 1)
+        self.assertEqual(queueing.get_status(hashes[3]), ("QUEUED", 0))
+
+    def test_large_payloads_are_stored_as_blobs(self):
+        image = (
+            "data:image/png;base64," + base64.b64encode(os.urandom(10**5)).decode()
+        )
+        text = "a" * (queueing.BLOB_THRESHOLD + 1)
+        hash1, _ = queueing.push({"data": [image, text]}, "predict")
+        hash2, _ = queueing.push({"data": [image, "small"]}, "predict")
+        self.assertEqual(len(os.listdir(queueing.BLOB_DIR)), 2)
+        row_size = queueing.get_connection().execute(
+            "SELECT MAX(LENGTH(input_data)) FROM queue"
+        )
+        self.assertLess(row_size.fetchone()[0], 1000)
+
+        _, _, input_data, _ = queueing.pop()
+        self.assertEqual(input_data, {"data": [image, text]})
+        queueing.pass_job(hash1, {"data": [image]})
+        self.assertEqual(queueing.get_status(hash1), ("COMPLETE", {"data": [image]}))
+        self.assertEqual(len(os.listdir(queueing.BLOB_DIR)), 1)
+        _, _, input_data, _ = queueing.pop()
+        self.assertEqual(input_data, {"data": [image, "small"]})
+        queueing.fail_job(hash2, "failure")
+        self.assertEqual(os.listdir(queueing.BLOB_DIR), [])
+
+    def test_partial_outputs(self):
+        image = (
+            "data:image/png;base64," + base64.b64encode(os.urandom(10**5)).decode()
+        )
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.pop()
+        self.assertEqual(queueing.get_status(hash1), ("PENDING", None))
+        self.assertTrue(queueing.store_partial(hash1, {"data": [image]}))
+        self.assertEqual(queueing.get_status(hash1), ("PENDING", {"data": [image]}))
+        self.assertEqual(len(os.listdir(queueing.BLOB_DIR)), 1)
+        self.assertTrue(queueing.store_partial(hash1, {"data": ["final"]}))
+        self.assertEqual(os.listdir(queueing.BLOB_DIR), [])
+        queueing.pass_job(hash1, {"data": ["final"]})
+        self.assertEqual(queueing.get_status(hash1), ("COMPLETE", {"data": ["final"]}))
+        self.assertFalse(queueing.store_partial(hash1, {"data": ["late"]}))
+
+    def test_queue_max_size(self):
+        queueing.init(max_size=2)
+        queueing.push({"data": "test1"}, "predict")
+        queueing.push({"data": "test2"}, "predict")
+        with self.assertRaises(queueing.QueueFullError):
+            queueing.push({"data": "test3"}, "predict")
+        queueing.pop()
+        queueing.push({"data": "test3"}, "predict")
+
+    def test_expired_jobs_are_skipped(self):
+        hash1, _ = queueing.push({"data": "test1"}, "predict", timeout=0)
+        hash2, _ = queueing.push({"data": "test2"}, "predict", timeout=60)
+        _, hash, input_data, _ = queueing.pop()
+        self.assertEqual((hash, input_data), (hash2, {"data": "test2"}))
+        self.assertEqual(
+            queueing.get_status(hash1), ("FAILED", "Request expired before it started.")
+        )
+        self.assertIsNone(queueing.pop())
+
+    def test_abandoned_jobs_are_skipped(self):
+        queueing.init(client_timeout=10)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        queueing.get_connection().execute(
+            "UPDATE queue SET last_seen = last_seen - 20 WHERE hash = ?", (hash1,)
+        )
+        queueing.touch(hash2)
+        self.assertEqual(queueing.pop()[1], hash2)
+        self.assertEqual(queueing.get_status(hash1)[0], "FAILED")
+
+    def test_polling_clients_are_kept_with_short_timeouts(self):
+        queueing.init(client_timeout=4)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.get_connection().execute(
+            "UPDATE queue SET last_seen = last_seen - 2 WHERE hash = ?", (hash1,)
+        )
+        queueing.get_status(hash1)  # the client checks halfway to its timeout
+        queueing.get_connection().execute(
+            "UPDATE queue SET last_seen = last_seen - 3 WHERE hash = ?", (hash1,)
+        )
+        self.assertEqual(queueing.pop()[1], hash1)
+
+    def test_cancel_jobs(self):
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        self.assertTrue(queueing.cancel(hash2))
+        self.assertEqual(queueing.get_status(hash2), ("CANCELLED", None))
+        self.assertEqual(queueing.pop()[1], hash1)
+        self.assertIsNone(queueing.pop())
+        self.assertTrue(queueing.cancel(hash1))
+        self.assertTrue(queueing.is_cancelled(hash1))
+        self.assertFalse(queueing.pass_job(hash1, {"data": "result"}))
+        self.assertEqual(queueing.get_status(hash1), ("CANCELLED", None))
+        self.assertFalse(queueing.cancel(hash1))
+        self.assertFalse(queueing.cancel("unknown"))
+
+    def test_supersede_jobs(self):
+        hash1, _ = queueing.push({"data": "test1"}, "predict", session="a")
+        hash2, _ = queueing.push({"data": "test2"}, "predict", session="b")
+        hash3, _ = queueing.push({"data": "test3"}, "predict", session="a")
+        self.assertEqual(queueing.supersede("a", "predict"), [hash1, hash3])
+        self.assertEqual(queueing.get_status(hash2), ("QUEUED", 0))
+        self.assertEqual(queueing.get_status(hash3)[0], "CANCELLED")
+
+    def test_persistent_queue(self):
+        queueing.init(persistent=True)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.close()
+        self.assertTrue(os.path.exists(queueing.DB_FILE))
+        queueing.init(persistent=True)
+        self.assertEqual(queueing.get_status(hash1), ("QUEUED", 0))
+        queueing.init()
+        with self.assertRaises(ValueError):
+            queueing.get_status(hash1)
+
+    def test_expired_leases_are_requeued(self):
+        queueing.init(max_attempts=2, lease_duration=0)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        self.assertEqual(queueing.pop()[1], hash1)
+        self.assertEqual(queueing.get_status(hash1), ("PENDING", None))
+        # The lease expired, so the next worker gets the job again.
+        _, hash, input_data, _ = queueing.pop()
+        self.assertEqual((hash, input_data), (hash1, {"data": "test1"}))
+        self.assertIsNone(queueing.pop())
+        self.assertEqual(
+            queueing.get_status(hash1), ("FAILED", "Request was interrupted 2 times.")
+        )
+
+    def test_renewed_leases_are_kept(self):
+        queueing.init(lease_duration=0.5)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.pop()
+        queueing.renew_leases([hash1])
+        self.assertIsNone(queueing.pop())
+        self.assertTrue(queueing.pass_job(hash1, {"data": "result"}))
+
+    def test_clients_are_scheduled_fairly(self):
+        heavy = [
+            queueing.push({"data": i}, "predict", client="heavy")[0] for i in range(3)
+        ]
+        light, position = queueing.push({"data": "light"}, "predict", client="light")
+        self.assertEqual(position, 1)
+        self.assertEqual(queueing.get_status(heavy[2]), ("QUEUED", 3))
+        order = [queueing.pop()[1] for _ in range(4)]
+        self.assertEqual(order, [heavy[0], light, heavy[1], heavy[2]])
+
+    def test_client_weights(self):
+        hashes = [
+            queueing.push({"data": i}, "predict", client="a", weight=2)[0]
+            for i in range(4)
+        ]
+        hashes += [
+            queueing.push({"data": i}, "predict", client="b")[0] for i in range(2)
+        ]
+        order = [queueing.pop()[1] for _ in range(6)]
+        expected = [0, 1, 4, 2, 3, 5]  # "a" gets two jobs for each of "b"'s
+        self.assertEqual(order, [hashes[i] for i in expected])
+
+    def test_priority(self):
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, position = queueing.push({"data": "test2"}, "predict", priority=1)
+        self.assertEqual(position, 0)
+        self.assertEqual(queueing.get_status(hash1), ("QUEUED", 1))
+        self.assertEqual(
+            queueing.get_queue_positions([hash1, hash2]), {hash2: 0, hash1: 1}
+        )
+        self.assertEqual(queueing.pop()[1], hash2)
+
+    def test_latency_stats_and_estimates(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        queueing.init(concurrency_count=2, directory=tmpdir.name)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        self.assertEqual(queueing.get_estimates(hash1), {})
+        queueing.pop()
+        queueing.pass_job(hash1, {"data": "result"})
+        stats = queueing.get_latency_stats()["predict"]
+        self.assertEqual(stats["wait"]["count"], 1)
+        self.assertEqual(stats["service"]["count"], 1)
+        queueing.get_connection().execute("UPDATE latency SET mean = 10")
+
+        hashes = [queueing.push({"data": i}, "predict")[0] for i in range(3)]
+        queueing.pop()
+        queueing.pop()
+        start = time.time()
+        estimates = queueing.get_estimates(hashes[0])
+        self.assertLessEqual(estimates["estimated_start"], start)
+        self.assertAlmostEqual(estimates["estimated_completion"], start + 10, delta=1)
+        # Both workers are busy, so the next job starts when one of them is done.
+        estimates = queueing.get_estimates(hashes[2])
+        self.assertAlmostEqual(estimates["estimated_start"], start + 5, delta=1)
+        self.assertAlmostEqual(estimates["estimated_completion"], start + 15, delta=1)
+
+        queueing.close()
+        queueing.init(directory=tmpdir.name)
+        self.assertEqual(queueing.get_latency_stats()["predict"]["service"]["mean"], 10)
+        self.assertEqual(queueing.get_queue_positions(hashes), {})
+
+    def test_position_with_registered_workers(self):
+        queueing.init(concurrency_count=1)
+        hashes = [queueing.push({"data": i}, "predict")[0] for i in range(3)]
+        queueing.pop()
+        self.assertEqual(queueing.get_status(hashes[1])[1], 1)
+        # Worker processes running three jobs at once leave room for both.
+        queueing.register_workers("a", 1)
+        queueing.register_workers("b", 2)
+        self.assertEqual(queueing.get_status(hashes[1])[1], 0)
+        queueing.unregister_workers("b")
+        self.assertEqual(queueing.get_status(hashes[1])[1], 1)
+
+    def test_status_lookups_use_indexes(self):
+        conn = queueing.get_connection()
+        for query, args in [
+            ("SELECT queue_index, popped FROM queue WHERE hash = ?", ("x",)),
+            (
+                "SELECT COUNT(*) FROM queue WHERE popped = 0 "
+                "AND (-priority, fair_tag, queue_index) < (?, ?, ?)",
+                (0, 1, 1),
+            ),
+            ("SELECT COUNT(*) FROM jobs WHERE status = 'PENDING'", ()),
+            ("SELECT COUNT(*) FROM queue WHERE popped = 0", ()),
+        ]:
+            plan = conn.execute("EXPLAIN QUERY PLAN " + query, args).fetchall()
+            self.assertIn("INDEX", plan[0][-1])
+
+    def test_connection_is_pooled(self):
+        conn = queueing.get_connection()
+        self.assertIs(conn, queueing.get_connection())
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+        queueing.init()
+        self.assertIsNot(conn, queueing.get_connection())
+
     def tearDown(self):
         queueing.close()
 
 
+class TestQueueWorker(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        queueing.init()
+
+    async def wait_for_status(self, hash, status):
+        for _ in range(100):
+            result = queueing.get_status(hash)
+            if result[0] == status:
+                return result
+            await asyncio.sleep(0.01)
+        self.fail("Job did not reach status {}".format(status))
+
+    async def test_jobs_are_dispatched_in_process(self):
+        async def dispatch(input_data, action):
+            if input_data["data"] == "fail":
+                raise ValueError("failure")
+            return {"data": [action, input_data["data"]]}
+
+        worker = asyncio.create_task(queueing.run_queue(dispatch))
+        await asyncio.sleep(0)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.notify()
+        _, output = await self.wait_for_status(hash1, "COMPLETE")
+        self.assertEqual(output, {"data": ["predict", "test1"]})
+        hash2, _ = queueing.push({"data": "fail"}, "interpret")
+        queueing.notify()
+        _, error = await self.wait_for_status(hash2, "FAILED")
+        self.assertEqual(error, "failure")
+        worker.cancel()
+
+    async def test_expired_leases_are_requeued_without_pushes(self):
+        queueing.init(lease_duration=0.2)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        queueing.pop()  # claimed by a worker that then stopped
+
+        async def dispatch(input_data, action):
+            return input_data
+
+        worker = asyncio.create_task(queueing.run_queue(dispatch))
+        await self.wait_for_status(hash1, "COMPLETE")
+        worker.cancel()
+
+    async def test_status_updates_are_published(self):
+        release = asyncio.Event()
+
+        async def dispatch(input_data, action):
+            await release.wait()
+            return {"data": input_data["data"]}
+
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        updates = queueing.subscribe(hash2)
+        worker = asyncio.create_task(queueing.run_queue(dispatch))
+        self.assertEqual(await updates.get(), ("QUEUED", 1))
+        release.set()
+        self.assertEqual(await updates.get(), ("QUEUED", 0))
+        self.assertEqual(await updates.get(), ("PENDING", None))
+        self.assertEqual(await updates.get(), ("COMPLETE", {"data": "test2"}))
+        queueing.unsubscribe(hash2, updates)
+        worker.cancel()
+
+    async def test_partial_outputs_are_published(self):
+        release = asyncio.Event()
+
+        async def dispatch(input_data, action):
+            await queueing.publish_partial({"data": "partial"})
+            await release.wait()
+            return {"data": "final"}
+
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        updates = queueing.subscribe(hash1)
+        worker = asyncio.create_task(queueing.run_queue(dispatch))
+        self.assertEqual(await updates.get(), ("PENDING", None))
+        self.assertEqual(await updates.get(), ("PENDING", {"data": "partial"}))
+        self.assertEqual(queueing.get_status(hash1), ("PENDING", {"data": "partial"}))
+        release.set()
+        self.assertEqual(await updates.get(), ("COMPLETE", {"data": "final"}))
+        queueing.unsubscribe(hash1, updates)
+        worker.cancel()
+
+    async def test_running_job_can_check_for_cancellation(self):
+        started = asyncio.Event()
+        checks = []
+
+        async def dispatch(input_data, action):
+            started.set()
+            while not queueing.is_cancelled():
+                await asyncio.sleep(0.01)
+            checks.append(input_data["data"])
+            return {"data": "dropped"}
+
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        worker = asyncio.create_task(queueing.run_queue(dispatch))
+        await started.wait()
+        self.assertFalse(queueing.is_cancelled())
+        self.assertTrue(queueing.cancel(hash1))
+        for _ in range(100):
+            if checks:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(checks, ["test1"])
+        self.assertEqual(queueing.get_status(hash1), ("CANCELLED", None))
+        worker.cancel()
+
+    async def test_concurrent_workers(self):
+        queueing.init(concurrency_count=2)
+        release = asyncio.Event()
+        running = []
+
+        async def dispatch(input_data, action):
+            running.append(input_data["data"])
+            await release.wait()
+            return {"data": input_data["data"]}
+
+        workers = [asyncio.create_task(queueing.run_queue(dispatch)) for _ in range(2)]
+        await asyncio.sleep(0)
+        hash1, _ = queueing.push({"data": "test1"}, "predict")
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        queueing.notify()
+        await self.wait_for_status(hash1, "PENDING")
+        await self.wait_for_status(hash2, "PENDING")
+        for _ in range(100):  # jobs are marked PENDING just before dispatch
+            if len(running) == 2:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(sorted(running), ["test1", "test2"])
+        release.set()
+        await self.wait_for_status(hash1, "COMPLETE")
+        await self.wait_for_status(hash2, "COMPLETE")
+        for worker in workers:
+            worker.cancel()
+
+    async def test_batched_jobs(self):
+        batches = []
+
+        async def dispatch_batch(input_data, action):
+            batches.append([data["data"] for data in input_data])
+            return [
+                ValueError("failure") if data["data"] == "fail" else data
+                for data in input_data
+            ]
+
+        hashes = [
+            queueing.push({"data": data}, "predict")[0]
+            for data in ["test1", "fail", "test3"]
+        ]
+        worker = asyncio.create_task(
+            queueing.run_queue(None, dispatch_batch, max_batch_size=2)
+        )
+        await self.wait_for_status(hashes[2], "COMPLETE")
+        self.assertEqual(batches, [["test1", "fail"], ["test3"]])
+        status, error = queueing.get_status(hashes[1])
+        self.assertEqual((status, error), ("FAILED", "failure"))
+        worker.cancel()
+
+    async def test_batch_waits_for_more_jobs(self):
+        batches = []
+
+        async def dispatch_batch(input_data, action):
+            batches.append(len(input_data))
+            return input_data
+
+        worker = asyncio.create_task(
+            queueing.run_queue(
+                None, dispatch_batch, max_batch_size=2, max_batch_delay=1000
+            )
+        )
+        await asyncio.sleep(0)
+        queueing.push({"data": "test1"}, "predict")
+        queueing.notify()
+        await asyncio.sleep(0.05)
+        hash2, _ = queueing.push({"data": "test2"}, "predict")
+        queueing.notify()
+        await self.wait_for_status(hash2, "COMPLETE")
+        self.assertEqual(batches, [2])
+        worker.cancel()
+
+    def tearDown(self):
+        queueing.close()
+
+
+class TestQueueWorkerProcess(unittest.TestCase):
+    def test_worker_process_shares_queue(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "reverse_app.py"), "w") as f:
+                f.write(
+                    textwrap.dedent(
+                        """
+                        import gradio as gr
+                        io = gr.Interface(
+                            lambda x: x[::-1], "text", "text", analytics_enabled=False
+                        )
+                        """
+                    )
+                )
+            queueing.backend = queueing.SQLiteQueueBackend(tmpdir)
+            queueing.backend.init(persistent=True)
+            hash1, _ = queueing.backend.push({"data": ["abc"]}, "predict")
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "gradio.queue_worker", "reverse_app:io"]
+                + ["--queue-dir", tmpdir],
+                cwd=tmpdir,
+                env=dict(
+                    os.environ,
+                    PYTHONPATH=os.pathsep.join([tmpdir] + sys.path),
+                    GRADIO_ANALYTICS_ENABLED="False",
+                ),
+            )
+            try:
+                for _ in range(600):
+                    status, data = queueing.backend.get_status(hash1)
+                    if status == "COMPLETE":
+                        break
+                    time.sleep(0.05)
+                self.assertEqual(status, "COMPLETE")
+                self.assertEqual(data["data"], ["cba"])
+            finally:
+                worker.terminate()
+                worker.wait()
+                queueing.backend = queueing.SQLiteQueueBackend()
+                queueing.init()
+                queueing.close()
+
+    def test_load_backend(self):
+        backend = queue_worker.load_backend("gradio.queueing:SQLiteQueueBackend")
+        self.assertIsInstance(backend, queueing.SQLiteQueueBackend)
+        self.assertIs(
+            queue_worker.load_backend("gradio.queueing:backend"), queueing.backend
+        )
+        with self.assertRaises(TypeError):
+            queue_worker.load_backend("gradio.queueing:TOUCH_INTERVAL")
+
+
 if __name__ == "__main__":
     unittest.main()
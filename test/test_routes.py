@@ -1,12 +1,22 @@
 """Contains tests for networking.py and app.py"""
 
+import asyncio
+import hashlib
+import io
+import json
 import os
+import tempfile
+import time
 import unittest
 import unittest.mock as mock
 
+from fastapi import Request
 from fastapi.testclient import TestClient
 
-from gradio import Interface, queueing, reset_all
+from gradio import Interface, encryptor, queueing, reset_all, routes
+from gradio.processing_utils import BinaryData, decode_base64_to_binary
+from gradio.test_data import BASE64_IMAGE
+from gradio.upload_store import UploadStore
 
 os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
 
@@ -25,6 +35,26 @@ class TestRoutes(unittest.TestCase):
         response = self.client.get("/api/")
         self.assertEqual(response.status_code, 200)
 
+    def test_rendered_responses_etag(self):
+        response = self.client.get("/config/")
+        etag = response.headers["etag"]
+        response = self.client.get("/config/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/api/")
+        response = self.client.get(
+            "/api/", headers={"If-None-Match": response.headers["etag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+        self.client.post("/api/predict/", json={"data": ["test"]})
+        response = self.client.get("/config/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("avg_durations", response.json())
+        # Later durations are only copied to the config once a minute.
+        etag = response.headers["etag"]
+        self.client.post("/api/predict/", json={"data": ["test"]})
+        response = self.client.get("/config/", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
     def test_static_files_served_safely(self):
         # Make sure things outside the static folder are not accessible
         response = self.client.get(r"/static/..%2findex.html")
@@ -44,18 +74,510 @@ class TestRoutes(unittest.TestCase):
         self.assertTrue("durations" in output)
         self.assertTrue("avg_durations" in output)
 
+    def test_predict_batch_route(self):
+        response = self.client.post(
+            "/api/predict_batch/", json={"data": [["test1"], ["test2"]]}
+        )
+        self.assertEqual(response.status_code, 200)
+        output = dict(response.json())
+        self.assertEqual(output["data"], [["test1"], ["test2"]])
+        self.assertEqual(output["flag_indices"], [None, None])
+        self.assertTrue("avg_durations" in output)
+
     def test_queue_push_route(self):
-        queueing.push = mock.MagicMock(return_value=(None, None))
+        queueing.backend.push = mock.MagicMock(return_value=(None, None))
+        queueing.backend.get_estimates = mock.MagicMock(return_value={})
+        response = self.client.post(
+            "/api/queue/push/", json={"data": "test", "action": "test"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_queue_push_route_client_ignores_session(self):
+        queueing.backend.push = mock.MagicMock(return_value=(None, None))
+        queueing.backend.get_estimates = mock.MagicMock(return_value={})
+        self.client.post(
+            "/api/queue/push/",
+            json={"data": "test", "action": "test", "session_hash": "abc"},
+        )
+        client = queueing.backend.push.call_args[0][5]
+        self.assertEqual(client, "testclient")
+
+    def test_queue_push_route_without_remote_address(self):
+        queueing.backend.push = mock.MagicMock(return_value=(None, None))
+        queueing.backend.get_estimates = mock.MagicMock(return_value={})
+        with mock.patch.object(
+            Request, "client", new_callable=mock.PropertyMock, return_value=None
+        ):
+            response = self.client.post(
+                "/api/queue/push/",
+                json={"data": "test", "action": "test", "session_hash": "abc"},
+            )
+        self.assertEqual(response.status_code, 200)
+        client = queueing.backend.push.call_args[0][5]
+        self.assertEqual(client, "abc")
+
+    def test_queue_push_route_invalid_timeout(self):
+        queueing.backend.push = mock.MagicMock(return_value=(None, None))
+        queueing.backend.get_estimates = mock.MagicMock(return_value={})
+        for timeout in ["10", -1, 0]:
+            response = self.client.post(
+                "/api/queue/push/",
+                json={"data": "test", "action": "test", "timeout": timeout},
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_queue_push_route_full(self):
+        queueing.backend.push = mock.MagicMock(side_effect=queueing.QueueFullError)
         response = self.client.post(
             "/api/queue/push/", json={"data": "test", "action": "test"}
         )
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 1)
+
+    def test_queue_cancel_route(self):
+        queueing.backend.cancel = mock.MagicMock(return_value=False)
+        response = self.client.post("/api/queue/cancel/", json={"hash": "test"})
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"cancelled": False})
 
     def test_queue_push_route_2(self):
-        queueing.get_status = mock.MagicMock(return_value=(None, None))
+        queueing.backend.get_status = mock.MagicMock(return_value=(None, None))
         response = self.client.post("/api/queue/status/", json={"hash": "test"})
         self.assertEqual(response.status_code, 200)
 
+    def test_queue_stream_route(self):
+        queueing.backend.get_status = mock.MagicMock(side_effect=ValueError)
+        response = self.client.get("/api/queue/stream/test")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, 'data: {"status":"NOT FOUND","data":null}\n\n')
+
+    def test_queue_stream_route_clears_output(self):
+        queueing.init()
+        hash, _ = queueing.push({"data": ["test"]}, "predict")
+        queueing.pop()
+        queueing.pass_job(hash, {"data": ["test"]})
+
+        def subscribe(hash):  # the worker publishes the output as it completes
+            updates = asyncio.Queue()
+            updates.put_nowait(("COMPLETE", {"data": ["test"]}))
+            return updates
+
+        backend = queueing.SQLiteQueueBackend()
+        backend.get_status = mock.MagicMock(return_value=("PENDING", None))
+        backend.get_estimates = mock.MagicMock(return_value={})
+        with mock.patch.object(queueing, "backend", backend), mock.patch.object(
+            queueing, "subscribe", subscribe
+        ), mock.patch.object(queueing, "unsubscribe"):
+            response = self.client.get("/api/queue/stream/" + hash)
+        self.assertIn('"status":"COMPLETE"', response.text)
+        row = (
+            queueing.get_connection()
+            .execute("SELECT status, output_data FROM jobs WHERE hash = ?;", (hash,))
+            .fetchone()
+        )
+        self.assertEqual(row, ("COMPLETE", ""))
+        queueing.close()
+
+    def test_queue_stream_route_touches_job(self):
+        self.io.client_timeout = 10
+        queueing.backend.get_status = mock.MagicMock(
+            side_effect=[("QUEUED", 1), ("COMPLETE", {"data": ["test"]})]
+        )
+        queueing.backend.get_estimates = mock.MagicMock(return_value={})
+        queueing.backend.touch = mock.MagicMock()
+        queueing.backend.clear_output = mock.MagicMock()
+        with mock.patch.object(queueing, "TOUCH_INTERVAL", 0):
+            response = self.client.get("/api/queue/stream/test")
+        self.assertIn('"status":"COMPLETE"', response.text)
+        queueing.backend.touch.assert_called_with("test")
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+
+
+class TestBinaryRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.io = Interface(lambda im: str(im.shape), "image", "text")
+        self.app, _, _ = self.io.launch(prevent_thread_lock=True)
+        self.client = TestClient(self.app)
+
+    def test_predict_multipart(self):
+        image, _ = decode_base64_to_binary(BASE64_IMAGE)
+        response = self.client.post(
+            "/api/predict/",
+            files={"blob0": ("blob0", image, "image/png")},
+            data={"body": json.dumps({"data": [{"blob": "blob0"}]})},
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = self.client.post("/api/predict/", json={"data": [BASE64_IMAGE]})
+        self.assertEqual(response.json()["data"], expected.json()["data"])
+
+    def test_predict_multipart_missing_fields(self):
+        image, _ = decode_base64_to_binary(BASE64_IMAGE)
+        for data in [
+            {"body": json.dumps({"data": [{"blob": "blob1"}]})},
+            {"body": json.dumps({"data": [{"blob": "body"}]})},
+            {"other": "{}"},
+            {"body": "not json"},
+        ]:
+            response = self.client.post(
+                "/api/predict/",
+                files={"blob0": ("blob0", image, "image/png")},
+                data=data,
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_predict_multipart_size_limit(self):
+        self.io.upload_store.max_upload_size = 100
+        response = self.client.post(
+            "/api/predict/",
+            files={"blob0": ("blob0", b"x" * 200, "image/png")},
+            data={"body": json.dumps({"data": [{"blob": "blob0"}]})},
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+
+
+class TestUploadRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.io = Interface(lambda im: str(im.shape), "image", "text")
+        self.app, _, _ = self.io.launch(
+            upload_store=UploadStore(self.tmpdir.name), prevent_thread_lock=True
+        )
+        self.client = TestClient(self.app)
+
+    def test_predict_with_reference(self):
+        image, _ = decode_base64_to_binary(BASE64_IMAGE)
+        hash = hashlib.sha256(image).hexdigest()
+        response = self.client.post("/api/upload/check/", json={"hashes": [hash]})
+        self.assertEqual(response.json()["known"], [])
+        response = self.client.post(
+            "/api/upload/", files={"files": ("image.png", image, "image/png")}
+        )
+        self.assertEqual(response.json()["references"], ["upload:" + hash])
+        response = self.client.post("/api/upload/check/", json={"hashes": [hash]})
+        self.assertEqual(response.json()["known"], [hash])
+        response = self.client.post("/api/predict/", json={"data": ["upload:" + hash]})
+        expected = self.client.post("/api/predict/", json={"data": [BASE64_IMAGE]})
+        self.assertEqual(response.json()["data"], expected.json()["data"])
+
+    def test_upload_size_limit(self):
+        self.io.upload_store.max_upload_size = 100
+        response = self.client.post(
+            "/api/upload/", files={"files": ("data.txt", b"x" * 200, "text/plain")}
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def test_unknown_reference(self):
+        self.io.show_error = False
+        response = self.client.post(
+            "/api/predict/", json={"data": ["upload:" + "0" * 64]}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_text_is_not_resolved(self):
+        io = Interface(lambda x: x, "text", "text")
+        app, _, _ = io.launch(prevent_thread_lock=True)
+        client = TestClient(app)
+        for text in ["upload:" + "0" * 64, "api/upload/" + "0" * 64]:
+            response = client.post("/api/predict/", json={"data": [text]})
+            self.assertEqual(response.json()["data"], [text])
+        io.close()
+
+    def test_output_urls(self):
+        io = Interface(lambda x: "test.txt", "text", "file")
+        with open(os.path.join(self.tmpdir.name, "test.txt"), "w") as f:
+            f.write("hello world")
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        try:
+            app, _, _ = io.launch(
+                upload_store=UploadStore(self.tmpdir.name),
+                output_urls=True,
+                prevent_thread_lock=True,
+            )
+            client = TestClient(app)
+            output = client.post("/api/predict/", json={"data": [""]}).json()
+        finally:
+            os.chdir(cwd)
+        url = output["data"][0]["data"]
+        self.assertRegex(url, "^api/upload/[0-9a-f]{64}$")
+        response = client.get("/" + url)
+        self.assertEqual(response.content, b"hello world")
+        self.assertIn("immutable", response.headers["cache-control"])
+        self.assertEqual(response.headers["x-content-type-options"], "nosniff")
+        self.assertEqual(response.headers["content-disposition"], "attachment")
+        io.close()
+
+    def test_uploaded_page_is_not_served_inline(self):
+        response = self.client.post(
+            "/api/upload/", files={"files": ("page.html", b"<script>", "text/html")}
+        )
+        hash = response.json()["references"][0][len("upload:") :]
+        response = self.client.get("/api/upload/" + hash)
+        self.assertEqual(response.headers["content-type"], "application/octet-stream")
+        self.assertEqual(response.headers["content-disposition"], "attachment")
+        image, _ = decode_base64_to_binary(BASE64_IMAGE)
+        response = self.client.post(
+            "/api/upload/", files={"files": ("image", image, "image/png")}
+        )
+        hash = response.json()["references"][0][len("upload:") :]
+        response = self.client.get("/api/upload/" + hash)
+        # The type is sniffed from the content, which is a GIF.
+        self.assertEqual(response.headers["content-type"], "image/gif")
+        self.assertNotIn("content-disposition", response.headers)
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+        self.tmpdir.cleanup()
+
+
+class TestFileRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = bytes(range(256)) * 10
+        with open(os.path.join(self.tmpdir.name, "data.bin"), "wb") as f:
+            f.write(self.data)
+        self.io = Interface(lambda x: x, "text", "text")
+        self.app, _, _ = self.io.launch(prevent_thread_lock=True)
+        self.app.cwd = self.tmpdir.name
+        self.client = TestClient(self.app)
+
+    def test_range_requests(self):
+        response = self.client.get("/file/data.bin")
+        self.assertEqual(response.content, self.data)
+        self.assertEqual(response.headers["accept-ranges"], "bytes")
+        response = self.client.get("/file/data.bin", headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.data[10:20])
+        self.assertEqual(response.headers["content-range"], "bytes 10-19/2560")
+        response = self.client.get("/file/data.bin", headers={"Range": "bytes=-5"})
+        self.assertEqual(response.content, self.data[-5:])
+        response = self.client.get("/file/data.bin", headers={"Range": "bytes=9000-"})
+        self.assertEqual(response.status_code, 416)
+        # A range ending before it starts is invalid, so it is ignored.
+        response = self.client.get("/file/data.bin", headers={"Range": "bytes=20-10"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.data)
+        self.assertEqual(self.client.get("/file/missing.bin").status_code, 404)
+
+    def test_head_request(self):
+        response = self.client.head("/file/data.bin")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-length"], "2560")
+        self.assertEqual(response.content, b"")
+
+    def test_conditional_requests(self):
+        etag = self.client.get("/file/data.bin").headers["etag"]
+        response = self.client.get("/file/data.bin", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            "/file/data.bin", headers={"Range": "bytes=0-9", "If-Range": '"other"'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.data)
+
+    def test_encrypted_range(self):
+        key = encryptor.get_key("test")
+        os.makedirs(os.path.join(self.tmpdir.name, "examples"))
+        with open(os.path.join(self.tmpdir.name, "examples", "data.bin"), "wb") as f:
+            f.write(encryptor.encrypt(key, self.data))
+        self.io.encrypt, self.io.encryption_key = True, key
+        self.io.examples = "examples"
+        response = self.client.get(
+            "/file/examples/data.bin", headers={"Range": "bytes=100-1099"}
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.data[100:1100])
+        self.assertEqual(response.headers["content-range"], "bytes 100-1099/2560")
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+        self.tmpdir.cleanup()
+
+
+class TestStreamingRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        def count(n):
+            for i in range(int(n)):
+                yield str(i)
+
+        self.io = Interface(count, "text", "text")
+        self.app, _, _ = self.io.launch(prevent_thread_lock=True)
+        self.client = TestClient(self.app)
+
+    def test_predict_route_streams_events(self):
+        response = self.client.post(
+            "/api/predict/",
+            json={"data": ["3"]},
+            headers={"Accept": "text/event-stream"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.headers["content-type"].startswith("text/event-stream")
+        )
+        events = [
+            json.loads(event[len("data: ") :])
+            for event in response.text.split("\n\n")
+            if event
+        ]
+        self.assertEqual(
+            [event["status"] for event in events], ["PENDING"] * 3 + ["COMPLETE"]
+        )
+        self.assertEqual(
+            [event["data"]["data"] for event in events], [["0"], ["1"], ["2"], ["2"]]
+        )
+
+    def test_predict_route_returns_final_output(self):
+        response = self.client.post("/api/predict/", json={"data": ["3"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"], ["2"])
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+
+
+class TestCachedRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls = []
+
+        def upper(text):
+            self.calls.append(text)
+            return text.upper()
+
+        self.io = Interface(upper, "text", "text")
+        self.app, _, _ = self.io.launch(
+            cache_predictions=True, prevent_thread_lock=True
+        )
+        self.client = TestClient(self.app)
+
+    def test_repeated_predictions_are_cached(self):
+        for _ in range(2):
+            response = self.client.post("/api/predict/", json={"data": ["test"]})
+            self.assertEqual(response.json()["data"], ["TEST"])
+        self.assertEqual(self.calls, ["test"])
+        stats = self.client.get("/api/cache/stats/").json()
+        self.assertTrue(stats["enabled"])
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_batched_predictions_are_cached(self):
+        self.client.post("/api/predict/", json={"data": ["a"]})
+        response = self.client.post(
+            "/api/predict_batch/", json={"data": [["a"], ["b"]]}
+        )
+        self.assertEqual(response.json()["data"], [["A"], ["B"]])
+        self.assertEqual(self.calls, ["a", "b"])
+        self.client.post("/api/predict_batch/", json={"data": [["b"]]})
+        self.assertEqual(self.calls, ["a", "b"])
+
+    def test_uploads_are_keyed_by_content(self):
+        hash = self.io.upload_store.put(io.BytesIO(b"content"))
+        reference = self.io.upload_store.resolve("upload:" + hash)
+        blob = BinaryData(io.BytesIO(b"content"), "text/plain", "content.txt")
+        self.assertEqual(
+            routes.get_prediction_key({"data": [reference]}),
+            routes.get_prediction_key({"data": [blob]}),
+        )
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+
+
+class TestCoalescedRoutes(unittest.TestCase):
+    def setUp(self) -> None:
+        self.calls = []
+
+        def upper(text):
+            self.calls.append(text)
+            time.sleep(0.2)
+            return text.upper()
+
+        self.io = Interface(upper, "text", "text")
+        self.app, _, _ = self.io.launch(
+            coalesce_predictions=True, prevent_thread_lock=True
+        )
+
+    def test_identical_requests_are_coalesced(self):
+        async def predict_all():
+            bodies = [{"data": ["a"]}] * 4 + [{"data": ["b"]}]
+            return await asyncio.gather(
+                *(routes.process_predict(body) for body in bodies)
+            )
+
+        outputs = asyncio.run(predict_all())
+        self.assertEqual([output["data"] for output in outputs], [["A"]] * 4 + [["B"]])
+        self.assertEqual(sorted(self.calls), ["a", "b"])
+        self.assertEqual(routes.in_flight_predictions, {})
+        asyncio.run(predict_all())
+        self.assertEqual(len(self.calls), 4)
+
+    def test_batched_requests_are_coalesced(self):
+        async def predict_all():
+            return await asyncio.gather(
+                routes.process_predict({"data": ["a"]}),
+                routes.process_predict_batch(
+                    [{"data": ["a"]}, {"data": ["b"]}, {"data": ["b"]}]
+                ),
+            )
+
+        single, batch = asyncio.run(predict_all())
+        self.assertEqual(single["data"], ["A"])
+        self.assertEqual([output["data"] for output in batch], [["A"], ["B"], ["B"]])
+        self.assertEqual(sorted(self.calls), ["a", "b"])
+        self.assertEqual(routes.in_flight_predictions, {})
+
+    def tearDown(self) -> None:
+        self.io.close()
+        reset_all()
+
+
+class TestConcurrencyLimits(unittest.TestCase):
+    def setUp(self) -> None:
+        self.running = 0
+        self.max_running = 0
+
+        def slow(text):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            time.sleep(0.1)
+            self.running -= 1
+            return text
+
+        self.io = Interface(slow, "text", "text")
+        self.app, _, _ = self.io.launch(
+            max_concurrent_predictions=1, prevent_thread_lock=True
+        )
+        self.client = TestClient(self.app)
+
+    def test_predictions_are_limited(self):
+        async def predict_all():
+            return await asyncio.gather(
+                *(routes.process_predict({"data": [str(i)]}) for i in range(3))
+            )
+
+        asyncio.run(predict_all())
+        self.assertEqual(self.max_running, 1)
+        stats = self.client.get("/api/concurrency/").json()
+        self.assertEqual(stats["predict"], {"limit": 1, "running": 0, "waiting": 0})
+        self.assertIsNone(stats["interpret"]["limit"])
+
+    def test_limits_can_be_resized(self):
+        self.io.set_concurrency_limit("predict", 3)
+        time.sleep(0.1)  # the limiter is resized on the server's event loop
+        stats = self.client.get("/api/concurrency/").json()
+        self.assertEqual(stats["predict"]["limit"], 3)
+        with self.assertRaises(ValueError):
+            self.io.set_concurrency_limit("predict", 0)
+
     def tearDown(self) -> None:
         self.io.close()
         reset_all()
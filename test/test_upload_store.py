@@ -0,0 +1,79 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+from gradio.upload_store import UploadStore, get_extension, is_reference
+
+os.environ["GRADIO_ANALYTICS_ENABLED"] = "False"
+
+
+class TestUploadStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = UploadStore(self.tmpdir.name)
+
+    def test_put_open(self):
+        image = b"\x89PNG\r\n\x1a\nimage"
+        hash = self.store.put(io.BytesIO(image), "image/png")
+        self.assertEqual(hash, hashlib.sha256(image).hexdigest())
+        self.assertEqual(self.store.put(io.BytesIO(image), "image/png"), hash)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
+        binary = self.store.open(hash)
+        self.assertEqual(binary.read(), image)
+        self.assertEqual(binary.get_extension(), "png")
+        self.assertEqual(self.store.known([hash, "0" * 64]), [hash])
+        with self.assertRaises(KeyError):
+            self.store.open("0" * 64)
+        with self.assertRaises(KeyError):
+            self.store.open("../" + hash)
+
+    def test_extensions(self):
+        self.assertEqual(get_extension(b"RIFF\0\0\0\0WAVEfmt ", "audio/x-wav"), ".wav")
+        self.assertEqual(get_extension(b"a,b\n1,2\n", "text/csv", "data.CSV"), ".csv")
+        # The filename and content type of unrecognized content are not trusted.
+        self.assertIsNone(get_extension(b"<script>", "text/html", "page.html"))
+        self.assertIsNone(get_extension(b"<script>", "image/png", "image.png"))
+        hash = self.store.put(io.BytesIO(b"<script>"), "text/html", "page.html")
+        self.assertEqual(os.path.basename(self.store.get_path(hash)), "file")
+
+    def test_default_directory(self):
+        store, other = UploadStore(), UploadStore()
+        self.assertNotEqual(store.directory, other.directory)
+        directory = store.directory
+        del store
+        self.assertFalse(os.path.exists(directory))
+
+    def test_resolve(self):
+        hash = self.store.put(io.BytesIO(b"audio"), filename="sound.wav")
+        reference = "upload:" + hash
+        self.assertTrue(is_reference(reference))
+        self.assertFalse(is_reference("upload: some text"))
+        self.assertTrue(is_reference("http://localhost:7860/api/upload/" + hash))
+        data = self.store.resolve([{"name": "sound.wav", "data": reference}, "text"])
+        self.assertEqual(data[0]["data"].read(), b"audio")
+        self.assertEqual(data[1], "text")
+
+    def test_resolve_only_file_references(self):
+        hash = self.store.put(io.BytesIO(b"audio"), filename="sound.wav")
+        value = {"name": "upload:" + hash, "data": {"nested": "upload:" + hash}}
+        self.assertEqual(self.store.resolve(value), value)
+        self.assertEqual(self.store.resolve([["upload:" + hash]]), [["upload:" + hash]])
+        self.assertTrue(self.store.has_references({"data": {"nested": "upload:x"}}))
+
+    def test_size_eviction(self):
+        store = UploadStore(self.tmpdir.name, max_size=10)
+        first = store.put(io.BytesIO(b"x" * 6))
+        second = store.put(io.BytesIO(b"y" * 6))
+        self.assertFalse(store.has(first))
+        self.assertTrue(store.has(second))
+        self.assertTrue(store.has_references([{"data": "api/upload/" + second}]))
+        self.assertFalse(store.has_references(["text", "api/upload/" + first]))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
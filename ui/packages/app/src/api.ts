@@ -4,35 +4,246 @@ function delay(n: number) {
 	});
 }
 
-let postData = async (url: string, body: unknown) => {
+// Identifies this page to the queue, which may cancel its superseded requests.
+const session_hash = Math.random().toString(36).substring(2);
+
+type PartialCallback = (output: Record<string, unknown>) => void;
+
+// Data URLs longer than this are uploaded once and then sent by reference.
+const UPLOAD_THRESHOLD = 64 * 1024;
+
+let postData = async (url: string, body: unknown, accept?: string) => {
+	const headers: Record<string, string> = {
+		"Content-Type": "application/json"
+	};
+	if (accept) {
+		headers["Accept"] = accept;
+	}
 	const output = await fetch(url, {
 		method: "POST",
 		body: JSON.stringify(body),
-		headers: { "Content-Type": "application/json" }
+		headers: headers
 	});
 	return output;
 };
 
+// Output media stored on the server (with output_urls=True) is sent as URLs
+// relative to the root of the app, which is not always the page's location.
+const STORED_FILE_URL = /^api\/upload\/[0-9a-f]{64}$/;
+
+const map_strings = (value: unknown, map: (s: string) => string): unknown => {
+	if (typeof value === "string") {
+		return map(value);
+	} else if (Array.isArray(value)) {
+		return value.map((item) => map_strings(item, map));
+	} else if (value !== null && typeof value === "object") {
+		return Object.fromEntries(
+			Object.entries(value).map(([key, item]) => [key, map_strings(item, map)])
+		);
+	}
+	return value;
+};
+
+const sha256 = async (blob: Blob) => {
+	const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+	return Array.from(new Uint8Array(digest))
+		.map((byte) => byte.toString(16).padStart(2, "0"))
+		.join("");
+};
+
+// Replaces the large data URLs in a request by "upload:<hash>" references to
+// files in the server's upload store, uploading only those it does not have.
+const upload_files = async (
+	api_endpoint: string,
+	data: Record<string, unknown>
+) => {
+	const urls = new Set<string>();
+	const find = (value: unknown) => {
+		if (
+			typeof value === "string" &&
+			value.startsWith("data:") &&
+			value.length > UPLOAD_THRESHOLD
+		) {
+			urls.add(value);
+		} else if (value !== null && typeof value === "object") {
+			Object.values(value).forEach(find);
+		}
+	};
+	find(data["data"]);
+	if (urls.size === 0) {
+		return data;
+	}
+	const files = await Promise.all(
+		[...urls].map(async (url) => {
+			const blob = await (await fetch(url)).blob();
+			// Hashing needs a secure context; otherwise the file is uploaded.
+			const hash = crypto.subtle ? await sha256(blob) : null;
+			return { url, blob, hash };
+		})
+	);
+	const check = await postData(api_endpoint + "upload/check/", {
+		hashes: files.flatMap(({ hash }) => (hash === null ? [] : [hash]))
+	});
+	const known = new Set((await check.json())["known"]);
+	const references = new Map<string, string>();
+	for (const { url, hash } of files) {
+		if (known.has(hash)) {
+			references.set(url, "upload:" + hash);
+		}
+	}
+	const missing = files.filter(({ url }) => !references.has(url));
+	if (missing.length > 0) {
+		const form = new FormData();
+		missing.forEach(({ blob }, i) => form.append("files", blob, "file" + i));
+		const upload = await fetch(api_endpoint + "upload/", {
+			method: "POST",
+			body: form
+		});
+		const uploaded = (await upload.json())["references"];
+		missing.forEach(({ url }, i) => references.set(url, uploaded[i]));
+	}
+	return {
+		...data,
+		data: map_strings(data["data"], (value) => references.get(value) ?? value)
+	};
+};
+
+// Reads the events streamed by a streaming interface in response to a predict
+// request, passing each partial output to the callback.
+const read_events = async (
+	response: Response,
+	partial_callback?: PartialCallback
+) => {
+	const reader = response.body!.getReader();
+	const decoder = new TextDecoder();
+	let buffer = "";
+	while (true) {
+		const { done, value } = await reader.read();
+		if (done) {
+			throw new Error("FAILED");
+		}
+		buffer += decoder.decode(value, { stream: true });
+		const events = buffer.split("\n\n");
+		buffer = events.pop()!;
+		for (const event of events) {
+			if (!event.startsWith("data: ")) {
+				continue;
+			}
+			const status_obj = JSON.parse(event.substring(6));
+			const status = status_obj["status"];
+			if (status === "PENDING") {
+				partial_callback?.(status_obj["data"]);
+			} else {
+				reader.cancel();
+				if (status === "COMPLETE") {
+					return status_obj["data"];
+				}
+				throw new Error(status);
+			}
+		}
+	}
+};
+
+const stream_status = (
+	api_endpoint: string,
+	hash: string,
+	queue_callback: (pos: number | null, is_initial?: boolean) => void,
+	partial_callback?: PartialCallback
+) =>
+	new Promise((resolve, reject) => {
+		const source = new EventSource(api_endpoint + "queue/stream/" + hash);
+		source.onmessage = (event) => {
+			const status_obj = JSON.parse(event.data);
+			const status = status_obj["status"];
+			if (status === "QUEUED") {
+				queue_callback(status_obj["data"]);
+			} else if (status === "PENDING") {
+				queue_callback(null);
+				if (status_obj["data"] !== null) {
+					partial_callback?.(status_obj["data"]);
+				}
+			} else {
+				source.close();
+				if (status === "COMPLETE") {
+					resolve(status_obj["data"]);
+				} else {
+					reject(new Error(status));
+				}
+			}
+		};
+		source.onerror = () => {
+			source.close();
+			reject(new Error("FAILED"));
+		};
+	});
+
 export const fn = async (
 	api_endpoint: string,
 	action: string,
 	data: Record<string, unknown>,
 	queue: boolean,
-	queue_callback: (pos: number | null, is_initial?: boolean) => void
+	queue_callback: (pos: number | null, is_initial?: boolean) => void,
+	partial_callback?: PartialCallback
 ) => {
+	const resolve_urls = (output: unknown) =>
+		map_strings(output, (value) =>
+			STORED_FILE_URL.test(value) ? api_endpoint + value.substring(4) : value
+		) as Record<string, unknown>;
+	const output = await call(
+		api_endpoint,
+		action,
+		data,
+		queue,
+		queue_callback,
+		partial_callback && ((partial) => partial_callback(resolve_urls(partial)))
+	);
+	return resolve_urls(output);
+};
+
+const call = async (
+	api_endpoint: string,
+	action: string,
+	data: Record<string, unknown>,
+	queue: boolean,
+	queue_callback: (pos: number | null, is_initial?: boolean) => void,
+	partial_callback?: PartialCallback
+) => {
+	if (["predict", "interpret"].includes(action)) {
+		data = await upload_files(api_endpoint, data);
+	}
 	if (queue && ["predict", "interpret"].includes(action)) {
 		data["action"] = action;
+		data["session_hash"] = session_hash;
 		const output = await postData(api_endpoint + "queue/push/", data);
+		if (output.status === 429) {
+			// The queue is full: the request was not queued, and may be retried.
+			throw new Error("QUEUE FULL");
+		} else if (output.status !== 200) {
+			throw new Error(output.statusText);
+		}
 		const output_json = await output.json();
 		let [hash, queue_position] = [
 			output_json["hash"],
 			output_json["queue_position"]
 		];
 		queue_callback(queue_position, /*is_initial=*/ true);
+		if (typeof EventSource !== "undefined") {
+			return await stream_status(
+				api_endpoint,
+				hash,
+				queue_callback,
+				partial_callback
+			);
+		}
 		let status = "UNKNOWN";
-		while (status != "COMPLETE" && status != "FAILED") {
+		let poll_interval = 1;
+		while (
+			status != "COMPLETE" &&
+			status != "FAILED" &&
+			status != "CANCELLED"
+		) {
 			if (status != "UNKNOWN") {
-				await delay(1);
+				await delay(poll_interval);
 			}
 			const status_response = await postData(api_endpoint + "queue/status/", {
 				hash: hash
@@ -43,18 +254,33 @@ export const fn = async (
 				queue_callback(status_obj["data"]);
 			} else if (status === "PENDING") {
 				queue_callback(null);
+				if (status_obj["data"] !== null) {
+					partial_callback?.(status_obj["data"]);
+				}
 			}
+			// Poll less often while the job is not expected to start soon.
+			const time_to_start = status_obj["estimated_start"] - Date.now() / 1000;
+			poll_interval = time_to_start > 2 ? Math.min(time_to_start / 2, 5) : 1;
 		}
-		if (status == "FAILED") {
+		if (status == "FAILED" || status == "CANCELLED") {
 			throw new Error(status);
 		} else {
 			return status_obj["data"];
 		}
 	} else {
-		const output = await postData(api_endpoint + action + "/", data);
+		// Streaming interfaces send partial outputs as server-sent events.
+		const output = await postData(
+			api_endpoint + action + "/",
+			data,
+			action === "predict" ? "text/event-stream, application/json" : undefined
+		);
 		if (output.status !== 200) {
 			throw new Error(output.statusText);
 		}
+		const content_type = output.headers.get("Content-Type") || "";
+		if (content_type.startsWith("text/event-stream")) {
+			return await read_events(output, partial_callback);
+		}
 		return await output.json();
 	}
 };